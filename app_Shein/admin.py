@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Usuario, Producto
+from .busqueda import palabras, backend as backend_busqueda
 
 @admin.register(Usuario)
 class UsuarioAdmin(admin.ModelAdmin):
@@ -11,4 +12,11 @@ class UsuarioAdmin(admin.ModelAdmin):
 class ProductoAdmin(admin.ModelAdmin):
     list_display = ['nombre', 'precio', 'categoria', 'stock', 'disponible']
     list_filter = ['categoria', 'disponible', 'fecha_agregado']
-    search_fields = ['nombre', 'descripcion']
\ No newline at end of file
+    search_fields = ['nombre', 'descripcion']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Usa el índice de búsqueda en lugar de icontains sobre nombre y descripción
+        if not palabras(search_term):
+            return queryset, False
+        ids = backend_busqueda().buscar(search_term, limite=1000, solo_catalogo=False)
+        return queryset.filter(pk__in=ids), False
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""
+API JSON de solo lectura para productos, el catálogo y el detalle con reseñas.
+
+Cada respuesta lleva un ETag fuerte y Last-Modified calculados con una sola
+consulta barata (la `fecha_actualizacion` más reciente y el número de
+productos del listado, o la del producto en el detalle). Si el cliente manda
+If-None-Match / If-Modified-Since y coinciden, se responde 304 sin consultar
+los productos ni serializar nada. `fecha_actualizacion` cambia con cualquier
+edición del producto, de su stock o de sus reseñas.
+
+Parámetros comunes: `campos` (lista separada por comas), `limite` y `cursor`
+(el token de `siguiente` / `anterior` de la respuesta anterior).
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import ResumenCalificacion
+
+TAMANO_PAGINA = 25
+MAXIMO_PAGINA = 100
+MAXIMO_RESENAS = 20
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def _resumen(producto):
+    try:
+        return producto.resumen_calificacion
+    except ResumenCalificacion.DoesNotExist:
+        return None
+
+
+def _imagenes(producto):
+    return {
+        formato: {ancho: producto.imagen.storage.url(ruta) for ancho, ruta in rutas.items()}
+        for formato, rutas in (producto.imagen_variantes or {}).items()
+    }
+
+
+def _resenas(producto):
+    resenas = (
+        producto.resenas.select_related('usuario')
+        .only('calificacion', 'comentario', 'fecha_resena', 'producto_id', 'usuario__nombre')
+        .order_by('-fecha_resena', '-id')[:MAXIMO_RESENAS]
+    )
+    return [
+        {
+            'usuario': resena.usuario.nombre,
+            'calificacion': resena.calificacion,
+            'comentario': resena.comentario,
+            'fecha': resena.fecha_resena,
+        }
+        for resena in resenas
+    ]
+
+
+# campo de la API -> (columnas de Producto que necesita, función que lo calcula)
+CAMPOS = {
+    'id': ((), lambda p: p.pk),
+    'sku': (('sku',), lambda p: p.sku),
+    'nombre': (('nombre',), lambda p: p.nombre),
+    'descripcion': (('descripcion',), lambda p: p.descripcion),
+    'precio': (('precio',), lambda p: p.precio),
+    'categoria': (('categoria',), lambda p: p.categoria),
+    'talla': (('talla',), lambda p: p.talla),
+    'color': (('color',), lambda p: p.color),
+    'stock': (('stock',), lambda p: p.stock),
+    'disponible': (('disponible',), lambda p: p.disponible),
+    'imagen': (('imagen',), lambda p: p.imagen.url if p.imagen else None),
+    'imagenes': (('imagen', 'imagen_variantes'), _imagenes),
+    'fecha_agregado': (('fecha_agregado',), lambda p: p.fecha_agregado),
+    'fecha_actualizacion': (('fecha_actualizacion',), lambda p: p.fecha_actualizacion),
+    'calificacion_promedio': (
+        ('resumen_calificacion__suma', 'resumen_calificacion__total'),
+        lambda p: _resumen(p).promedio if _resumen(p) else None,
+    ),
+    'total_resenas': (('resumen_calificacion__total',), lambda p: _resumen(p).total if _resumen(p) else 0),
+}
+# Solo en el detalle: cuestan consultas o columnas extra por producto
+CAMPOS_DETALLE = {
+    **CAMPOS,
+    'distribucion': (
+        tuple(f'resumen_calificacion__estrellas_{n}' for n in range(1, 6)) + ('resumen_calificacion__total',),
+        lambda p: {
+            str(estrellas): cantidad
+            for estrellas, cantidad, _ in (_resumen(p).distribucion() if _resumen(p) else [])
+        },
+    ),
+    'resenas': ((), _resenas),
+}
+CAMPOS_LISTADO = ['id', 'nombre', 'precio', 'categoria', 'talla', 'color', 'imagen', 'calificacion_promedio', 'total_resenas']
+
+
+def leer_campos(parametros, disponibles, por_defecto=None):
+    """Campos pedidos en `?campos=`, en el orden de la petición; ParametroInvalido si alguno no existe."""
+    texto = parametros.get('campos', '').strip()
+    if not texto:
+        return list(por_defecto or disponibles)
+    campos = list(dict.fromkeys(campo.strip() for campo in texto.split(',') if campo.strip()))
+    desconocidos = [campo for campo in campos if campo not in disponibles]
+    if desconocidos:
+        raise ParametroInvalido(f'Campos desconocidos: {", ".join(desconocidos)} (disponibles: {", ".join(disponibles)})')
+    return campos
+
+
+def leer_limite(parametros):
+    texto = parametros.get('limite')
+    if not texto:
+        return TAMANO_PAGINA
+    if not texto.isdigit() or not 1 <= int(texto) <= MAXIMO_PAGINA:
+        raise ParametroInvalido(f'limite debe ser un entero entre 1 y {MAXIMO_PAGINA}')
+    return int(texto)
+
+
+def seleccionar(queryset, campos, disponibles, extra=()):
+    """Limita el queryset a las columnas que necesitan `campos` (más `extra`)."""
+    columnas = {columna for campo in campos for columna in disponibles[campo][0]} | set(extra)
+    if any(columna.startswith('resumen_calificacion__') for columna in columnas):
+        queryset = queryset.select_related('resumen_calificacion')
+    return queryset.only(*columnas) if columnas else queryset.only('pk')
+
+
+def serializar(producto, campos, disponibles):
+    return {campo: disponibles[campo][1](producto) for campo in campos}
+
+
+def version_listado(queryset):
+    """(última modificación, cantidad) de los productos del queryset, en una consulta."""
+    datos = queryset.order_by().aggregate(ultima=Max('fecha_actualizacion'), total=Count('pk'))
+    return datos['ultima'], datos['total']
+
+
+def calcular_etag(request, *partes):
+    # Incluye la ruta y los parámetros: otra selección de campos o de página es otra representación
+    parametros = sorted((clave, valor) for clave, valores in request.GET.lists() for valor in valores)
+    texto = '|'.join([request.path, repr(parametros), *(str(parte) for parte in partes)])
+    return quote_etag(hashlib.sha256(texto.encode()).hexdigest()[:32])
+
+
+def respuesta_condicional(request, etag, ultima_modificacion, generar):
+    """
+    Devuelve 304 si el cliente ya tiene la versión `etag`; si no, un JsonResponse
+    con `generar()`. `generar` solo se llama cuando hace falta el cuerpo.
+    """
+    timestamp = int(ultima_modificacion.timestamp()) if ultima_modificacion else None
+    respuesta = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if respuesta is None:
+        respuesta = JsonResponse(generar(), json_dumps_params={'ensure_ascii': False})
+    respuesta.headers.setdefault('ETag', etag)
+    if timestamp is not None:
+        respuesta.headers.setdefault('Last-Modified', http_date(timestamp))
+    # Las cachés intermedias pueden guardarla, pero deben revalidar con el ETag en cada uso
+    patch_cache_control(respuesta, public=True, no_cache=True)
+    return respuesta
+
+
+def error(mensaje, estado=400):
+    return JsonResponse({'error': mensaje}, status=estado, json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,62 @@
+"""
+Búsqueda por prefijo para los campos de autocompletado de los formularios.
+
+Los clientes se buscan por el inicio del nombre o del email con una consulta
+de rango sobre los índices de Usuario (tipo_usuario y nombre_busqueda /
+email_busqueda, normalizados con models.clave_busqueda: sin mayúsculas ni
+acentos), que ya están en el orden del resultado: cada consulta lee solo las
+primeras entradas del índice que coinciden, sin importar cuántos clientes
+haya. Los productos usan el índice de búsqueda de
+texto (app_Shein.busqueda), que ya busca por prefijo. Ambas devuelven como
+mucho MAXIMO_RESULTADOS filas.
+"""
+from . import busqueda
+from .models import Usuario, clave_busqueda
+
+LIMITE = 10
+MAXIMO_RESULTADOS = 20
+# Mayor que cualquier carácter: 'ana' <= x < 'ana' + FIN_PREFIJO son las cadenas que empiezan con 'ana'
+FIN_PREFIJO = '\U0010ffff'
+
+
+def leer_limite(texto):
+    """`?limite=` acotado a 1..MAXIMO_RESULTADOS; LIMITE si falta o no es un número."""
+    try:
+        return min(max(int(texto), 1), MAXIMO_RESULTADOS)
+    except (TypeError, ValueError):
+        return LIMITE
+
+
+def clientes_por_prefijo(campo, prefijo):
+    """Clientes activos cuyo `campo` normalizado empieza con `prefijo` (ya normalizado), en el orden del índice."""
+    clave = f'{campo}_busqueda'
+    return (
+        Usuario.objects.filter(tipo_usuario='cliente', activo=True)
+        .filter(**{f'{clave}__gte': prefijo, f'{clave}__lt': prefijo + FIN_PREFIJO})
+        .order_by(clave)
+        .only('nombre', 'email')
+    )
+
+
+def buscar_clientes(texto, limite=LIMITE):
+    """Clientes activos cuyo nombre o email empieza con `texto`; primero los que coinciden por nombre."""
+    prefijo = clave_busqueda(texto).strip()
+    if not prefijo:
+        return []
+    encontrados = {}
+    for campo in ('nombre', 'email'):
+        for cliente in clientes_por_prefijo(campo, prefijo)[:limite]:
+            encontrados.setdefault(cliente.pk, cliente)
+    return [
+        {'id': cliente.pk, 'nombre': cliente.nombre, 'email': cliente.email}
+        for cliente in list(encontrados.values())[:limite]
+    ]
+
+
+def buscar_productos(texto, limite=LIMITE):
+    """Productos del catálogo (disponibles y con stock) que coinciden con `texto`, por relevancia."""
+    productos = busqueda.buscar_productos(texto, limite)
+    return [
+        {'id': producto.pk, 'nombre': producto.nombre, 'precio': producto.precio, 'stock': producto.stock}
+        for producto in productos
+    ]
@@ -0,0 +1,166 @@
+"""
+Búsqueda de texto completo sobre Producto con un índice invertido.
+
+Hay dos backends intercambiables (setting SHEIN_BUSQUEDA_BACKEND, ruta de la
+clase; por defecto se elige según la base de datos):
+
+- `BusquedaFTS5` (SQLite): tabla virtual FTS5 de contenido externo que
+  mantienen triggers creados en la migración 0010, así que también ve los
+  cambios hechos con bulk_create o update(). Ordena por bm25.
+- `BusquedaTerminos` (cualquier base): tabla TerminoProducto con un índice
+  B-tree por término; las señales y la importación masiva la mantienen.
+
+Ambos buscan por prefijo, ignoran acentos y mayúsculas y exigen que todas
+las palabras de la consulta aparezcan.
+"""
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.utils.module_loading import import_string
+
+from .models import Producto, TerminoProducto
+
+LIMITE = 50
+MAXIMO_PALABRAS = 8
+TABLA_FTS = 'app_shein_producto_fts'
+
+
+def normalizar(texto):
+    """Minúsculas y sin acentos ('Camiseta Básica' -> 'camiseta basica')."""
+    descompuesto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def palabras(texto):
+    return re.findall(r'\w+', normalizar(texto or ''))
+
+
+class BackendBusqueda:
+    # True si la base de datos mantiene el índice por sí misma (triggers)
+    automatico = False
+
+    def buscar(self, texto, limite=LIMITE, desplazamiento=0, solo_catalogo=True):
+        """Ids de productos ordenados por relevancia; por defecto solo los del catálogo (disponibles y con stock)."""
+        raise NotImplementedError
+
+    def indexar(self, productos):
+        pass
+
+    def eliminar(self, producto_ids):
+        pass
+
+    def reconstruir(self):
+        """Regenera el índice completo; devuelve cuántos productos indexó."""
+        raise NotImplementedError
+
+
+class BusquedaFTS5(BackendBusqueda):
+    automatico = True
+    # Pesos de bm25 por columna: nombre, descripcion, categoria, color
+    PESOS = (10.0, 1.0, 3.0, 3.0)
+
+    def buscar(self, texto, limite=LIMITE, desplazamiento=0, solo_catalogo=True):
+        terminos = palabras(texto)[:MAXIMO_PALABRAS]
+        if not terminos:
+            return []
+        # Cada palabra como prefijo entre comillas; FTS5 las une con AND y el tokenizador quita los acentos
+        consulta = ' '.join(f'"{termino}"*' for termino in terminos)
+        producto = connection.ops.quote_name(Producto._meta.db_table)
+        pesos = ', '.join(str(peso) for peso in self.PESOS)
+        catalogo = 'AND p.disponible AND p.stock > 0 ' if solo_catalogo else ''
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT p.id FROM {TABLA_FTS} JOIN {producto} p ON p.id = {TABLA_FTS}.rowid '
+                f'WHERE {TABLA_FTS} MATCH %s {catalogo}'
+                f'ORDER BY bm25({TABLA_FTS}, {pesos}), p.id DESC LIMIT %s OFFSET %s',
+                [consulta, limite, desplazamiento],
+            )
+            return [fila[0] for fila in cursor.fetchall()]
+
+    def reconstruir(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+        return Producto.objects.count()
+
+
+class BusquedaTerminos(BackendBusqueda):
+    # Peso de cada campo en el puntaje
+    CAMPOS = (('nombre', 10), ('descripcion', 1), ('categoria', 3), ('color', 3))
+
+    def terminos(self, producto):
+        pesos = {}
+        for campo, peso in self.CAMPOS:
+            for termino in palabras(getattr(producto, campo)):
+                termino = termino[:100]
+                pesos[termino] = pesos.get(termino, 0) + peso
+        return pesos
+
+    def buscar(self, texto, limite=LIMITE, desplazamiento=0, solo_catalogo=True):
+        terminos = palabras(texto)[:MAXIMO_PALABRAS]
+        if not terminos:
+            return []
+        # Prefijo como rango [t, t + '\uffff'): usa el índice de `termino` en cualquier base
+        rangos = [Q(termino__gte=t, termino__lt=t + '\uffff') for t in terminos]
+        coincidencias = {f'c{i}': Count('pk', filter=rango) for i, rango in enumerate(rangos)}
+        filas = TerminoProducto.objects.all()
+        if solo_catalogo:
+            filas = filas.filter(producto__disponible=True, producto__stock__gt=0)
+        filas = (
+            filas.filter(Q(*rangos, _connector=Q.OR))
+            .values('producto_id')
+            .annotate(puntaje=Sum('peso'), **coincidencias)
+            .filter(**{f'{nombre}__gt': 0 for nombre in coincidencias})
+            .order_by('-puntaje', '-producto_id')
+        )
+        return [fila['producto_id'] for fila in filas[desplazamiento:desplazamiento + limite]]
+
+    def indexar(self, productos):
+        productos = [producto for producto in productos if producto.pk]
+        with transaction.atomic():
+            self.eliminar([producto.pk for producto in productos])
+            TerminoProducto.objects.bulk_create([
+                TerminoProducto(termino=termino, producto_id=producto.pk, peso=peso)
+                for producto in productos
+                for termino, peso in self.terminos(producto).items()
+            ], batch_size=1000)
+
+    def eliminar(self, producto_ids):
+        TerminoProducto.objects.filter(producto_id__in=list(producto_ids)).delete()
+
+    def reconstruir(self, lote=1000):
+        TerminoProducto.objects.all().delete()
+        total = 0
+        productos = Producto.objects.only('nombre', 'descripcion', 'categoria', 'color').order_by('pk')
+        pendientes = []
+        for producto in productos.iterator(chunk_size=lote):
+            pendientes.append(producto)
+            if len(pendientes) >= lote:
+                self.indexar(pendientes)
+                total += len(pendientes)
+                pendientes = []
+        self.indexar(pendientes)
+        return total + len(pendientes)
+
+
+_backend = None
+
+
+def backend():
+    """Instancia del backend configurado (o el adecuado para la base de datos)."""
+    global _backend
+    ruta = getattr(settings, 'SHEIN_BUSQUEDA_BACKEND', None)
+    if ruta is None:
+        ruta = 'app_Shein.busqueda.BusquedaFTS5' if connection.vendor == 'sqlite' else 'app_Shein.busqueda.BusquedaTerminos'
+    if _backend is None or _backend[0] != ruta:
+        _backend = (ruta, import_string(ruta)())
+    return _backend[1]
+
+
+def buscar_productos(texto, limite=LIMITE, desplazamiento=0):
+    """Productos del catálogo que coinciden con `texto`, en orden de relevancia."""
+    ids = backend().buscar(texto, limite, desplazamiento)
+    encontrados = Producto.objects.select_related('resumen_calificacion').in_bulk(ids)
+    return [encontrados[pk] for pk in ids if pk in encontrados]
@@ -0,0 +1,138 @@
+"""
+Caché de lectura (read-through) para el catálogo y el detalle de producto.
+
+El backend se elige con el setting SHEIN_CACHE_ALIAS (cualquier alias de
+CACHES: memoria local por defecto, Redis/Memcached en producción). Las
+páginas del catálogo se guardan por categoría bajo un número de versión;
+invalidar una categoría solo incrementa su versión, así todas sus páginas
+quedan obsoletas sin tener que conocer sus cursores.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+TODAS = 'todas'
+
+_NO_ENCONTRADO = object()
+_contadores = {}
+_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'SHEIN_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'SHEIN_CACHE_TIMEOUT', 300)
+
+
+def _contar(espacio, resultado):
+    with _lock:
+        contador = _contadores.setdefault(espacio, {'aciertos': 0, 'fallos': 0})
+        contador[resultado] += 1
+
+
+def estadisticas():
+    """Aciertos, fallos y tasa de aciertos por espacio de claves en este proceso."""
+    with _lock:
+        datos = {espacio: dict(contador) for espacio, contador in _contadores.items()}
+    for contador in datos.values():
+        total = contador['aciertos'] + contador['fallos']
+        contador['tasa_aciertos'] = round(contador['aciertos'] / total, 4) if total else None
+    return datos
+
+
+def reiniciar_estadisticas():
+    with _lock:
+        _contadores.clear()
+
+
+def obtener_o_calcular(espacio, clave, calcular):
+    """Devuelve el valor cacheado de `clave` o lo calcula con `calcular()` y lo guarda."""
+    cache = _cache()
+    valor = cache.get(clave, _NO_ENCONTRADO)
+    if valor is not _NO_ENCONTRADO:
+        _contar(espacio, 'aciertos')
+        return valor
+    _contar(espacio, 'fallos')
+    valor = calcular()
+    cache.set(clave, valor, _timeout())
+    return valor
+
+
+async def aobtener_o_calcular(espacio, clave, calcular):
+    """Como obtener_o_calcular, para vistas asíncronas; `calcular()` devuelve un awaitable."""
+    cache = _cache()
+    valor = await cache.aget(clave, _NO_ENCONTRADO)
+    if valor is not _NO_ENCONTRADO:
+        _contar(espacio, 'aciertos')
+        return valor
+    _contar(espacio, 'fallos')
+    valor = await calcular()
+    await cache.aset(clave, valor, _timeout())
+    return valor
+
+
+def _version(categoria):
+    return _cache().get_or_set(f'catalogo:version:{categoria}', 1, None)
+
+
+def _incrementar_version(categoria):
+    cache = _cache()
+    clave = f'catalogo:version:{categoria}'
+    try:
+        cache.incr(clave)
+    except ValueError:
+        # La versión expiró o nunca se creó: cualquier valor nuevo invalida lo anterior
+        cache.set(clave, 2, None)
+
+
+def clave_catalogo(categoria, cursor, filtros=''):
+    categoria = categoria or TODAS
+    pagina = hashlib.md5(f'{filtros}|{cursor or ""}'.encode()).hexdigest()
+    return f'catalogo:{categoria}:v{_version(categoria)}:{pagina}'
+
+
+def clave_facetas(filtros):
+    # Los conteos dependen de todo el catálogo: van bajo la versión general, que sube con cualquier cambio
+    return f'facetas:v{_version(TODAS)}:{hashlib.md5(filtros.encode()).hexdigest()}'
+
+
+def clave_detalle(producto_id):
+    return f'producto:{producto_id}'
+
+
+def _invalidar_ahora_y_al_confirmar(invalidar):
+    # Se invalida de inmediato y otra vez al confirmar la transacción, por si
+    # otra petición volvió a llenar la caché con datos previos al commit
+    invalidar()
+    transaction.on_commit(invalidar)
+
+
+def invalidar_categorias(*categorias):
+    """Invalida las páginas del catálogo de las categorías dadas y del listado general."""
+    def invalidar():
+        for categoria in {TODAS, *filter(None, categorias)}:
+            _incrementar_version(categoria)
+    _invalidar_ahora_y_al_confirmar(invalidar)
+
+
+def invalidar_producto(producto_id, *categorias):
+    """Invalida el detalle del producto y el catálogo donde aparece."""
+    _invalidar_ahora_y_al_confirmar(lambda: _cache().delete(clave_detalle(producto_id)))
+    invalidar_categorias(*categorias)
+
+
+def invalidar_detalles(producto_ids):
+    """Invalida solo el detalle de los productos."""
+    claves = [clave_detalle(producto_id) for producto_id in producto_ids]
+    _invalidar_ahora_y_al_confirmar(lambda: _cache().delete_many(claves))
+
+
+def invalidar_productos(productos):
+    """Como invalidar_producto, para varios productos a la vez."""
+    invalidar_detalles([producto.pk for producto in productos])
+    invalidar_categorias(*{producto.categoria for producto in productos})
@@ -0,0 +1,62 @@
+"""
+Mantenimiento incremental de ResumenCalificacion.
+
+Crear o borrar una reseña ajusta el resumen de su producto con un UPDATE
+de F() (conteo, suma y la columna del histograma), así que leer el promedio
+cuesta lo mismo tenga el producto 1 o 100 000 reseñas. Si el resumen se
+desincroniza, `reconstruir_resumenes()` lo recalcula desde Resena.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Resena, ResumenCalificacion
+
+
+def _ajustar(producto_id, calificacion, signo):
+    cambios = {
+        'total': F('total') + signo,
+        'suma': F('suma') + signo * calificacion,
+        f'estrellas_{calificacion}': F(f'estrellas_{calificacion}') + signo,
+    }
+    actualizados = ResumenCalificacion.objects.filter(producto_id=producto_id).update(**cambios)
+    if not actualizados and signo > 0:
+        # Primera reseña del producto
+        ResumenCalificacion.objects.get_or_create(producto_id=producto_id)
+        ResumenCalificacion.objects.filter(producto_id=producto_id).update(**cambios)
+
+
+def registrar_resena(resena):
+    _ajustar(resena.producto_id, resena.calificacion, 1)
+
+
+def descontar_resena(resena):
+    _ajustar(resena.producto_id, resena.calificacion, -1)
+
+
+def _resumenes_desde_resenas(resenas):
+    resumenes = {}
+    conteos = resenas.values('producto_id', 'calificacion').annotate(n=Count('id')).order_by()
+    for fila in conteos:
+        resumen = resumenes.setdefault(fila['producto_id'], ResumenCalificacion(producto_id=fila['producto_id']))
+        resumen.total += fila['n']
+        resumen.suma += fila['n'] * fila['calificacion']
+        setattr(resumen, f"estrellas_{fila['calificacion']}", fila['n'])
+    return resumenes
+
+
+def recalcular_resumen(producto_id):
+    """Recalcula desde cero el resumen de un solo producto."""
+    resumen = _resumenes_desde_resenas(Resena.objects.filter(producto_id=producto_id)).get(producto_id)
+    with transaction.atomic():
+        ResumenCalificacion.objects.filter(producto_id=producto_id).delete()
+        if resumen is not None:
+            resumen.save(force_insert=True)
+
+
+def reconstruir_resumenes(lote=1000):
+    """Recalcula todos los resúmenes con una consulta agrupada; devuelve cuántos quedaron."""
+    resumenes = list(_resumenes_desde_resenas(Resena.objects.all()).values())
+    with transaction.atomic():
+        ResumenCalificacion.objects.all().delete()
+        ResumenCalificacion.objects.bulk_create(resumenes, batch_size=lote)
+    return len(resumenes)
@@ -0,0 +1,127 @@
+"""
+Carrito de compras del lado del servidor, guardado en la caché.
+
+La sesión solo guarda un identificador de carrito; el carrito completo
+({producto_id: línea}) es una entrada de la caché de SHEIN_CACHE_ALIAS que
+vence a los SHEIN_CARRITO_TTL segundos sin cambios. Cada línea guarda el
+nombre y el precio del producto al agregarlo, así mostrar el carrito no
+consulta la base. Agregar lee solo ese producto por su clave primaria;
+cambiar una cantidad o quitar una línea no consulta la base. El stock y el
+precio definitivos se comprueban al confirmar, en `pedidos.crear_pedido()`.
+"""
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .inventario import con_existencias
+from .models import Producto
+from .pedidos import crear_pedido
+
+
+def _cache():
+    return caches[getattr(settings, 'SHEIN_CACHE_ALIAS', 'default')]
+
+
+def _ttl():
+    return getattr(settings, 'SHEIN_CARRITO_TTL', 60 * 60 * 24 * 7)
+
+
+def clave(request):
+    """Clave de caché del carrito de la sesión; el identificador se crea la primera vez."""
+    # Un identificador propio y no la clave de sesión, que cambia al iniciar sesión
+    carrito_id = request.session.get('carrito_id')
+    if carrito_id is None:
+        carrito_id = request.session['carrito_id'] = uuid.uuid4().hex
+    return f'carrito:{carrito_id}'
+
+
+def obtener(clave):
+    return _cache().get(clave) or {}
+
+
+def _guardar(clave, carrito):
+    if carrito:
+        _cache().set(clave, carrito, _ttl())
+    else:
+        _cache().delete(clave)
+
+
+def _leer_cantidad(valor):
+    try:
+        cantidad = int(valor)
+    except (TypeError, ValueError):
+        raise ValueError('La cantidad debe ser un número entero.')
+    if cantidad < 1:
+        raise ValueError('La cantidad debe ser al menos 1.')
+    return cantidad
+
+
+def agregar(clave, producto_id, cantidad=1):
+    """Suma `cantidad` unidades del producto al carrito; ValueError si no está disponible o no alcanza el stock."""
+    cantidad = _leer_cantidad(cantidad)
+    producto = (
+        con_existencias(Producto.objects.filter(pk=producto_id, disponible=True)).only('nombre', 'precio').first()
+    )
+    if producto is None:
+        raise ValueError('El producto no existe o no está disponible.')
+    carrito = obtener(clave)
+    if producto.pk in carrito:
+        cantidad += carrito[producto.pk]['cantidad']
+    if cantidad > producto.existencias:
+        raise ValueError(f'Solo quedan {producto.existencias} unidades de {producto.nombre}.')
+    carrito[producto.pk] = {'nombre': producto.nombre, 'precio': producto.precio, 'cantidad': cantidad}
+    _guardar(clave, carrito)
+    return carrito
+
+
+def actualizar(clave, producto_id, cantidad):
+    """Cambia la cantidad de una línea del carrito."""
+    cantidad = _leer_cantidad(cantidad)
+    carrito = obtener(clave)
+    if producto_id not in carrito:
+        raise ValueError('El producto no está en el carrito.')
+    carrito[producto_id]['cantidad'] = cantidad
+    _guardar(clave, carrito)
+    return carrito
+
+
+def quitar(clave, producto_id):
+    carrito = obtener(clave)
+    carrito.pop(producto_id, None)
+    _guardar(clave, carrito)
+    return carrito
+
+
+def vaciar(clave):
+    _cache().delete(clave)
+
+
+def resumen(carrito):
+    """Líneas con su subtotal, unidades y total estimado (con los precios al agregar)."""
+    lineas = [
+        {'producto_id': producto_id, **linea, 'subtotal': linea['precio'] * linea['cantidad']}
+        for producto_id, linea in carrito.items()
+    ]
+    return {
+        'lineas': lineas,
+        'unidades': sum(linea['cantidad'] for linea in lineas),
+        'total': sum((linea['subtotal'] for linea in lineas), Decimal('0.00')),
+    }
+
+
+def confirmar(clave, usuario, direccion, metodo_pago=None, cupon=None):
+    """
+    Convierte el carrito en un pedido con `crear_pedido()` (una transacción y un
+    número fijo de consultas, con los precios y el stock actuales) y lo vacía.
+    Si el pedido falla el carrito queda como estaba.
+    """
+    carrito = obtener(clave)
+    if not carrito:
+        raise ValueError('El carrito está vacío.')
+    pedido = crear_pedido(
+        usuario, direccion, {producto_id: linea['cantidad'] for producto_id, linea in carrito.items()}, metodo_pago, cupon,
+    )
+    vaciar(clave)
+    return pedido
@@ -0,0 +1,131 @@
+"""
+Validación y uso de cupones de descuento.
+
+`validar_cupon()` busca el código en una caché pequeña dentro del proceso
+(con TTL, setting SHEIN_CUPONES_TTL) para no ir a la base en cada checkout;
+también recuerda los códigos que no existen. Las señales de CuponDescuento la
+invalidan al editar o borrar un cupón; otros procesos pueden ver el cupón
+anterior hasta que venza el TTL, por eso `registrar_uso()` vuelve a comprobar
+activo, expiración y límite de usos en el mismo UPDATE que cuenta el uso.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import CuponDescuento
+
+MAXIMO_ENTRADAS = 256
+
+_entradas = {}  # código -> (instante en que vence, CuponDescuento o None si no existe)
+_lock = threading.Lock()
+
+
+class CuponInvalido(Exception):
+    """El cupón no existe, está inactivo, expiró o ya no le quedan usos."""
+
+
+def _ttl():
+    return getattr(settings, 'SHEIN_CUPONES_TTL', 60)
+
+
+def _buscar(codigo):
+    ahora = time.monotonic()
+    with _lock:
+        entrada = _entradas.get(codigo)
+        if entrada and entrada[0] > ahora:
+            return entrada[1]
+
+    cupon = CuponDescuento.objects.filter(codigo=codigo).first()
+    with _lock:
+        if len(_entradas) >= MAXIMO_ENTRADAS:
+            # Primero las vencidas; si no alcanza, la más antigua
+            for clave in [clave for clave, (vence, _) in _entradas.items() if vence <= ahora]:
+                del _entradas[clave]
+            if len(_entradas) >= MAXIMO_ENTRADAS:
+                del _entradas[next(iter(_entradas))]
+        _entradas[codigo] = (ahora + _ttl(), cupon)
+    return cupon
+
+
+def _comprobar(cupon, codigo, hoy):
+    if cupon is None:
+        raise CuponInvalido(f'El cupón {codigo} no existe.')
+    if not cupon.activo:
+        raise CuponInvalido(f'El cupón {cupon.codigo} no está activo.')
+    if cupon.fecha_expiracion is not None and cupon.fecha_expiracion < hoy:
+        raise CuponInvalido(f'El cupón {cupon.codigo} expiró el {cupon.fecha_expiracion:%d/%m/%Y}.')
+    if cupon.usos_maximos is not None and cupon.usos >= cupon.usos_maximos:
+        raise CuponInvalido(f'El cupón {cupon.codigo} ya alcanzó su límite de usos.')
+
+
+def validar_cupon(codigo):
+    """Devuelve el CuponDescuento vigente para `codigo` o lanza CuponInvalido."""
+    codigo = (codigo or '').strip()
+    if not codigo:
+        raise CuponInvalido('Escribe un código de cupón.')
+    cupon = _buscar(codigo)
+    _comprobar(cupon, codigo, timezone.localdate())
+    # Una copia por llamada: la instancia cacheada se comparte entre hilos
+    return copy.copy(cupon)
+
+
+def registrar_uso(cupon):
+    """
+    Cuenta un uso del cupón; lanza CuponInvalido si ya no es válido.
+
+    Debe llamarse dentro de la transacción del pedido: el UPDATE condicional
+    bloquea la fila hasta el commit, así que dos checkouts simultáneos no
+    pueden pasar del límite, y si el pedido falla el uso se revierte.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        raise RuntimeError('registrar_uso() debe ejecutarse dentro de transaction.atomic().')
+    hoy = timezone.localdate()
+    vigente = Q(activo=True) & (Q(fecha_expiracion__isnull=True) | Q(fecha_expiracion__gte=hoy))
+    con_usos = Q(usos_maximos__isnull=True) | Q(usos__lt=F('usos_maximos'))
+    if not CuponDescuento.objects.filter(vigente & con_usos, pk=cupon.pk).update(usos=F('usos') + 1):
+        # Explicar el motivo con el estado actual de la base (no el de la caché)
+        _comprobar(CuponDescuento.objects.filter(pk=cupon.pk).first(), cupon.codigo, hoy)
+        raise CuponInvalido(f'El cupón {cupon.codigo} no se pudo aplicar.')
+
+
+def liberar_usos(usos):
+    """
+    Descuenta `usos` ({cupon_id: pedidos}) de los contadores con un solo UPDATE,
+    p. ej. al cancelar pedidos; debe llamarse dentro de la misma transacción.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        raise RuntimeError('liberar_usos() debe ejecutarse dentro de transaction.atomic().')
+    if not usos:
+        return
+    cantidad = Case(
+        *[When(pk=cupon_id, then=Value(cantidad)) for cupon_id, cantidad in usos.items()],
+        output_field=IntegerField(),
+    )
+    CuponDescuento.objects.filter(pk__in=usos).update(usos=Greatest(F('usos') - cantidad, 0))
+    # Un cupón agotado en la caché vuelve a tener usos disponibles
+    for cupon in CuponDescuento.objects.filter(pk__in=usos).only('codigo'):
+        invalidar(cupon)
+
+
+def invalidar(cupon):
+    """Olvida el cupón (por su código actual y por su id, por si cambió de código)."""
+    pk, codigo_actual = cupon.pk, cupon.codigo  # delete() deja pk en None antes del commit
+
+    def invalidar_ahora():
+        with _lock:
+            for codigo, (_, guardado) in list(_entradas.items()):
+                if codigo == codigo_actual or (guardado is not None and guardado.pk == pk):
+                    del _entradas[codigo]
+    invalidar_ahora()
+    transaction.on_commit(invalidar_ahora)
+
+
+def limpiar():
+    with _lock:
+        _entradas.clear()
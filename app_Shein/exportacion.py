@@ -0,0 +1,126 @@
+"""
+Exportación de pedidos con sus items, cliente, método de pago y cupón en CSV
+o JSONL, generada fila por fila.
+
+Los pedidos se leen con `.iterator(chunk_size=...)`: cada lote trae sus
+relaciones con un JOIN (select_related) y sus items con una consulta más
+(prefetch_related), así que la memoria depende del tamaño del lote y no del
+total de pedidos. La usan la vista `exportar_pedidos` y el comando del mismo
+nombre.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Pedido, ItemPedido
+
+TAMANO_LOTE = 2000
+FORMATOS = ('csv', 'jsonl')
+
+COLUMNAS_PEDIDO = [
+    'pedido_id', 'fecha', 'estado', 'usuario_id', 'usuario_nombre', 'usuario_email',
+    'metodo_pago', 'metodo_pago_tipo', 'cupon', 'cupon_porcentaje', 'subtotal', 'descuento', 'total',
+]
+COLUMNAS_ITEM = ['producto_id', 'producto_nombre', 'cantidad', 'precio_unitario', 'subtotal_item']
+# CSV: una fila por item, repitiendo los datos del pedido
+COLUMNAS_CSV = COLUMNAS_PEDIDO + COLUMNAS_ITEM
+
+
+def leer_fecha(texto):
+    """Convierte 'AAAA-MM-DD' en fecha; cadena vacía o None devuelven None."""
+    if not texto:
+        return None
+    fecha = parse_date(texto)
+    if fecha is None:
+        raise ValueError(f'Fecha inválida: {texto} (se espera AAAA-MM-DD)')
+    return fecha
+
+
+def pedidos_para_exportar(desde=None, hasta=None, estado=None, lote=TAMANO_LOTE):
+    """Iterador de pedidos por lotes; `desde` y `hasta` son fechas (inclusive)."""
+    items = ItemPedido.objects.select_related('producto').only(
+        'pedido_id', 'cantidad', 'precio_unitario', 'producto__nombre', 'producto__precio',
+    ).order_by('pk')
+    pedidos = Pedido.objects.select_related('id_usuario', 'metodo_pago', 'cupon').prefetch_related(
+        Prefetch('items', queryset=items)
+    )
+    return filtrar_pedidos(pedidos, desde, hasta, estado).order_by('pk').iterator(chunk_size=lote)
+
+
+def filtrar_pedidos(pedidos, desde=None, hasta=None, estado=None):
+    """Pedidos del queryset entre las fechas `desde` y `hasta` (inclusive) y con `estado`."""
+    # Rangos sobre la columna (y no fecha__date) para que usen el índice de fecha
+    if desde:
+        pedidos = pedidos.filter(fecha__gte=timezone.make_aware(datetime.combine(desde, time.min)))
+    if hasta:
+        pedidos = pedidos.filter(fecha__lt=timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min)))
+    if estado:
+        pedidos = pedidos.filter(estado_pedido=estado)
+    return pedidos
+
+
+def _datos_pedido(pedido):
+    usuario, metodo, cupon = pedido.id_usuario, pedido.metodo_pago, pedido.cupon
+    return {
+        'pedido_id': pedido.pk,
+        'fecha': pedido.fecha.isoformat(),
+        'estado': pedido.estado_pedido,
+        'usuario_id': usuario.pk,
+        'usuario_nombre': usuario.nombre,
+        'usuario_email': usuario.email,
+        'metodo_pago': metodo.nombre if metodo else None,
+        'metodo_pago_tipo': metodo.tipo if metodo else None,
+        'cupon': cupon.codigo if cupon else None,
+        'cupon_porcentaje': cupon.descuento_porcentaje if cupon else None,
+        'subtotal': pedido.subtotal,
+        'descuento': pedido.descuento,
+        'total': pedido.total,
+    }
+
+
+def _datos_item(item):
+    return {
+        'producto_id': item.producto_id,
+        'producto_nombre': item.producto.nombre,
+        'cantidad': item.cantidad,
+        'precio_unitario': item.precio_unitario,
+        'subtotal_item': item.subtotal(),
+    }
+
+
+class _Eco:
+    """Objeto tipo archivo para csv.writer: devuelve la línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def lineas_csv(pedidos):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(COLUMNAS_CSV)
+    for pedido in pedidos:
+        datos = _datos_pedido(pedido)
+        fila = [datos[columna] for columna in COLUMNAS_PEDIDO]
+        items = pedido.items.all()
+        if not items:
+            yield escritor.writerow(fila + [''] * len(COLUMNAS_ITEM))
+        for item in items:
+            datos_item = _datos_item(item)
+            yield escritor.writerow(fila + [datos_item[columna] for columna in COLUMNAS_ITEM])
+
+
+def lineas_jsonl(pedidos):
+    # JSONL: un pedido por línea con sus items anidados
+    for pedido in pedidos:
+        datos = _datos_pedido(pedido)
+        datos['items'] = [_datos_item(item) for item in pedido.items.all()]
+        yield json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def lineas_exportacion(formato, pedidos):
+    return lineas_csv(pedidos) if formato == 'csv' else lineas_jsonl(pedidos)
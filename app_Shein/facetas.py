@@ -0,0 +1,198 @@
+"""
+Filtros combinables del catálogo (categoría, talla, color, rango de precio y
+calificación mínima) con el conteo de productos junto a cada opción.
+
+Los conteos siguen la regla habitual de las facetas: los de una faceta se
+calculan con todos los filtros activos salvo los de esa misma faceta, así
+que muestran cuántos productos habría al elegir esa opción. Cada faceta se
+resuelve con una sola consulta agrupada (GROUP BY o conteos condicionales):
+cinco consultas en total, sin importar cuántos valores haya. El resultado se
+guarda en caché por combinación de filtros, bajo la versión del catálogo
+completo, así que cualquier cambio de un producto lo invalida. Las versiones
+con prefijo `a` son para las vistas asíncronas: hacen las mismas cinco
+consultas una tras otra (el ORM asíncrono las serializa en un solo hilo) y
+solo liberan el event loop mientras esperan.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, F, Q
+
+from . import cache_catalogo
+from .models import Producto
+
+# (clave, etiqueta, mínimo inclusive, máximo exclusivo o None)
+BANDAS_PRECIO = [
+    ('0-199', 'Menos de $200', Decimal('0'), Decimal('200')),
+    ('200-499', '$200 a $499', Decimal('200'), Decimal('500')),
+    ('500-999', '$500 a $999', Decimal('500'), Decimal('1000')),
+    ('1000+', '$1000 o más', Decimal('1000'), None),
+]
+CALIFICACIONES = [4, 3, 2, 1]
+MAXIMO_COLORES = 20
+
+FACETAS = ['categoria', 'talla', 'color', 'precio', 'calificacion']
+ETIQUETAS = {
+    'categoria': 'Categoría',
+    'talla': 'Talla',
+    'color': 'Color',
+    'precio': 'Precio',
+    'calificacion': 'Calificación',
+}
+
+_CATEGORIAS = dict(Producto.CATEGORIA_CHOICES)
+_TALLAS = dict(Producto.TALLA_CHOICES)
+_BANDAS = {clave: (minimo, maximo) for clave, _, minimo, maximo in BANDAS_PRECIO}
+
+
+def productos_catalogo():
+    return Producto.objects.filter(disponible=True, stock__gt=0)
+
+
+def leer_filtros(parametros):
+    """Filtros válidos de un QueryDict como {faceta: tupla ordenada de valores}; ignora los desconocidos."""
+    filtros = {
+        'categoria': [v for v in parametros.getlist('categoria') if v in _CATEGORIAS],
+        'talla': [v for v in parametros.getlist('talla') if v in _TALLAS],
+        'color': [v.strip() for v in parametros.getlist('color') if v.strip() and len(v) <= 50],
+        'precio': [v for v in parametros.getlist('precio') if v in _BANDAS],
+        # Calificación mínima: un solo valor
+        'calificacion': [v for v in parametros.getlist('calificacion')[:1] if v in {str(n) for n in CALIFICACIONES}],
+    }
+    return {faceta: tuple(sorted(set(valores))) for faceta, valores in filtros.items() if valores}
+
+
+def firma(filtros):
+    """Representación canónica de los filtros, para las claves de caché."""
+    return '&'.join(f'{faceta}={",".join(valores)}' for faceta, valores in sorted(filtros.items()))
+
+
+def _q_banda(clave):
+    minimo, maximo = _BANDAS[clave]
+    condicion = Q(precio__gte=minimo)
+    if maximo is not None:
+        condicion &= Q(precio__lt=maximo)
+    return condicion
+
+
+def _q_calificacion(minimo):
+    return Q(resumen_calificacion__total__gt=0, resumen_calificacion__suma__gte=F('resumen_calificacion__total') * minimo)
+
+
+def _condicion(faceta, valores):
+    if faceta == 'precio':
+        return Q(*[_q_banda(clave) for clave in valores], _connector=Q.OR)
+    if faceta == 'calificacion':
+        return _q_calificacion(int(valores[0]))
+    return Q(**{f'{faceta}__in': valores})
+
+
+def aplicar_filtros(queryset, filtros, excepto=None):
+    for faceta, valores in filtros.items():
+        if faceta != excepto:
+            queryset = queryset.filter(_condicion(faceta, valores))
+    return queryset
+
+
+def _consultas(filtros):
+    """Consultas de las facetas: agrupadas (categoría, talla, color) y con conteos condicionales (precio, calificación)."""
+    def base(faceta):
+        return aplicar_filtros(productos_catalogo(), filtros, excepto=faceta)
+
+    def agrupar(faceta, queryset, limite=None):
+        return queryset.values(faceta).annotate(cantidad=Count('pk')).order_by('-cantidad', faceta)[:limite]
+
+    agrupadas = {
+        'categoria': agrupar('categoria', base('categoria')),
+        'talla': agrupar('talla', base('talla').exclude(talla__isnull=True).exclude(talla='')),
+        'color': agrupar('color', base('color'), limite=MAXIMO_COLORES),
+    }
+    condicionales = {
+        'precio': (base('precio'), {clave: Count('pk', filter=_q_banda(clave)) for clave, _, _, _ in BANDAS_PRECIO}),
+        'calificacion': (base('calificacion'), {
+            str(minimo): Count('pk', filter=_q_calificacion(minimo)) for minimo in CALIFICACIONES
+        }),
+    }
+    return agrupadas, condicionales
+
+
+def contar_facetas(filtros):
+    """{faceta: {valor: cantidad}} con una consulta agrupada por faceta."""
+    agrupadas, condicionales = _consultas(filtros)
+    conteos = {faceta: {fila[faceta]: fila['cantidad'] for fila in filas} for faceta, filas in agrupadas.items()}
+    for faceta, (queryset, conteo) in condicionales.items():
+        conteos[faceta] = queryset.aggregate(**conteo)
+    return conteos
+
+
+async def acontar_facetas(filtros):
+    agrupadas, condicionales = _consultas(filtros)
+
+    conteos = {faceta: {fila[faceta]: fila['cantidad'] async for fila in filas} for faceta, filas in agrupadas.items()}
+    for faceta, (queryset, conteo) in condicionales.items():
+        conteos[faceta] = await queryset.aaggregate(**conteo)
+    return conteos
+
+
+def conteos_facetas(filtros):
+    clave = cache_catalogo.clave_facetas(firma(filtros))
+    return cache_catalogo.obtener_o_calcular('facetas', clave, lambda: contar_facetas(filtros))
+
+
+async def aconteos_facetas(filtros):
+    clave = cache_catalogo.clave_facetas(firma(filtros))
+    return await cache_catalogo.aobtener_o_calcular('facetas', clave, lambda: acontar_facetas(filtros))
+
+
+def _etiqueta(faceta, valor):
+    if faceta == 'categoria':
+        return _CATEGORIAS.get(valor, valor)
+    if faceta == 'precio':
+        return next(etiqueta for clave, etiqueta, _, _ in BANDAS_PRECIO if clave == valor)
+    if faceta == 'calificacion':
+        return f'{valor}★ o más'
+    return valor
+
+
+def _url(parametros, faceta, valor):
+    """Query string con `valor` agregado o quitado de la faceta (y sin cursor: vuelve a la primera página)."""
+    parametros = parametros.copy()
+    parametros.pop('cursor', None)
+    actuales = parametros.getlist(faceta)
+    if valor in actuales:
+        actuales.remove(valor)
+    elif faceta == 'calificacion':
+        actuales = [valor]
+    else:
+        actuales.append(valor)
+    parametros.setlist(faceta, actuales)
+    return '?' + parametros.urlencode()
+
+
+def facetas_para_plantilla(parametros, filtros):
+    """Lista de facetas con sus opciones (etiqueta, cantidad, si está activa y la URL que la alterna)."""
+    return _opciones(parametros, filtros, conteos_facetas(filtros))
+
+
+async def afacetas_para_plantilla(parametros, filtros):
+    return _opciones(parametros, filtros, await aconteos_facetas(filtros))
+
+
+def _opciones(parametros, filtros, conteos):
+    resultado = []
+    for faceta in FACETAS:
+        activos = filtros.get(faceta, ())
+        # Un filtro activo se muestra (para poder quitarlo) aunque ya no tenga productos
+        valores = {**conteos[faceta], **{valor: 0 for valor in activos if valor not in conteos[faceta]}}
+        opciones = []
+        for valor, cantidad in valores.items():
+            if not cantidad and valor not in activos:
+                continue
+            opciones.append({
+                'valor': valor,
+                'etiqueta': _etiqueta(faceta, valor),
+                'cantidad': cantidad,
+                'activo': valor in activos,
+                'url': _url(parametros, faceta, valor),
+            })
+        resultado.append({'nombre': faceta, 'etiqueta': ETIQUETAS[faceta], 'opciones': opciones})
+    return resultado
@@ -0,0 +1,121 @@
+"""
+Derivados de las imágenes de producto: miniaturas de ancho fijo en WebP,
+AVIF (si Pillow lo soporta) y JPEG como respaldo.
+
+El original se renombra con el hash de su contenido y los derivados se
+nombran a partir de ese hash, así que subir dos veces la misma foto no
+duplica archivos y los navegadores pueden cachearlos indefinidamente. Las
+rutas generadas se guardan en `Producto.imagen_variantes` con la forma
+{formato: {ancho: ruta}} para que las plantillas no toquen el disco. Si
+mientras tanto se subió otra imagen, el resultado se descarta: la nueva
+tiene su propia tarea.
+"""
+import hashlib
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import cache_catalogo
+from .models import Producto
+
+ANCHOS = (200, 400, 800)
+CARPETA = 'productos'
+CARPETA_DERIVADAS = 'productos/derivadas'
+
+# (formato de Pillow, extensión, tipo MIME, opciones de guardado), del más eficiente al respaldo
+FORMATOS = [
+    ('AVIF', 'avif', 'image/avif', {'quality': 50}),
+    ('WEBP', 'webp', 'image/webp', {'quality': 80, 'method': 6}),
+    ('JPEG', 'jpg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+]
+TIPOS_MIME = {extension: mime for _, extension, mime, _ in FORMATOS}
+
+
+def formatos_disponibles():
+    """Formatos que esta instalación de Pillow puede escribir (AVIF depende de libavif)."""
+    Image.init()
+    return [formato for formato in FORMATOS if formato[0] in Image.SAVE]
+
+
+def hash_contenido(datos):
+    return hashlib.sha256(datos).hexdigest()[:20]
+
+
+def _copiar_original(campo, datos, digest):
+    """Copia el original a un nombre basado en su hash; devuelve la ruta y si se creó el archivo."""
+    storage = campo.storage
+    extension = os.path.splitext(campo.name)[1].lower() or '.jpg'
+    ruta = f'{CARPETA}/{digest}{extension}'
+    if campo.name == ruta or storage.exists(ruta):
+        return ruta, False
+    storage.save(ruta, ContentFile(datos))
+    return ruta, True
+
+
+def _borrar_si_no_se_usa(storage, ruta):
+    if not Producto.objects.filter(imagen=ruta).exists() and storage.exists(ruta):
+        storage.delete(ruta)
+
+
+def _codificar(imagen, formato, opciones):
+    buffer = io.BytesIO()
+    if formato == 'JPEG' and imagen.mode not in ('RGB', 'L'):
+        imagen = imagen.convert('RGB')
+    imagen.save(buffer, format=formato, **opciones)
+    return buffer.getvalue()
+
+
+def generar_derivados(producto):
+    """
+    Renombra el original por hash y genera sus derivados. Marca el producto
+    como 'lista' solo si su imagen sigue siendo la que se leyó (un UPDATE
+    condicionado, que tampoco vuelve a encolarlo) y devuelve las variantes;
+    si la imagen cambió mientras tanto no guarda nada y devuelve {}.
+    """
+    if not producto.imagen:
+        return {}
+
+    leida = producto.imagen.name
+    with producto.imagen.open('rb') as archivo:
+        datos = archivo.read()
+    digest = hash_contenido(datos)
+    storage = producto.imagen.storage
+
+    with Image.open(io.BytesIO(datos)) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA', 'L'):
+            original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+        # Nunca se amplía: los anchos mayores al original se reemplazan por el ancho original
+        anchos = sorted({min(ancho, original.width) for ancho in ANCHOS})
+
+        variantes = {}
+        for ancho in anchos:
+            alto = max(1, round(original.height * ancho / original.width))
+            miniatura = original.resize((ancho, alto), Image.LANCZOS) if ancho != original.width else original
+            for formato, extension, _, opciones in formatos_disponibles():
+                ruta = f'{CARPETA_DERIVADAS}/{digest}-{ancho}.{extension}'
+                if not storage.exists(ruta):
+                    storage.save(ruta, ContentFile(_codificar(miniatura, formato, opciones)))
+                variantes.setdefault(extension, {})[str(ancho)] = ruta
+
+    ruta, creada = _copiar_original(producto.imagen, datos, digest)
+    ahora = timezone.now()
+    guardado = Producto.objects.filter(pk=producto.pk, imagen=leida).update(
+        imagen=ruta, imagen_variantes=variantes, estado_imagen='lista', fecha_actualizacion=ahora,
+    )
+    if not guardado:
+        if creada:
+            _borrar_si_no_se_usa(storage, ruta)
+        return {}
+
+    if leida != ruta:
+        _borrar_si_no_se_usa(storage, leida)
+    producto.imagen.name = ruta
+    producto.imagen_variantes = variantes
+    producto.estado_imagen = 'lista'
+    producto.fecha_actualizacion = ahora
+    cache_catalogo.invalidar_producto(producto.pk, producto.categoria)
+    return variantes
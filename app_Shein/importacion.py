@@ -0,0 +1,184 @@
+"""
+Importación masiva de productos desde CSV.
+
+El archivo se lee fila por fila; cada fila se valida contra las opciones del
+modelo (CATEGORIA_CHOICES, TALLA_CHOICES) y las válidas se insertan o
+actualizan por lotes con `bulk_create(update_conflicts=True)` usando el `sku`
+como clave. Una fila inválida se reporta con su número de línea y no detiene
+el resto del lote. Como bulk_create no dispara señales, al final de cada lote
+se indexan para la búsqueda, se registran los cambios de stock en el
+historial de inventario y se invalida la caché de los productos tocados.
+"""
+import csv
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import DatabaseError, transaction
+
+from . import busqueda, cache_catalogo, inventario
+from .models import Producto, CENTAVOS
+
+TAMANO_LOTE = 1000
+COLUMNAS_REQUERIDAS = ['sku', 'nombre', 'descripcion', 'precio', 'categoria', 'color', 'stock']
+# Campos que se sobrescriben cuando el SKU ya existe
+CAMPOS_ACTUALIZABLES = [
+    'nombre', 'descripcion', 'precio', 'categoria', 'talla', 'color', 'stock', 'disponible', 'fecha_actualizacion',
+]
+
+CATEGORIAS = {clave for clave, _ in Producto.CATEGORIA_CHOICES}
+TALLAS = {clave.lower(): clave for clave, _ in Producto.TALLA_CHOICES}
+VERDADERO = {'1', 'si', 'sí', 'true', 'verdadero', 'x', 'on'}
+FALSO = {'0', 'no', 'false', 'falso', 'off'}
+PRECIO_MAXIMO = Decimal('99999999.99')  # max_digits=10, decimal_places=2
+
+
+class ResultadoImportacion:
+
+    def __init__(self):
+        self.filas = 0
+        self.creados = 0
+        self.actualizados = 0
+        self.errores = []  # (número de línea, mensaje)
+        self.segundos = 0.0
+
+    @property
+    def filas_por_segundo(self):
+        return self.filas / max(self.segundos, 1e-9)
+
+    def resumen(self):
+        return (
+            f'{self.filas} filas en {self.segundos:.1f}s ({self.filas_por_segundo:,.0f} filas/s): '
+            f'{self.creados} creados, {self.actualizados} actualizados, {len(self.errores)} con error'
+        )
+
+
+def _texto(fila, campo, maximo=None, requerido=True):
+    valor = (fila.get(campo) or '').strip()
+    if requerido and not valor:
+        raise ValueError(f'{campo} es obligatorio')
+    if maximo and len(valor) > maximo:
+        raise ValueError(f'{campo} excede {maximo} caracteres')
+    return valor
+
+
+def validar_fila(fila):
+    """Convierte una fila del CSV en un Producto sin guardar; lanza ValueError si es inválida."""
+    precio_texto = _texto(fila, 'precio')
+    try:
+        precio = Decimal(precio_texto).quantize(CENTAVOS)
+    except InvalidOperation:
+        raise ValueError(f'precio inválido: {precio_texto}')
+    if not Decimal('0') < precio <= PRECIO_MAXIMO:
+        raise ValueError(f'precio fuera de rango: {precio_texto}')
+
+    categoria = _texto(fila, 'categoria').lower()
+    if categoria not in CATEGORIAS:
+        raise ValueError(f'categoría desconocida: {categoria} (válidas: {", ".join(sorted(CATEGORIAS))})')
+
+    talla = _texto(fila, 'talla', requerido=False)
+    if talla:
+        if talla.lower() not in TALLAS:
+            raise ValueError(f'talla desconocida: {talla}')
+        talla = TALLAS[talla.lower()]
+
+    stock_texto = _texto(fila, 'stock')
+    if not stock_texto.isdigit():
+        raise ValueError(f'stock inválido: {stock_texto}')
+
+    disponible = _texto(fila, 'disponible', requerido=False).lower()
+    if disponible and disponible not in VERDADERO | FALSO:
+        raise ValueError(f'disponible inválido: {disponible}')
+
+    return Producto(
+        sku=_texto(fila, 'sku', maximo=64),
+        nombre=_texto(fila, 'nombre', maximo=200),
+        descripcion=_texto(fila, 'descripcion'),
+        precio=precio,
+        categoria=categoria,
+        talla=talla or None,
+        color=_texto(fila, 'color', maximo=50),
+        stock=int(stock_texto),
+        disponible=disponible not in FALSO,
+    )
+
+
+def _guardar_lote(lote, resultado):
+    """Inserta/actualiza un lote {sku: (línea, producto)}; si la base lo rechaza, reintenta fila por fila."""
+    productos = [producto for _, producto in lote.values()]
+    # Una sola transacción con los productos existentes bloqueados (como en la reserva de un pedido): una
+    # venta no puede confirmarse entre leer las existencias y registrar la diferencia, y el historial y
+    # el stock del catálogo se guardan juntos o no se guardan
+    with transaction.atomic():
+        list(Producto.objects.select_for_update().filter(sku__in=lote).order_by('pk').values_list('pk', flat=True))
+        # sku -> (categoría, existencias) actuales, para contar actualizaciones, invalidar la categoría
+        # anterior y registrar la diferencia de stock en el historial de inventario
+        existentes = {
+            sku: (categoria, existencias)
+            for sku, categoria, existencias in inventario.con_existencias(Producto.objects.filter(sku__in=lote))
+            .values_list('sku', 'categoria', 'existencias')
+        }
+        try:
+            with transaction.atomic():
+                Producto.objects.bulk_create(
+                    productos, update_conflicts=True, unique_fields=['sku'], update_fields=CAMPOS_ACTUALIZABLES,
+                )
+        except DatabaseError:
+            guardados = []
+            for linea, producto in lote.values():
+                try:
+                    with transaction.atomic():
+                        Producto.objects.bulk_create(
+                            [producto], update_conflicts=True, unique_fields=['sku'], update_fields=CAMPOS_ACTUALIZABLES,
+                        )
+                    guardados.append(producto)
+                except DatabaseError as e:
+                    resultado.errores.append((linea, f'error de base de datos: {e}'))
+            productos = guardados
+
+        inventario.registrar_movimientos('reabastecimiento', [
+            (producto.pk, producto.stock, None) for producto in productos if producto.sku not in existentes
+        ], nota='Importación')
+        inventario.registrar_movimientos('ajuste', [
+            (producto.pk, producto.stock - existentes[producto.sku][1], None)
+            for producto in productos if producto.sku in existentes
+        ], nota='Importación')
+
+    actualizados = sum(1 for producto in productos if producto.sku in existentes)
+    resultado.actualizados += actualizados
+    resultado.creados += len(productos) - actualizados
+    busqueda.backend().indexar(productos)
+    cache_catalogo.invalidar_productos(productos)
+    cache_catalogo.invalidar_categorias(*(categoria for categoria, _ in existentes.values()))
+
+
+def importar_productos(archivo, lote=TAMANO_LOTE):
+    """Importa un CSV (objeto de texto iterable por líneas) y devuelve un ResultadoImportacion."""
+    resultado = ResultadoImportacion()
+    inicio = time.perf_counter()
+    lector = csv.DictReader(archivo)
+    faltantes = [columna for columna in COLUMNAS_REQUERIDAS if columna not in (lector.fieldnames or [])]
+    if faltantes:
+        resultado.errores.append((1, f'faltan columnas: {", ".join(faltantes)}'))
+        return resultado
+
+    pendientes = {}
+    for fila in lector:
+        resultado.filas += 1
+        linea = lector.line_num
+        try:
+            producto = validar_fila(fila)
+        except ValueError as e:
+            resultado.errores.append((linea, str(e)))
+            continue
+        if producto.sku in pendientes:
+            # Un mismo SKU no puede aparecer dos veces en un upsert: gana la última fila
+            resultado.errores.append((pendientes[producto.sku][0], f'SKU {producto.sku} repetido en la línea {linea}; se usa esa'))
+        pendientes[producto.sku] = (linea, producto)
+        if len(pendientes) >= lote:
+            _guardar_lote(pendientes, resultado)
+            pendientes = {}
+    if pendientes:
+        _guardar_lote(pendientes, resultado)
+
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
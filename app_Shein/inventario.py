@@ -0,0 +1,230 @@
+"""
+Inventario como historial de movimientos: reserva de stock para la creación
+de pedidos, su devolución al cancelarlos y los ajustes manuales.
+
+Cada cambio de stock es un MovimientoInventario (venta, cancelación,
+reabastecimiento o ajuste), insertado por lotes y nunca modificado. Las
+existencias son el último CorteInventario del producto más los movimientos
+posteriores (un JOIN y una subconsulta sobre movimiento_producto_idx);
+`compactar()` avanza los cortes para que esa suma siga siendo corta.
+
+Para que dos compras no vendan la misma unidad, la reserva bloquea las
+filas de los productos (siempre en orden de clave primaria, así dos pedidos
+con los mismos productos no se bloquean mutuamente) y recién entonces lee
+sus existencias. `Producto.stock` es la copia que usa el catálogo para
+filtrar y mostrar: vender, cancelar y ajustar la actualizan con un solo
+UPDATE en la misma transacción que inserta sus movimientos, y `compactar()`
+corrige la que se haya desviado del historial.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import cache_catalogo
+from .models import CorteInventario, MovimientoInventario, Producto
+
+TAMANO_LOTE = 1000
+# Solo se compactan movimientos con esta antigüedad: una transacción aún abierta podría confirmar
+# después un movimiento con un id menor que el último compactado, y el corte no lo incluiría
+MARGEN_COMPACTACION = timedelta(minutes=1)
+
+
+class StockInsuficiente(Exception):
+    """No hay unidades suficientes de un producto para completar el pedido."""
+
+    def __init__(self, producto, disponible):
+        self.producto = producto
+        self.disponible = disponible
+        super().__init__(f'Stock insuficiente para {producto.nombre}. Solo hay {disponible} unidades.')
+
+
+def _valor_por_producto(valores):
+    return Case(
+        *[When(pk=producto_id, then=Value(valor)) for producto_id, valor in valores.items()],
+        output_field=IntegerField(),
+    )
+
+
+def reservar_stock(cantidades):
+    """
+    Reserva `cantidades` ({producto_id: cantidad}) y devuelve los productos
+    bloqueados como {producto_id: Producto}, con sus `existencias` ya
+    descontadas y copiadas a `stock`. La venta queda reservada al insertar sus
+    movimientos (`registrar_movimientos('venta', ...)`) en la misma transacción.
+
+    Debe llamarse dentro de `transaction.atomic()`: si alguna línea no tiene
+    stock se lanza `StockInsuficiente` y la transacción completa se revierte.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        raise RuntimeError('reservar_stock() debe ejecutarse dentro de transaction.atomic().')
+
+    ids = sorted(int(producto_id) for producto_id in cantidades)
+    cantidades = {int(producto_id): cantidad for producto_id, cantidad in cantidades.items()}
+    for producto_id in ids:
+        if cantidades[producto_id] <= 0:
+            raise ValueError('La cantidad debe ser mayor a cero.')
+
+    productos = Producto.objects.select_for_update().order_by('pk').in_bulk(ids)
+    faltantes = set(ids) - set(productos)
+    if faltantes:
+        raise Producto.DoesNotExist(f'No existe el producto {min(faltantes)}.')
+
+    # Las existencias se leen en otra consulta, después de tener el bloqueo: así ven los movimientos
+    # que confirmó el pedido que lo tenía antes (en la misma consulta se leerían los de antes de esperar)
+    disponibles = existencias(ids)
+    for producto_id in ids:
+        producto = productos[producto_id]
+        producto.existencias = disponibles.get(producto_id, 0)
+        if producto.existencias < cantidades[producto_id]:
+            raise StockInsuficiente(producto, producto.existencias)
+        producto.existencias -= cantidades[producto_id]
+
+    # Un solo UPDATE para la copia del catálogo, con las existencias leídas bajo el bloqueo
+    Producto.objects.filter(pk__in=ids).update(
+        stock=_valor_por_producto({producto_id: productos[producto_id].existencias for producto_id in ids}),
+        fecha_actualizacion=timezone.now(),
+    )
+    for producto in productos.values():
+        producto.stock = producto.existencias
+    return productos
+
+
+def registrar_movimientos(tipo, lineas, nota=''):
+    """Inserta los movimientos `lineas` ((producto_id, cantidad con signo, pedido_id o None)) por lotes."""
+    MovimientoInventario.objects.bulk_create([
+        MovimientoInventario(producto_id=producto_id, cantidad=cantidad, tipo=tipo, pedido_id=pedido_id, nota=nota)
+        for producto_id, cantidad, pedido_id in lineas
+        if cantidad
+    ], batch_size=TAMANO_LOTE)
+
+
+def liberar_stock(lineas):
+    """
+    Devuelve al stock los items `lineas` ((pedido_id, producto_id, cantidad)) de
+    pedidos cancelados: un UPDATE relativo de la copia del catálogo y los
+    movimientos de cancelación por lotes.
+
+    Debe llamarse dentro de la misma transacción que cancela los pedidos.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        raise RuntimeError('liberar_stock() debe ejecutarse dentro de transaction.atomic().')
+    cantidades = {}
+    for _, producto_id, cantidad in lineas:
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+    if not cantidades:
+        return
+    Producto.objects.filter(pk__in=sorted(cantidades)).update(
+        stock=F('stock') + _valor_por_producto(cantidades), fecha_actualizacion=timezone.now(),
+    )
+    registrar_movimientos('cancelacion', [(producto_id, cantidad, pedido_id) for pedido_id, producto_id, cantidad in lineas])
+
+
+def ajustar_stock(producto_id, cantidad, tipo='ajuste', nota=''):
+    """
+    Suma `cantidad` (negativa para retirar) a las existencias registrando el
+    movimiento. Lanza ValueError si quedarían negativas.
+    """
+    with transaction.atomic():
+        # Mismo bloqueo que la reserva de un pedido, así un retiro no cuenta unidades que se están vendiendo
+        if not list(Producto.objects.select_for_update().filter(pk=producto_id).values_list('pk', flat=True)):
+            raise Producto.DoesNotExist(f'No existe el producto {producto_id}.')
+        restantes = existencias([producto_id]).get(producto_id, 0) + cantidad
+        if restantes < 0:
+            raise ValueError('El ajuste dejaría el stock en negativo.')
+        Producto.objects.filter(pk=producto_id).update(stock=restantes, fecha_actualizacion=timezone.now())
+        registrar_movimientos(tipo, [(producto_id, cantidad, None)], nota)
+
+
+def con_existencias(productos):
+    """Anota `existencias` (corte más movimientos posteriores) en el queryset de Producto `productos`."""
+    # Corte (un JOIN) más la suma de los movimientos posteriores (subconsulta sobre movimiento_producto_idx)
+    posteriores = (
+        MovimientoInventario.objects.filter(producto=OuterRef('pk'), pk__gt=OuterRef('corte_hasta'))
+        .values('producto').annotate(suma=Sum('cantidad')).values('suma')
+    )
+    return productos.annotate(
+        corte_hasta=Coalesce(F('corte_inventario__ultimo_movimiento'), 0),
+        existencias=Coalesce(F('corte_inventario__cantidad'), 0) + Coalesce(Subquery(posteriores), 0),
+    )
+
+
+def existencias(producto_ids):
+    """{producto_id: existencias según el historial} en una consulta."""
+    return dict(con_existencias(Producto.objects.filter(pk__in=producto_ids)).values_list('pk', 'existencias'))
+
+
+def compactar(margen=MARGEN_COMPACTACION, lote=TAMANO_LOTE):
+    """
+    Suma a cada corte los movimientos posteriores con al menos `margen` de
+    antigüedad (una consulta agrupada y un upsert por lotes) y corrige el
+    `Producto.stock` que no coincida con las existencias de los productos que
+    tuvieron movimientos; devuelve cuántos cortes cambiaron. Los movimientos
+    no se borran.
+
+    Todo ocurre en una transacción que bloquea primero los cortes a avanzar:
+    una compactación simultánea espera y después lee los cortes ya avanzados.
+    Además cada corte nuevo sale de una sola consulta (corte anterior más sus
+    movimientos), así que aunque dos compactaciones lo calculen a la vez
+    ningún movimiento se suma dos veces.
+    """
+    with transaction.atomic():
+        desde = Coalesce(Subquery(CorteInventario.objects.filter(producto=OuterRef('producto')).values('ultimo_movimiento')), 0)
+        pendientes = MovimientoInventario.objects.alias(desde=desde).filter(pk__gt=F('desde'))
+        ids = sorted(set(pendientes.order_by().values_list('producto_id', flat=True).distinct()))
+        list(CorteInventario.objects.select_for_update().filter(producto_id__in=ids).order_by('pk').values_list('pk', flat=True))
+
+        cortes = []
+        limite = MovimientoInventario.objects.filter(fecha__lte=timezone.now() - margen).aggregate(limite=Max('pk'))['limite']
+        if limite is not None:
+            anterior = Coalesce(Subquery(CorteInventario.objects.filter(producto=OuterRef('producto')).values('cantidad')), 0)
+            cortes = [
+                CorteInventario(producto_id=producto_id, cantidad=cantidad, ultimo_movimiento=limite)
+                for producto_id, cantidad in (
+                    pendientes.filter(pk__lte=limite).values('producto_id')
+                    .annotate(nueva=anterior + Sum('cantidad')).order_by().values_list('producto_id', 'nueva')
+                )
+            ]
+            CorteInventario.objects.bulk_create(
+                cortes, update_conflicts=True, unique_fields=['producto'],
+                update_fields=['cantidad', 'ultimo_movimiento', 'fecha'], batch_size=lote,
+            )
+
+        for inicio in range(0, len(ids), lote):
+            _actualizar_stock_catalogo(ids[inicio:inicio + lote])
+    return len(cortes)
+
+
+def _actualizar_stock_catalogo(producto_ids):
+    # Mismo bloqueo que la reserva: sin él se podría pisar la copia que acaba de escribir una venta
+    list(Producto.objects.select_for_update().filter(pk__in=producto_ids).order_by('pk').values_list('pk', flat=True))
+    # bulk_update no dispara las señales de Producto: el historial no registra nada y la caché se invalida aquí
+    cambiados = list(
+        con_existencias(Producto.objects.filter(pk__in=producto_ids)).exclude(stock=F('existencias'))
+        .only('categoria', 'stock')
+    )
+    ahora = timezone.now()
+    for producto in cambiados:
+        producto.stock = max(producto.existencias, 0)
+        producto.fecha_actualizacion = ahora
+    if cambiados:
+        Producto.objects.bulk_update(cambiados, ['stock', 'fecha_actualizacion'])
+        cache_catalogo.invalidar_productos(cambiados)
+
+
+def reiniciar_cortes(lote=TAMANO_LOTE):
+    """
+    Toma `Producto.stock` como existencias de todos los productos a partir del
+    último movimiento (para datos cargados sin historial, como los de seed_shein).
+    """
+    ultimo = MovimientoInventario.objects.aggregate(ultimo=Max('pk'))['ultimo'] or 0
+    cortes = [
+        CorteInventario(producto_id=producto_id, cantidad=stock, ultimo_movimiento=ultimo)
+        for producto_id, stock in Producto.objects.values_list('pk', 'stock').iterator(chunk_size=lote)
+    ]
+    with transaction.atomic():
+        CorteInventario.objects.all().delete()
+        CorteInventario.objects.bulk_create(cortes, batch_size=lote)
+    return len(cortes)
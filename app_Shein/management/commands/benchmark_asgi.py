@@ -0,0 +1,146 @@
+import asyncio
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from app_Shein.management.commands.benchmark_shein import MUESTRAS, percentil
+
+# (vista síncrona, vista asíncrona equivalente, parámetro de la URL)
+PARES = [
+    ('catalogo_productos', 'catalogo_productos_async', None),
+    ('detalle_producto', 'detalle_producto_async', 'producto_id'),
+    ('detalle_pedido', 'detalle_pedido_async', 'pedido_id'),
+]
+
+
+class Command(BaseCommand):
+    """
+    Sin --servidor mide los handlers en proceso (Client y AsyncClient), sin un
+    servidor ASGI/WSGI de por medio: sirve para comparar el costo de cada ruta,
+    no el de un despliegue. En ambos casos las consultas de una vista asíncrona
+    no se solapan: el ORM asíncrono las ejecuta una a una en el hilo de
+    sync_to_async(thread_sensitive=True); lo que gana ASGI es atender otras
+    peticiones mientras tanto.
+    """
+    help = (
+        'Compara el rendimiento (peticiones/s, p50/p95) de las vistas de lectura síncronas contra sus versiones '
+        'asíncronas, con varias peticiones concurrentes. Sin --servidor usa los handlers en proceso (sin servidor '
+        'ASGI/WSGI); con --servidor mide un servidor real.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=200, help='Peticiones por vista.')
+        parser.add_argument('--concurrencia', type=int, default=10)
+        parser.add_argument(
+            '--servidor', metavar='URL',
+            help=(
+                'Mide un servidor ya levantado en lugar de los handlers en proceso, p. ej. '
+                '"uvicorn backend_Shein.asgi:application" o "gunicorn backend_Shein.wsgi" en http://127.0.0.1:8000. '
+                'Ejecutarlo una vez contra cada servidor para compararlos.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        peticiones = max(1, options['peticiones'])
+        concurrencia = max(1, options['concurrencia'])
+        muestras = {parametro: MUESTRAS[parametro]() for parametro in ('producto_id', 'pedido_id')}
+        faltantes = [parametro for parametro, valor in muestras.items() if valor is None]
+        if faltantes:
+            raise CommandError(f'No hay datos para {", ".join(faltantes)}: ejecuta primero seed_shein.')
+
+        def url(nombre, parametro):
+            return reverse(nombre, kwargs={parametro: muestras[parametro]} if parametro else None)
+
+        resultados = []
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for sincrona, asincrona, parametro in PARES:
+                if options['servidor']:
+                    base = options['servidor'].rstrip('/')
+                    for nombre in (sincrona, asincrona):
+                        resultados.append((nombre, 'servidor', self.medir_servidor(
+                            base + url(nombre, parametro), peticiones, concurrencia,
+                        )))
+                else:
+                    resultados.append((sincrona, 'wsgi', self.medir_wsgi(url(sincrona, parametro), peticiones, concurrencia)))
+                    resultados.append((asincrona, 'asgi', asyncio.run(
+                        self.medir_asgi(url(asincrona, parametro), peticiones, concurrencia)
+                    )))
+
+        self.imprimir(resultados)
+
+    def medir_wsgi(self, url, peticiones, concurrencia):
+        def pedir(_):
+            inicio = time.perf_counter()
+            respuesta = Client(raise_request_exception=False).get(url)
+            return respuesta.status_code, (time.perf_counter() - inicio) * 1000
+
+        Client().get(url)  # Calentamiento (caché, plantillas compiladas)
+        inicio = time.perf_counter()
+        if concurrencia == 1:
+            medidas = [pedir(i) for i in range(peticiones)]
+        else:
+            def pedir_y_cerrar(i):
+                try:
+                    return pedir(i)
+                finally:
+                    connections.close_all()  # Cada hilo abre su propia conexión
+
+            with ThreadPoolExecutor(concurrencia) as pool:
+                medidas = list(pool.map(pedir_y_cerrar, range(peticiones)))
+        return self.resumir(medidas, time.perf_counter() - inicio)
+
+    async def medir_asgi(self, url, peticiones, concurrencia):
+        cliente = AsyncClient(raise_request_exception=False)
+        limite = asyncio.Semaphore(concurrencia)
+
+        async def pedir():
+            async with limite:
+                inicio = time.perf_counter()
+                respuesta = await cliente.get(url)
+                return respuesta.status_code, (time.perf_counter() - inicio) * 1000
+
+        await cliente.get(url)
+        inicio = time.perf_counter()
+        medidas = await asyncio.gather(*(pedir() for _ in range(peticiones)))
+        return self.resumir(medidas, time.perf_counter() - inicio)
+
+    def medir_servidor(self, url, peticiones, concurrencia):
+        def pedir(_):
+            inicio = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url) as respuesta:
+                    respuesta.read()
+                    estado = respuesta.status
+            except urllib.error.HTTPError as e:
+                estado = e.code
+            return estado, (time.perf_counter() - inicio) * 1000
+
+        pedir(None)
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(concurrencia) as pool:
+            medidas = list(pool.map(pedir, range(peticiones)))
+        return self.resumir(medidas, time.perf_counter() - inicio)
+
+    def resumir(self, medidas, segundos):
+        tiempos = [ms for _, ms in medidas]
+        return {
+            'estado': max(estado for estado, _ in medidas),
+            'peticiones_por_segundo': round(len(medidas) / segundos, 1),
+            'p50_ms': round(percentil(tiempos, 50), 3),
+            'p95_ms': round(percentil(tiempos, 95), 3),
+        }
+
+    def imprimir(self, resultados):
+        self.stdout.write(f"{'vista':<28} {'ruta':<9} {'estado':>6} {'pet/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+        for nombre, ruta, datos in resultados:
+            self.stdout.write(
+                f"{nombre:<28} {ruta:<9} {datos['estado']:>6} {datos['peticiones_por_segundo']:>9.1f} "
+                f"{datos['p50_ms']:>9.2f} {datos['p95_ms']:>9.2f}"
+            )
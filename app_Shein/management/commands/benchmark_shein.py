@@ -0,0 +1,128 @@
+import json
+import math
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from app_Shein import urls
+from app_Shein.models import Usuario, Producto, Pedido, MetodoPago, CuponDescuento, Resena
+
+# Objeto de ejemplo para cada parámetro de las URLs de la app
+MUESTRAS = {
+    'usuario_id': lambda: Usuario.objects.order_by('-pk').values_list('pk', flat=True).first(),
+    'producto_id': lambda: (
+        Producto.objects.filter(disponible=True, stock__gt=0).order_by('-pk').values_list('pk', flat=True).first()
+    ),
+    'pedido_id': lambda: Pedido.objects.order_by('-pk').values_list('pk', flat=True).first(),
+    'metodo_pago_id': lambda: MetodoPago.objects.order_by('-pk').values_list('pk', flat=True).first(),
+    'cupon_id': lambda: CuponDescuento.objects.order_by('-pk').values_list('pk', flat=True).first(),
+    'resena_id': lambda: Resena.objects.order_by('-pk').values_list('pk', flat=True).first(),
+}
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano."""
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Mide latencia (p50/p95) y número de consultas de cada URL de app_Shein con peticiones GET.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--guardar', metavar='ARCHIVO', help='Guarda los resultados como línea base (JSON).')
+        parser.add_argument('--comparar', metavar='ARCHIVO', help='Compara contra una línea base guardada.')
+        parser.add_argument(
+            '--tolerancia', type=float, default=0.2,
+            help='Aumento de p95 permitido contra la línea base (0.2 = 20%%).',
+        )
+
+    def handle(self, *args, **options):
+        repeticiones = max(1, options['repeticiones'])
+        muestras = {parametro: obtener() for parametro, obtener in MUESTRAS.items()}
+        # Una vista que falla se reporta con su código 500 en lugar de detener la medición
+        cliente = Client(raise_request_exception=False)
+        resultados = {}
+
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for patron in urls.urlpatterns:
+                if not patron.name:
+                    continue
+                parametros = list(getattr(patron.pattern, 'converters', {}))
+                if any(muestras.get(parametro) is None for parametro in parametros):
+                    self.stdout.write(f'{patron.name}: omitida (no hay datos para {", ".join(parametros)})')
+                    continue
+                url = reverse(patron.name, kwargs={parametro: muestras[parametro] for parametro in parametros})
+                resultados[patron.name] = self.medir(cliente, url, repeticiones)
+
+        self.imprimir(resultados)
+
+        if options['guardar']:
+            with open(options['guardar'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2, sort_keys=True)
+            self.stdout.write(f"Línea base guardada en {options['guardar']}")
+
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as archivo:
+                base = json.load(archivo)
+            self.comparar(resultados, base, options['tolerancia'])
+
+    def pedir(self, cliente, url):
+        respuesta = cliente.get(url)
+        if respuesta.streaming:
+            # El cuerpo (y sus consultas) de una respuesta streaming se genera al recorrerlo
+            for _ in respuesta.streaming_content:
+                pass
+        return respuesta
+
+    def medir(self, cliente, url, repeticiones):
+        self.pedir(cliente, url)  # Calentamiento (caché, plantillas compiladas)
+        tiempos = []
+        consultas = []
+        estado = None
+        for _ in range(repeticiones):
+            with CaptureQueriesContext(connection) as ctx:
+                inicio = time.perf_counter()
+                respuesta = self.pedir(cliente, url)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas.append(len(ctx.captured_queries))
+            estado = respuesta.status_code
+        return {
+            'url': url,
+            'estado': estado,
+            'p50_ms': round(percentil(tiempos, 50), 3),
+            'p95_ms': round(percentil(tiempos, 95), 3),
+            'consultas': int(statistics.median(consultas)),
+        }
+
+    def imprimir(self, resultados):
+        self.stdout.write(f"{'vista':<28} {'estado':>6} {'p50 ms':>9} {'p95 ms':>9} {'consultas':>9}")
+        for nombre, datos in resultados.items():
+            self.stdout.write(
+                f"{nombre:<28} {datos['estado']:>6} {datos['p50_ms']:>9.2f} {datos['p95_ms']:>9.2f} {datos['consultas']:>9}"
+            )
+
+    def comparar(self, resultados, base, tolerancia):
+        regresiones = []
+        for nombre, datos in resultados.items():
+            anterior = base.get(nombre)
+            if anterior is None:
+                continue
+            cambio = (datos['p95_ms'] - anterior['p95_ms']) / anterior['p95_ms'] if anterior['p95_ms'] else 0
+            self.stdout.write(
+                f"{nombre:<28} p95 {anterior['p95_ms']:.2f} -> {datos['p95_ms']:.2f} ms ({cambio:+.0%}), "
+                f"consultas {anterior['consultas']} -> {datos['consultas']}"
+            )
+            if cambio > tolerancia or datos['consultas'] > anterior['consultas']:
+                regresiones.append(nombre)
+
+        if regresiones:
+            raise CommandError(f'Regresiones de rendimiento en: {", ".join(regresiones)}')
+        self.stdout.write(self.style.SUCCESS('Sin regresiones contra la línea base.'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_Shein.exportacion import filtrar_pedidos, leer_fecha
+from app_Shein.models import Pedido
+from app_Shein.pedidos import cambiar_estado
+
+
+class Command(BaseCommand):
+    help = (
+        'Cambia el estado de muchos pedidos a la vez (p. ej. marcar como enviados los del turno), respetando '
+        'las transiciones permitidas. Al cancelar se devuelve el stock de los items.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('estado', choices=[clave for clave, _ in Pedido.ESTADO_CHOICES])
+        parser.add_argument('--ids', type=int, nargs='+', help='Pedidos a cambiar.')
+        parser.add_argument('--desde', help='Pedidos desde esta fecha (AAAA-MM-DD).')
+        parser.add_argument('--hasta', help='Pedidos hasta esta fecha (AAAA-MM-DD).')
+        parser.add_argument('--estado-actual', choices=[clave for clave, _ in Pedido.ESTADO_CHOICES])
+
+    def handle(self, *args, **options):
+        try:
+            desde, hasta = leer_fecha(options['desde']), leer_fecha(options['hasta'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not (options['ids'] or desde or hasta or options['estado_actual']):
+            raise CommandError('Indica los pedidos con --ids o con un filtro (--desde, --hasta, --estado-actual).')
+
+        pedidos = options['ids'] or filtrar_pedidos(Pedido.objects.all(), desde, hasta, options['estado_actual'])
+        actualizados, rechazados = cambiar_estado(pedidos, options['estado'])
+        for pedido_id, motivo in rechazados.items():
+            self.stderr.write(f'Pedido {pedido_id}: {motivo}')
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(actualizados)} pedidos pasaron a {options['estado']}; {len(rechazados)} rechazados."
+        ))
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from app_Shein import inventario
+
+
+class Command(BaseCommand):
+    help = (
+        'Suma los movimientos de inventario recientes a los cortes de cada producto para que leer las '
+        'existencias siga costando una consulta corta, y corrige el stock del catálogo que no coincida con el historial.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--margen', type=int, default=int(inventario.MARGEN_COMPACTACION.total_seconds()),
+            help='Segundos de antigüedad mínima de los movimientos a compactar.',
+        )
+        parser.add_argument('--lote', type=int, default=inventario.TAMANO_LOTE, help='Tamaño de lote para el upsert.')
+        parser.add_argument(
+            '--desde-stock', action='store_true',
+            help='Descarta los cortes y toma el stock actual de cada producto como punto de partida.',
+        )
+
+    def handle(self, *args, **options):
+        if options['desde_stock']:
+            total = inventario.reiniciar_cortes(lote=options['lote'])
+            self.stdout.write(self.style.SUCCESS(f'Listo: {total} cortes tomados del stock actual.'))
+            return
+
+        total = inventario.compactar(margen=timedelta(seconds=options['margen']), lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Listo: {total} cortes actualizados.'))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_Shein.exportacion import FORMATOS, TAMANO_LOTE, leer_fecha, lineas_exportacion, pedidos_para_exportar
+
+
+class Command(BaseCommand):
+    help = 'Exporta los pedidos con sus items, cliente, método de pago y cupón (CSV o JSONL) en streaming.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=FORMATOS, default='csv')
+        parser.add_argument('--salida', metavar='ARCHIVO', help='Archivo de salida (por defecto, la salida estándar).')
+        parser.add_argument('--desde', help='Fecha inicial AAAA-MM-DD (inclusive).')
+        parser.add_argument('--hasta', help='Fecha final AAAA-MM-DD (inclusive).')
+        parser.add_argument('--estado', help='Exporta solo los pedidos en este estado.')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Pedidos leídos por consulta.')
+
+    def handle(self, *args, **options):
+        try:
+            desde, hasta = leer_fecha(options['desde']), leer_fecha(options['hasta'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        pedidos = pedidos_para_exportar(desde, hasta, options['estado'], lote=options['lote'])
+        inicio = time.perf_counter()
+        lineas = 0
+        archivo = open(options['salida'], 'w', encoding='utf-8', newline='') if options['salida'] else None
+        escribir = archivo.write if archivo else (lambda linea: self.stdout.write(linea, ending=''))
+        try:
+            for linea in lineas_exportacion(options['formato'], pedidos):
+                escribir(linea)
+                lineas += 1
+        finally:
+            if archivo:
+                archivo.close()
+
+        segundos = time.perf_counter() - inicio
+        # El resumen va a stderr para no mezclarse con los datos cuando se exporta a la salida estándar
+        self.stderr.write(f'{lineas} líneas en {segundos:.1f}s ({lineas / max(segundos, 1e-9):,.0f} líneas/s)')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_Shein.importacion import TAMANO_LOTE, importar_productos
+
+
+class Command(BaseCommand):
+    help = 'Importa productos desde un CSV (inserta o actualiza por SKU en lotes) y reporta errores por fila.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='CSV con columnas sku,nombre,descripcion,precio,categoria,talla,color,stock,disponible.')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas por bulk_create.')
+
+    def handle(self, *args, **options):
+        try:
+            archivo = open(options['archivo'], encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(f'No se pudo abrir {options["archivo"]}: {e}')
+        with archivo:
+            resultado = importar_productos(archivo, lote=max(1, options['lote']))
+
+        for linea, mensaje in resultado.errores:
+            self.stderr.write(f'Línea {linea}: {mensaje}')
+        estilo = self.style.WARNING if resultado.errores else self.style.SUCCESS
+        self.stdout.write(estilo(resultado.resumen()))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from app_Shein.imagenes import generar_derivados
+from app_Shein.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Genera miniaturas y variantes WebP/AVIF de las imágenes de producto que aún no las tienen.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true', help='Regenera también los que ya tienen derivados.')
+
+    def handle(self, *args, **options):
+        productos = Producto.objects.exclude(imagen='').exclude(imagen__isnull=True)
+        if not options['todos']:
+            productos = productos.filter(imagen_variantes={})
+
+        procesados = errores = 0
+        for producto in productos.iterator():
+            try:
+                generar_derivados(producto)
+                procesados += 1
+            except Exception as e:
+                errores += 1
+                self.stderr.write(f'Producto {producto.pk}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Listo: {procesados} imágenes procesadas, {errores} con error.'))
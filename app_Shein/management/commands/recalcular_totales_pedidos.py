@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from app_Shein.models import Pedido, ItemPedido, Producto, SUBTOTAL_ITEMS
+from app_Shein.ventas import reconstruir_ventas
+
+
+class Command(BaseCommand):
+    help = (
+        'Congela el precio de los items y recalcula los totales guardados de los pedidos, por lotes; '
+        'después reconstruye los resúmenes diarios de ventas con los totales nuevos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Pedidos procesados por transacción.')
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        ultimo_id = 0
+        procesados = 0
+
+        while True:
+            pedidos = list(
+                Pedido.objects.filter(id_pedido__gt=ultimo_id)
+                .select_related('cupon')
+                .only('id_pedido', 'cupon', 'cupon__descuento_porcentaje', 'subtotal', 'descuento', 'total')
+                .order_by('id_pedido')[:lote]
+            )
+            if not pedidos:
+                break
+            ids = [pedido.id_pedido for pedido in pedidos]
+
+            with transaction.atomic():
+                # Los items anteriores a la migración toman el precio actual del producto
+                ItemPedido.objects.filter(pedido_id__in=ids, precio_unitario__isnull=True).update(
+                    precio_unitario=Subquery(
+                        Producto.objects.filter(pk=OuterRef('producto_id')).values('precio')[:1]
+                    )
+                )
+                subtotales = dict(
+                    ItemPedido.objects.filter(pedido_id__in=ids)
+                    .values('pedido_id')
+                    .annotate(subtotal=SUBTOTAL_ITEMS)
+                    .values_list('pedido_id', 'subtotal')
+                )
+                for pedido in pedidos:
+                    pedido.aplicar_totales(subtotales.get(pedido.id_pedido))
+                Pedido.objects.bulk_update(pedidos, ['subtotal', 'descuento', 'total'])
+
+            procesados += len(pedidos)
+            ultimo_id = ids[-1]
+            self.stdout.write(f'{procesados} pedidos recalculados...')
+
+        # bulk_update no dispara las señales que mantienen los resúmenes de ventas: sin esto se quedarían
+        # con los totales anteriores
+        filas = reconstruir_ventas(lote=lote)
+        self.stdout.write(self.style.SUCCESS(
+            f'Listo: {procesados} pedidos recalculados, {filas} filas de resúmenes de ventas reconstruidas.'
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from app_Shein import busqueda
+
+
+class Command(BaseCommand):
+    help = 'Regenera el índice de búsqueda de productos con el backend configurado.'
+
+    def handle(self, *args, **options):
+        backend = busqueda.backend()
+        total = backend.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'Listo: {total} productos indexados con {type(backend).__name__}.'))
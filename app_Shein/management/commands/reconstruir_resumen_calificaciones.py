@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from app_Shein.calificaciones import reconstruir_resumenes, recalcular_resumen
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde las reseñas el resumen de calificaciones de los productos (reparación de desfases).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--producto', type=int, help='Recalcular solo este producto.')
+        parser.add_argument('--lote', type=int, default=1000, help='Tamaño de lote para la inserción.')
+
+    def handle(self, *args, **options):
+        if options['producto']:
+            recalcular_resumen(options['producto'])
+            self.stdout.write(self.style.SUCCESS(f"Resumen del producto {options['producto']} recalculado."))
+            return
+
+        total = reconstruir_resumenes(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Listo: {total} resúmenes reconstruidos.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_Shein.exportacion import leer_fecha
+from app_Shein.ventas import reconstruir_ventas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde los pedidos los resúmenes diarios de ventas del panel (reparación de desfases).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Recalcular solo desde esta fecha (AAAA-MM-DD).')
+        parser.add_argument('--lote', type=int, default=1000, help='Tamaño de lote para la inserción.')
+
+    def handle(self, *args, **options):
+        try:
+            desde = leer_fecha(options['desde'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        total = reconstruir_ventas(desde=desde, lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Listo: {total} filas de resumen reconstruidas.'))
@@ -0,0 +1,67 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from app_Shein.tareas import ejecutar_tarea, recuperar_abandonadas, tomar_tareas
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de tareas en segundo plano (imágenes de producto) con un pool de procesos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos', type=int, default=os.cpu_count() or 1,
+            help='Procesos del pool; 0 ejecuta las tareas en este mismo proceso.',
+        )
+        parser.add_argument('--lote', type=int, help='Tareas que se toman por vuelta (por defecto 2 por proceso).')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera cuando la cola está vacía.')
+        parser.add_argument('--una-vez', action='store_true', help='Termina cuando ya no hay tareas disponibles.')
+
+    def handle(self, *args, **options):
+        procesos = max(0, options['procesos'])
+        lote = options['lote'] or max(1, procesos) * 2
+        self.completadas = self.fallidas = 0
+
+        try:
+            if procesos == 0:
+                self.consumir(map, lote, options)
+            else:
+                with ProcessPoolExecutor(max_workers=procesos, initializer=django.setup) as pool:
+                    def ejecutar_en_pool(funcion, ids):
+                        # Los procesos del pool abren su propia conexión; no deben heredar la del padre
+                        connections.close_all()
+                        return pool.map(funcion, ids)
+
+                    self.consumir(ejecutar_en_pool, lote, options)
+        except KeyboardInterrupt:
+            self.stdout.write('Worker detenido.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Tareas completadas: {self.completadas}, con error: {self.fallidas}.'
+        ))
+
+    def consumir(self, ejecutar, lote, options):
+        while True:
+            devueltas, fallidas = recuperar_abandonadas()
+            if devueltas:
+                self.stdout.write(f'{devueltas} tareas abandonadas devueltas a la cola.')
+            if fallidas:
+                self.fallidas += fallidas
+                self.stdout.write(f'{fallidas} tareas abandonadas sin intentos restantes marcadas como fallidas.')
+
+            ids = tomar_tareas(lote)
+            if not ids:
+                if options['una_vez']:
+                    return
+                time.sleep(options['intervalo'])
+                continue
+
+            for correcta in ejecutar(ejecutar_tarea, ids):
+                if correcta:
+                    self.completadas += 1
+                else:
+                    self.fallidas += 1
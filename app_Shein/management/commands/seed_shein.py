@@ -0,0 +1,289 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from app_Shein import busqueda, inventario
+from app_Shein.calificaciones import reconstruir_resumenes
+from app_Shein.models import (
+    Usuario, Producto, Pedido, ItemPedido, MetodoPago, CuponDescuento, Resena, ResumenCalificacion,
+    VentaDiaria, VentaDiariaCategoria, CorteInventario, MovimientoInventario, TareaFondo, TerminoProducto,
+)
+from app_Shein.ventas import reconstruir_ventas
+
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Sofía', 'Carlos', 'Valeria', 'Diego', 'Camila', 'Jorge', 'Lucía', 'Miguel']
+APELLIDOS = ['García', 'Hernández', 'López', 'Martínez', 'González', 'Pérez', 'Rodríguez', 'Sánchez', 'Ramírez', 'Loya']
+PRENDAS = {
+    'ropa': ['Blusa', 'Vestido', 'Falda', 'Jeans', 'Sudadera', 'Chamarra'],
+    'accesorios': ['Bolsa', 'Collar', 'Aretes', 'Cinturón', 'Lentes de sol'],
+    'zapatos': ['Tenis', 'Botas', 'Sandalias', 'Tacones', 'Flats'],
+    'belleza': ['Labial', 'Delineador', 'Paleta de sombras', 'Base', 'Rímel'],
+    'hogar': ['Cojín', 'Lámpara', 'Organizador', 'Cortina', 'Tapete'],
+}
+ADJETIVOS = ['Básico', 'Floral', 'Oversize', 'Casual', 'Elegante', 'Vintage', 'Deportivo', 'Satinado']
+COLORES = ['Negro', 'Blanco', 'Rosa', 'Rojo', 'Azul', 'Verde', 'Beige', 'Morado']
+COMENTARIOS = ['Me encantó', 'Buena calidad', 'La talla es pequeña', 'Llegó tarde', 'Tal como en la foto', None]
+# Peso de cada calificación (1 a 5 estrellas): las reseñas reales tienden a ser positivas
+PESOS_CALIFICACION = [5, 7, 15, 33, 40]
+DIAS_HISTORIA = 730
+
+
+@contextmanager
+def fechas_manuales(*campos):
+    """Permite asignar a mano campos auto_now_add para repartir las fechas en el tiempo."""
+    originales = [campo.auto_now_add for campo in campos]
+    for campo in campos:
+        campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, original in zip(campos, originales):
+            campo.auto_now_add = original
+
+
+class Command(BaseCommand):
+    help = 'Genera datos sintéticos en volumen (con semilla fija) para pruebas de rendimiento.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=100_000)
+        parser.add_argument('--productos', type=int, default=50_000)
+        parser.add_argument('--pedidos', type=int, default=1_000_000)
+        parser.add_argument('--resenas', type=int, default=500_000)
+        parser.add_argument('--max-items', type=int, default=3, help='Máximo de items por pedido.')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por bulk_create.')
+        parser.add_argument('--limpiar', action='store_true', help='Borra los datos existentes antes de generar.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['semilla'])
+        self.lote = options['lote']
+        self.ahora = timezone.now()
+
+        if options['limpiar']:
+            self.limpiar()
+
+        with fechas_manuales(
+            Usuario._meta.get_field('fecha_registro'),
+            Producto._meta.get_field('fecha_agregado'),
+            Pedido._meta.get_field('fecha'),
+            Resena._meta.get_field('fecha_resena'),
+        ):
+            metodos, cupones = self.crear_catalogos_auxiliares()
+            usuarios = self.crear_usuarios(options['usuarios'])
+            precios = self.crear_productos(options['productos'])
+            self.crear_pedidos(options['pedidos'], options['max_items'], usuarios, precios, metodos, cupones)
+            self.crear_resenas(options['resenas'], usuarios, list(precios))
+        self.reiniciar_secuencias()
+
+        self.medir('resúmenes de calificación', lambda: reconstruir_resumenes(self.lote))
+        self.medir('resúmenes de ventas', lambda: reconstruir_ventas(lote=self.lote))
+        # Los productos se insertan sin historial: su stock inicial es el corte de partida
+        self.medir('cortes de inventario', lambda: inventario.reiniciar_cortes(self.lote))
+        if not busqueda.backend().automatico:
+            self.medir('índice de búsqueda', busqueda.backend().reconstruir)
+        self.stdout.write(self.style.SUCCESS('Datos generados.'))
+
+    # ------------------------------------------------------------------
+
+    def limpiar(self):
+        # DELETE directo por tabla: .delete() mandaría una señal por cada reseña borrada
+        modelos = (
+            VentaDiariaCategoria, VentaDiaria, CorteInventario, MovimientoInventario, ItemPedido, Pedido,
+            ResumenCalificacion, Resena, TerminoProducto, TareaFondo, Producto, Usuario, CuponDescuento, MetodoPago,
+        )
+        with transaction.atomic(), connection.cursor() as cursor:
+            for modelo in modelos:
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(modelo._meta.db_table)}')
+
+    def reiniciar_secuencias(self):
+        # Las filas se insertan con su pk: sin esto, en PostgreSQL el próximo INSERT normal repetiría ids
+        sentencias = connection.ops.sequence_reset_sql(no_style(), [Usuario, Producto, Pedido])
+        with connection.cursor() as cursor:
+            for sentencia in sentencias:
+                cursor.execute(sentencia)
+
+    def medir(self, nombre, funcion):
+        inicio = time.perf_counter()
+        cantidad = funcion()
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(f'{nombre}: {cantidad} filas en {segundos:.1f}s ({cantidad / max(segundos, 1e-9):,.0f} filas/s)')
+        return cantidad
+
+    def fecha_aleatoria(self):
+        return self.ahora - timedelta(seconds=self.rng.randrange(DIAS_HISTORIA * 86400))
+
+    def siguiente_id(self, modelo):
+        return (modelo.objects.aggregate(maximo=Max('pk'))['maximo'] or 0) + 1
+
+    def insertar_por_lotes(self, modelo, filas):
+        """Inserta un generador de instancias en lotes de `self.lote`; devuelve cuántas insertó."""
+        total = 0
+        pendientes = []
+        for fila in filas:
+            pendientes.append(fila)
+            if len(pendientes) >= self.lote:
+                modelo.objects.bulk_create(pendientes)
+                total += len(pendientes)
+                pendientes = []
+        if pendientes:
+            modelo.objects.bulk_create(pendientes)
+            total += len(pendientes)
+        return total
+
+    # ------------------------------------------------------------------
+
+    def crear_catalogos_auxiliares(self):
+        if not MetodoPago.objects.exists():
+            MetodoPago.objects.bulk_create([
+                MetodoPago(nombre=nombre, tipo=tipo) for tipo, nombre in MetodoPago.TIPO_CHOICES
+            ])
+        if not CuponDescuento.objects.filter(codigo__startswith='SEED').exists():
+            CuponDescuento.objects.bulk_create([
+                CuponDescuento(codigo=f'SEED{porcentaje}', descuento_porcentaje=Decimal(porcentaje))
+                for porcentaje in (5, 10, 15, 20)
+            ])
+        metodos = dict(MetodoPago.objects.values_list('pk', 'nombre'))
+        cupones = {
+            cupon.pk: cupon
+            for cupon in CuponDescuento.objects.filter(codigo__startswith='SEED').only('codigo', 'descuento_porcentaje')
+        }
+        return metodos, cupones
+
+    def crear_usuarios(self, cantidad):
+        inicio = self.siguiente_id(Usuario)
+        ids = list(range(inicio, inicio + cantidad))
+        tipos = ['cliente'] * 18 + ['vendedor', 'administrador']
+
+        def filas():
+            for pk in ids:
+                nombre = f'{self.rng.choice(NOMBRES)} {self.rng.choice(APELLIDOS)}'
+                usuario = Usuario(
+                    pk=pk,
+                    nombre=nombre,
+                    email=f'usuario{pk}@seed.shein.test',
+                    telefono=f'55{self.rng.randrange(10**8):08d}',
+                    direccion=f'Calle {self.rng.randrange(1, 500)} #{self.rng.randrange(1, 2000)}',
+                    tipo_usuario=self.rng.choice(tipos),
+                    fecha_registro=self.fecha_aleatoria(),
+                    activo=self.rng.random() > 0.05,
+                )
+                usuario.actualizar_claves_busqueda()
+                yield usuario
+
+        self.medir('usuarios', lambda: self.insertar_por_lotes(Usuario, filas()))
+        return ids
+
+    def crear_productos(self, cantidad):
+        inicio = self.siguiente_id(Producto)
+        precios = {}
+        tallas = [clave for clave, _ in Producto.TALLA_CHOICES]
+
+        def filas():
+            for pk in range(inicio, inicio + cantidad):
+                categoria = self.rng.choice(list(PRENDAS))
+                precio = Decimal(self.rng.randrange(4900, 199900)) / 100
+                precios[pk] = precio
+                yield Producto(
+                    pk=pk,
+                    nombre=f'{self.rng.choice(PRENDAS[categoria])} {self.rng.choice(ADJETIVOS)} {pk}',
+                    descripcion='Producto generado para pruebas de rendimiento.',
+                    precio=precio,
+                    categoria=categoria,
+                    talla=self.rng.choice(tallas) if categoria in ('ropa', 'zapatos') else None,
+                    color=self.rng.choice(COLORES),
+                    stock=0 if self.rng.random() < 0.1 else self.rng.randrange(1, 500),
+                    fecha_agregado=self.fecha_aleatoria(),
+                    disponible=self.rng.random() > 0.1,
+                )
+
+        self.medir('productos', lambda: self.insertar_por_lotes(Producto, filas()))
+        return precios
+
+    def crear_pedidos(self, cantidad, max_items, usuarios, precios, metodos, cupones):
+        productos = list(precios)
+        if not usuarios or not productos:
+            return
+        inicio = self.siguiente_id(Pedido)
+        estados = [clave for clave, _ in Pedido.ESTADO_CHOICES]
+
+        def insertar():
+            pedidos, items = [], []
+            total_items = 0
+            for pk in range(inicio, inicio + cantidad):
+                elegidos = self.rng.sample(productos, min(len(productos), self.rng.randint(1, max_items)))
+                lineas = {producto_id: self.rng.randint(1, 3) for producto_id in elegidos}
+                cupon_id = self.rng.choice(list(cupones)) if cupones and self.rng.random() < 0.15 else None
+                metodo_id = self.rng.choice(list(metodos)) if metodos else None
+                cupon = cupones.get(cupon_id)
+                subtotal = sum(precios[producto_id] * unidades for producto_id, unidades in lineas.items())
+                # El mismo redondeo (ROUND_HALF_UP) que los pedidos creados desde las vistas
+                descuento = cupon.calcular_descuento(subtotal) if cupon else Decimal('0.00')
+                pedidos.append(Pedido(
+                    pk=pk,
+                    id_usuario_id=self.rng.choice(usuarios),
+                    direccion='Dirección de envío generada',
+                    estado_pedido=self.rng.choice(estados),
+                    fecha=self.fecha_aleatoria(),
+                    metodo_pago_id=metodo_id,
+                    cupon_id=cupon_id,
+                    # bulk_create no pasa por Pedido.save(): las etiquetas congeladas se asignan aquí
+                    metodo_pago_nombre=metodos.get(metodo_id, ''),
+                    cupon_codigo=cupon.codigo if cupon else '',
+                    subtotal=subtotal,
+                    descuento=descuento,
+                    total=subtotal - descuento,
+                ))
+                items.extend(
+                    ItemPedido(pedido_id=pk, producto_id=producto_id, cantidad=unidades, precio_unitario=precios[producto_id])
+                    for producto_id, unidades in lineas.items()
+                )
+                if len(pedidos) >= self.lote:
+                    Pedido.objects.bulk_create(pedidos)
+                    ItemPedido.objects.bulk_create(items)
+                    total_items += len(items)
+                    pedidos, items = [], []
+            Pedido.objects.bulk_create(pedidos)
+            ItemPedido.objects.bulk_create(items)
+            self.stdout.write(f'  ({total_items + len(items)} items de pedido)')
+            return cantidad
+
+        self.medir('pedidos', insertar)
+
+    def crear_resenas(self, cantidad, usuarios, productos):
+        if not usuarios or not productos:
+            return
+        # Pares que ya tienen reseña (unique_together): no se vuelven a generar aunque no se use --limpiar
+        ids_usuarios, ids_productos = set(usuarios), set(productos)
+        existentes = {
+            par for par in Resena.objects.filter(
+                usuario__gte=min(usuarios), usuario__lte=max(usuarios),
+                producto__gte=min(productos), producto__lte=max(productos),
+            ).values_list('producto_id', 'usuario_id')
+            if par[0] in ids_productos and par[1] in ids_usuarios
+        }
+        cantidad = min(cantidad, len(usuarios) * len(productos) - len(existentes))
+        vistos = set(existentes)
+        total = len(existentes) + cantidad
+
+        def filas():
+            while len(vistos) < total:
+                par = (self.rng.choice(productos), self.rng.choice(usuarios))
+                if par in vistos:
+                    continue
+                vistos.add(par)
+                yield Resena(
+                    producto_id=par[0],
+                    usuario_id=par[1],
+                    calificacion=self.rng.choices(range(1, 6), PESOS_CALIFICACION)[0],
+                    comentario=self.rng.choice(COMENTARIOS),
+                    fecha_resena=self.fecha_aleatoria(),
+                )
+
+        self.medir('reseñas', lambda: self.insertar_por_lotes(Resena, filas()))
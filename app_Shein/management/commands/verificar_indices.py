@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_Shein.planes_consulta import consultas_criticas, escaneos_completos
+
+
+class Command(BaseCommand):
+    help = 'Corre EXPLAIN sobre las consultas más usadas y falla si alguna recorre una tabla completa.'
+
+    def handle(self, *args, **options):
+        fallas = {}
+        for nombre, queryset in consultas_criticas().items():
+            escaneos = escaneos_completos(queryset)
+            if escaneos:
+                fallas[nombre] = escaneos
+                self.stdout.write(self.style.ERROR(f'{nombre}: ' + '; '.join(escaneos)))
+            else:
+                self.stdout.write(f'{nombre}: OK')
+
+        if fallas:
+            raise CommandError(f'{len(fallas)} consultas sin índice: {", ".join(fallas)}')
+        self.stdout.write(self.style.SUCCESS('Todas las consultas usan índices.'))
@@ -0,0 +1,161 @@
+"""
+Instrumentación por petición: tiempo total, número y tiempo de consultas SQL
+y consultas repetidas (señal de N+1), agrupado por vista.
+
+Usa un wrapper de ejecución de las conexiones (`execute_wrappers`), así que
+funciona con DEBUG=False. Cada
+petición se escribe como una línea JSON en el logger `app_Shein.rendimiento`
+(WARNING si tuvo consultas repetidas o fue lenta) y se acumula en memoria del
+proceso para la vista `metricas_rendimiento`.
+"""
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('app_Shein.rendimiento')
+
+_agregados = {}
+_lock = threading.Lock()
+# Registro de la petición en curso. Bajo ASGI las peticiones concurrentes comparten el hilo (y las
+# conexiones) donde consulta el ORM; sync_to_async copia el contexto, así cada consulta llega al suyo
+_registro_actual = ContextVar('registro_consultas', default=None)
+
+
+def _despachar(execute, sql, params, many, context):
+    # Un solo wrapper fijo por conexión que reparte según el contexto: con un wrapper por petición, el
+    # `execute_wrapper()` de una petición que termina quita (pop) el último de la lista, que puede ser el
+    # de otra petición todavía en curso
+    registro = _registro_actual.get()
+    if registro is None:
+        return execute(sql, params, many, context)
+    return registro(execute, sql, params, many, context)
+
+
+def _instalar():
+    """Agrega `_despachar` a las conexiones del hilo actual que todavía no lo tienen."""
+    for conexion in connections.all():
+        if _despachar not in conexion.execute_wrappers:
+            conexion.execute_wrappers.append(_despachar)
+
+
+class _RegistroConsultas:
+    """Cuenta y cronometra las consultas de una petición (se las pasa `_despachar`)."""
+
+    def __init__(self):
+        self.cantidad = 0
+        self.segundos = 0.0
+        self.firmas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.cantidad += 1
+            # El SQL llega con placeholders, así que la misma consulta con otros parámetros tiene la misma firma
+            self.firmas[sql] += 1
+
+    def repetidas(self):
+        return {sql: veces for sql, veces in self.firmas.items() if veces > 1}
+
+
+def _registrar(vista, ms, registro, repetidas):
+    with _lock:
+        datos = _agregados.setdefault(vista, {
+            'peticiones': 0, 'ms_total': 0.0, 'ms_max': 0.0,
+            'consultas_total': 0, 'sql_ms_total': 0.0, 'peticiones_con_repetidas': 0,
+        })
+        datos['peticiones'] += 1
+        datos['ms_total'] += ms
+        datos['ms_max'] = max(datos['ms_max'], ms)
+        datos['consultas_total'] += registro.cantidad
+        datos['sql_ms_total'] += registro.segundos * 1000
+        if repetidas:
+            datos['peticiones_con_repetidas'] += 1
+
+
+def metricas():
+    """Métricas acumuladas por vista en este proceso."""
+    with _lock:
+        copia = {vista: dict(datos) for vista, datos in _agregados.items()}
+    for datos in copia.values():
+        peticiones = datos['peticiones']
+        datos['ms_promedio'] = round(datos['ms_total'] / peticiones, 3)
+        datos['consultas_promedio'] = round(datos['consultas_total'] / peticiones, 2)
+        datos['sql_ms_promedio'] = round(datos['sql_ms_total'] / peticiones, 3)
+        for campo in ('ms_total', 'ms_max', 'sql_ms_total'):
+            datos[campo] = round(datos[campo], 3)
+    return copia
+
+
+def reiniciar_metricas():
+    with _lock:
+        _agregados.clear()
+
+
+class InstrumentacionMiddleware:
+    # Bajo ASGI no obliga a pasar las vistas asíncronas a un hilo
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        registro = _RegistroConsultas()
+        token = _registro_actual.set(registro)
+        inicio = time.perf_counter()
+        try:
+            _instalar()
+            response = self.get_response(request)
+        finally:
+            _registro_actual.reset(token)
+        return self._terminar(request, response, registro, inicio)
+
+    async def _acall(self, request):
+        registro = _RegistroConsultas()
+        token = _registro_actual.set(registro)
+        inicio = time.perf_counter()
+        try:
+            # Las conexiones son por hilo y el ORM asíncrono consulta en el hilo de
+            # sync_to_async(thread_sensitive=True), no en el del event loop: ahí se instala el wrapper
+            await sync_to_async(_instalar, thread_sensitive=True)()
+            response = await self.get_response(request)
+        finally:
+            _registro_actual.reset(token)
+        return self._terminar(request, response, registro, inicio)
+
+    def _terminar(self, request, response, registro, inicio):
+        ms = (time.perf_counter() - inicio) * 1000
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = coincidencia.view_name if coincidencia else request.path
+        repetidas = registro.repetidas()
+        _registrar(vista, ms, registro, repetidas)
+
+        lenta = ms > getattr(settings, 'SHEIN_UMBRAL_LENTO_MS', 500)
+        nivel = logging.WARNING if repetidas or lenta else logging.INFO
+        if logger.isEnabledFor(nivel):
+            logger.log(nivel, json.dumps({
+                'vista': vista,
+                'metodo': request.method,
+                'ruta': request.path,
+                'estado': response.status_code,
+                'ms': round(ms, 3),
+                'consultas': registro.cantidad,
+                'sql_ms': round(registro.segundos * 1000, 3),
+                'repetidas': [{'sql': sql[:300], 'veces': veces} for sql, veces in repetidas.items()],
+            }, ensure_ascii=False))
+        return response
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:05
+
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import migrations, models
+
+CENTAVOS = Decimal('0.01')
+
+
+def poblar_totales(apps, schema_editor):
+    # Los pedidos existentes congelan el precio actual de sus productos y guardan sus totales,
+    # con las mismas reglas que Pedido.aplicar_totales y CuponDescuento.calcular_descuento
+    Pedido = apps.get_model('app_Shein', 'Pedido')
+    ItemPedido = apps.get_model('app_Shein', 'ItemPedido')
+    Producto = apps.get_model('app_Shein', 'Producto')
+    ItemPedido.objects.filter(precio_unitario__isnull=True).update(precio_unitario=models.Subquery(
+        Producto.objects.filter(pk=models.OuterRef('producto_id')).values('precio')[:1]
+    ))
+    subtotales = dict(
+        ItemPedido.objects.values('pedido_id')
+        .annotate(subtotal=models.Sum(
+            models.F('precio_unitario') * models.F('cantidad'),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ))
+        .values_list('pedido_id', 'subtotal')
+    )
+    pedidos = list(Pedido.objects.select_related('cupon').only('id_pedido', 'cupon__descuento_porcentaje'))
+    for pedido in pedidos:
+        pedido.subtotal = Decimal(subtotales.get(pedido.id_pedido) or 0).quantize(CENTAVOS)
+        pedido.descuento = Decimal('0.00')
+        if pedido.cupon is not None:
+            descuento = pedido.subtotal * Decimal(str(pedido.cupon.descuento_porcentaje)) / 100
+            pedido.descuento = min(descuento.quantize(CENTAVOS, rounding=ROUND_HALF_UP), pedido.subtotal)
+        pedido.total = pedido.subtotal - pedido.descuento
+    Pedido.objects.bulk_update(pedidos, ['subtotal', 'descuento', 'total'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Shein', '0003_cupondescuento_metodopago_pedido_cupon_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itempedido',
+            name='precio_unitario',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='descuento',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.RunPython(poblar_totales, migrations.RunPython.noop),
+    ]
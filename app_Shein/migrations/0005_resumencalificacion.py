@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_resumenes(apps, schema_editor):
+    Resena = apps.get_model('app_Shein', 'Resena')
+    ResumenCalificacion = apps.get_model('app_Shein', 'ResumenCalificacion')
+    resumenes = {}
+    conteos = Resena.objects.values('producto_id', 'calificacion').annotate(n=models.Count('id')).order_by()
+    for fila in conteos:
+        resumen = resumenes.setdefault(fila['producto_id'], ResumenCalificacion(producto_id=fila['producto_id']))
+        resumen.total += fila['n']
+        resumen.suma += fila['n'] * fila['calificacion']
+        setattr(resumen, f"estrellas_{fila['calificacion']}", fila['n'])
+    ResumenCalificacion.objects.bulk_create(resumenes.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Shein', '0004_itempedido_precio_unitario_pedido_descuento_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCalificacion',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen_calificacion', serialize=False, to='app_Shein.producto')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('suma', models.PositiveIntegerField(default=0)),
+                ('estrellas_1', models.PositiveIntegerField(default=0)),
+                ('estrellas_2', models.PositiveIntegerField(default=0)),
+                ('estrellas_3', models.PositiveIntegerField(default=0)),
+                ('estrellas_4', models.PositiveIntegerField(default=0)),
+                ('estrellas_5', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(poblar_resumenes, migrations.RunPython.noop),
+    ]
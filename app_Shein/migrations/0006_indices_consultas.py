@@ -0,0 +1,49 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Shein', '0005_resumencalificacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cupondescuento',
+            index=models.Index(fields=['-fecha_expiracion', '-id'], name='cupon_expiracion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['-fecha', '-id_pedido'], name='pedido_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['-fecha_agregado', '-id'], name='producto_agregado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('disponible', True), ('stock__gt', 0)), fields=['-fecha_agregado', '-id'], name='producto_catalogo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('disponible', True), ('stock__gt', 0)), fields=['categoria', '-fecha_agregado', '-id'], name='producto_catalogo_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resena',
+            index=models.Index(fields=['-fecha_resena', '-id'], name='resena_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resena',
+            index=models.Index(fields=['producto', '-fecha_resena'], name='resena_producto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['-fecha_registro', '-id'], name='usuario_registro_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['tipo_usuario', 'activo'], name='usuario_tipo_activo_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:17
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def marcar_imagenes_existentes(apps, schema_editor):
+    Producto = apps.get_model('app_Shein', 'Producto')
+    TareaFondo = apps.get_model('app_Shein', 'TareaFondo')
+    con_imagen = Producto.objects.exclude(imagen='').exclude(imagen__isnull=True)
+    con_imagen.exclude(imagen_variantes={}).update(estado_imagen='lista')
+    # Las imágenes subidas antes del pipeline quedan en cola para el worker
+    pendientes = list(con_imagen.filter(imagen_variantes={}).values_list('pk', flat=True))
+    Producto.objects.filter(pk__in=pendientes).update(estado_imagen='pendiente')
+    TareaFondo.objects.bulk_create(
+        [TareaFondo(tipo='procesar_imagen', datos={'producto_id': pk}) for pk in pendientes], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Shein', '0007_producto_imagen_variantes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='estado_imagen',
+            field=models.CharField(choices=[('sin_imagen', 'Sin imagen'), ('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('lista', 'Lista'), ('error', 'Error')], default='sin_imagen', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='TareaFondo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('datos', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completada', 'Completada'), ('fallida', 'Fallida')], default='pendiente', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('max_intentos', models.PositiveIntegerField(default=3)),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now)),
+                ('iniciada', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'disponible_desde', 'id'], name='tarea_pendiente_idx')],
+            },
+        ),
+        migrations.RunPython(marcar_imagenes_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLA_FTS = 'app_shein_producto_fts'
+COLUMNAS = 'nombre, descripcion, categoria, color'
+
+# Índice FTS5 de contenido externo sobre app_Shein_producto; los triggers lo mantienen
+# sincronizado con cualquier escritura (save, bulk_create, update o SQL directo).
+SQL_FTS = [
+    f"""CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5(
+        {COLUMNAS}, content='app_Shein_producto', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER {TABLA_FTS}_ai AFTER INSERT ON app_Shein_producto BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, {COLUMNAS}) VALUES (new.id, new.nombre, new.descripcion, new.categoria, new.color);
+    END""",
+    f"""CREATE TRIGGER {TABLA_FTS}_ad AFTER DELETE ON app_Shein_producto BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, {COLUMNAS}) VALUES ('delete', old.id, old.nombre, old.descripcion, old.categoria, old.color);
+    END""",
+    f"""CREATE TRIGGER {TABLA_FTS}_au AFTER UPDATE OF {COLUMNAS} ON app_Shein_producto BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, {COLUMNAS}) VALUES ('delete', old.id, old.nombre, old.descripcion, old.categoria, old.color);
+        INSERT INTO {TABLA_FTS}(rowid, {COLUMNAS}) VALUES (new.id, new.nombre, new.descripcion, new.categoria, new.color);
+    END""",
+    f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')",
+]
+SQL_FTS_REVERSA = [
+    f'DROP TRIGGER IF EXISTS {TABLA_FTS}_ai',
+    f'DROP TRIGGER IF EXISTS {TABLA_FTS}_ad',
+    f'DROP TRIGGER IF EXISTS {TABLA_FTS}_au',
+    f'DROP TABLE IF EXISTS {TABLA_FTS}',
+]
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQL_FTS:
+            schema_editor.execute(sql)
+    # Otras bases usan BusquedaTerminos: su índice se llena con `manage.py reconstruir_indice_busqueda`
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQL_FTS_REVERSA:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Shein', '0009_producto_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=100)),
+                ('peso', models.PositiveSmallIntegerField(default=1)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terminos_busqueda', to='app_Shein.producto')),
+            ],
+            options={
+                'unique_together': {('termino', 'producto')},
+            },
+        ),
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
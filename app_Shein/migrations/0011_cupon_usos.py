@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Shein', '0010_busqueda_productos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cupondescuento',
+            name='usos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cupondescuento',
+            name='usos_maximos',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
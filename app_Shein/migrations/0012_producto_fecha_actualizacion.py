@@ -0,0 +1,31 @@
+from importlib import import_module
+
+import django.utils.timezone
+from django.db import migrations, models
+
+busqueda_0010 = import_module('app_Shein.migrations.0010_busqueda_productos')
+
+
+def recrear_indice_busqueda(apps, schema_editor):
+    # En SQLite, agregar o quitar una columna reconstruye app_Shein_producto y se pierden
+    # los triggers del índice FTS5: se vuelven a crear (y se reindexa) después del cambio
+    busqueda_0010.borrar_indice(apps, schema_editor)
+    busqueda_0010.crear_indice(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Shein', '0011_cupon_usos'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recrear_indice_busqueda),
+        migrations.AddField(
+            model_name='producto',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(recrear_indice_busqueda, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:39
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def poblar_ventas(apps, schema_editor):
+    # Misma agregación que app_Shein.ventas.reconstruir_ventas(), con los modelos históricos
+    Pedido = apps.get_model('app_Shein', 'Pedido')
+    ItemPedido = apps.get_model('app_Shein', 'ItemPedido')
+    VentaDiaria = apps.get_model('app_Shein', 'VentaDiaria')
+    VentaDiariaCategoria = apps.get_model('app_Shein', 'VentaDiariaCategoria')
+
+    ventas = (
+        Pedido.objects.annotate(dia=TruncDate('fecha'))
+        .values('dia', 'estado_pedido', 'metodo_pago__nombre', 'cupon__codigo')
+        .annotate(
+            n=models.Count('pk'), suma_subtotal=models.Sum('subtotal'),
+            suma_descuento=models.Sum('descuento'), suma_total=models.Sum('total'),
+        )
+        .order_by()
+    )
+    VentaDiaria.objects.bulk_create([
+        VentaDiaria(
+            fecha=fila['dia'], estado_pedido=fila['estado_pedido'],
+            metodo_pago=fila['metodo_pago__nombre'] or '', cupon=fila['cupon__codigo'] or '',
+            pedidos=fila['n'], subtotal=fila['suma_subtotal'], descuento=fila['suma_descuento'], total=fila['suma_total'],
+        )
+        for fila in ventas
+    ], batch_size=1000)
+
+    importe = models.Sum(
+        Coalesce('precio_unitario', 'producto__precio') * models.F('cantidad'),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+    categorias = (
+        ItemPedido.objects.annotate(dia=TruncDate('pedido__fecha'))
+        .values('dia', 'pedido__estado_pedido', 'producto__categoria')
+        .annotate(n=models.Count('pedido', distinct=True), suma_unidades=models.Sum('cantidad'), suma_importe=importe)
+        .order_by()
+    )
+    VentaDiariaCategoria.objects.bulk_create([
+        VentaDiariaCategoria(
+            fecha=fila['dia'], estado_pedido=fila['pedido__estado_pedido'], categoria=fila['producto__categoria'],
+            pedidos=fila['n'], unidades=fila['suma_unidades'], importe=fila['suma_importe'],
+        )
+        for fila in categorias
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Shein', '0012_producto_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado_pedido', models.CharField(choices=[('pendiente', 'Pendiente'), ('confirmado', 'Confirmado'), ('enviado', 'Enviado'), ('entregado', 'Entregado'), ('cancelado', 'Cancelado')], max_length=20)),
+                ('metodo_pago', models.CharField(blank=True, max_length=100)),
+                ('cupon', models.CharField(blank=True, max_length=50)),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('descuento', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+            ],
+            options={
+                'unique_together': {('fecha', 'estado_pedido', 'metodo_pago', 'cupon')},
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaDiariaCategoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado_pedido', models.CharField(choices=[('pendiente', 'Pendiente'), ('confirmado', 'Confirmado'), ('enviado', 'Enviado'), ('entregado', 'Entregado'), ('cancelado', 'Cancelado')], max_length=20)),
+                ('categoria', models.CharField(choices=[('ropa', 'Ropa'), ('accesorios', 'Accesorios'), ('zapatos', 'Zapatos'), ('belleza', 'Belleza'), ('hogar', 'Hogar')], max_length=20)),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('importe', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+            ],
+            options={
+                'unique_together': {('fecha', 'estado_pedido', 'categoria')},
+            },
+        ),
+        migrations.RunPython(poblar_ventas, migrations.RunPython.noop),
+    ]
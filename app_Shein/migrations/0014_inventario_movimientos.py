@@ -0,0 +1,50 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def crear_cortes(apps, schema_editor):
+    # El stock actual es el punto de partida del historial: cada producto arranca con un corte sin movimientos
+    Producto = apps.get_model('app_Shein', 'Producto')
+    CorteInventario = apps.get_model('app_Shein', 'CorteInventario')
+    cortes = (
+        CorteInventario(producto_id=producto_id, cantidad=stock)
+        for producto_id, stock in Producto.objects.values_list('pk', 'stock').iterator(chunk_size=1000)
+    )
+    CorteInventario.objects.bulk_create(cortes, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Shein', '0013_ventas_diarias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorteInventario',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='corte_inventario', serialize=False, to='app_Shein.producto')),
+                ('cantidad', models.IntegerField(default=0)),
+                ('ultimo_movimiento', models.PositiveBigIntegerField(default=0)),
+                ('fecha', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MovimientoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField()),
+                ('tipo', models.CharField(choices=[('venta', 'Venta'), ('cancelacion', 'Cancelación'), ('reabastecimiento', 'Reabastecimiento'), ('ajuste', 'Ajuste manual')], max_length=20)),
+                ('nota', models.CharField(blank=True, max_length=200)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_inventario', to='app_Shein.pedido')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_inventario', to='app_Shein.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto', 'id'], name='movimiento_producto_idx')],
+            },
+        ),
+        migrations.RunPython(crear_cortes, migrations.RunPython.noop),
+    ]
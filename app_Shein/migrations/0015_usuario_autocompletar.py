@@ -0,0 +1,22 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:52
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Shein', '0014_inventario_movimientos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(models.F('tipo_usuario'), django.db.models.functions.text.Lower('nombre'), name='usuario_nombre_prefijo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(models.F('tipo_usuario'), django.db.models.functions.text.Lower('email'), name='usuario_email_prefijo_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:00
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def congelar_etiquetas(apps, schema_editor):
+    # Los pedidos existentes toman el nombre y el código actuales, los mismos que usaban sus filas de VentaDiaria
+    Pedido = apps.get_model('app_Shein', 'Pedido')
+    MetodoPago = apps.get_model('app_Shein', 'MetodoPago')
+    CuponDescuento = apps.get_model('app_Shein', 'CuponDescuento')
+    Pedido.objects.exclude(metodo_pago=None).update(metodo_pago_nombre=Coalesce(
+        models.Subquery(MetodoPago.objects.filter(pk=models.OuterRef('metodo_pago_id')).values('nombre')[:1]), models.Value(''),
+    ))
+    Pedido.objects.exclude(cupon=None).update(cupon_codigo=Coalesce(
+        models.Subquery(CuponDescuento.objects.filter(pk=models.OuterRef('cupon_id')).values('codigo')[:1]), models.Value(''),
+    ))
+
+
+def reagrupar_ventas(apps, schema_editor):
+    # Las filas que quedaron desfasadas por un método o cupón renombrado se recalculan con las etiquetas congeladas
+    Pedido = apps.get_model('app_Shein', 'Pedido')
+    VentaDiaria = apps.get_model('app_Shein', 'VentaDiaria')
+    ventas = (
+        Pedido.objects.annotate(dia=TruncDate('fecha'))
+        .values('dia', 'estado_pedido', 'metodo_pago_nombre', 'cupon_codigo')
+        .annotate(
+            n=models.Count('pk'), suma_subtotal=models.Sum('subtotal'),
+            suma_descuento=models.Sum('descuento'), suma_total=models.Sum('total'),
+        )
+        .order_by()
+    )
+    VentaDiaria.objects.all().delete()
+    VentaDiaria.objects.bulk_create([
+        VentaDiaria(
+            fecha=fila['dia'], estado_pedido=fila['estado_pedido'],
+            metodo_pago=fila['metodo_pago_nombre'], cupon=fila['cupon_codigo'],
+            pedidos=fila['n'], subtotal=fila['suma_subtotal'], descuento=fila['suma_descuento'], total=fila['suma_total'],
+        )
+        for fila in ventas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Shein', '0015_usuario_autocompletar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='cupon_codigo',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='metodo_pago_nombre',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.RunPython(congelar_etiquetas, migrations.RunPython.noop),
+        migrations.RunPython(reagrupar_ventas, migrations.RunPython.noop),
+    ]
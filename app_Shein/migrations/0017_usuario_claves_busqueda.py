@@ -0,0 +1,61 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:28
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def clave_busqueda(texto):
+    # Copia de app_Shein.models.clave_busqueda en el momento de esta migración
+    descompuesto = unicodedata.normalize('NFKD', (texto or '').casefold())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def poblar_claves(apps, schema_editor):
+    Usuario = apps.get_model('app_Shein', 'Usuario')
+    lote = []
+    for usuario in Usuario.objects.only('nombre', 'email').iterator(chunk_size=1000):
+        usuario.nombre_busqueda = clave_busqueda(usuario.nombre)
+        usuario.email_busqueda = clave_busqueda(usuario.email)
+        lote.append(usuario)
+        if len(lote) >= 1000:
+            Usuario.objects.bulk_update(lote, ['nombre_busqueda', 'email_busqueda'])
+            lote = []
+    Usuario.objects.bulk_update(lote, ['nombre_busqueda', 'email_busqueda'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Shein', '0016_pedido_etiquetas_venta'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='usuario',
+            name='usuario_nombre_prefijo_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='usuario',
+            name='usuario_email_prefijo_idx',
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='email_busqueda',
+            field=models.CharField(blank=True, default='', editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='nombre_busqueda',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(poblar_claves, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['tipo_usuario', 'nombre_busqueda'], name='usuario_nombre_prefijo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['tipo_usuario', 'email_busqueda'], name='usuario_email_prefijo_idx'),
+        ),
+    ]
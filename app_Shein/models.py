@@ -1,5 +1,29 @@
+from decimal import Decimal, ROUND_HALF_UP
+
 from django.db import models
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 import os
+import unicodedata
+
+CENTAVOS = Decimal('0.01')
+
+# Suma de precio x cantidad de los items; usa el precio actual del producto si el item no tiene precio congelado
+SUBTOTAL_ITEMS = Sum(
+    Coalesce('precio_unitario', 'producto__precio') * F('cantidad'),
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+
+def clave_busqueda(texto):
+    """Texto sin distinguir mayúsculas ni acentos para buscar por prefijo ('Álvaro Pérez' -> 'alvaro perez').
+
+    LOWER() de SQLite solo convierte letras ASCII, así que la búsqueda compara
+    contra columnas ya normalizadas en Python en lugar de una expresión SQL.
+    """
+    descompuesto = unicodedata.normalize('NFKD', (texto or '').casefold())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
 
 # --- Modelos Existentes ---
 
@@ -17,10 +41,36 @@ class Usuario(models.Model):
     tipo_usuario = models.CharField(max_length=20, choices=TIPO_USUARIO_CHOICES, default='cliente')
     fecha_registro = models.DateTimeField(auto_now_add=True)
     activo = models.BooleanField(default=True)
+    # Nombre y email normalizados con clave_busqueda() para el autocompletado (se rellenan al guardar)
+    nombre_busqueda = models.CharField(max_length=100, blank=True, default='', editable=False)
+    email_busqueda = models.CharField(max_length=254, blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # Listado de usuarios (paginado por fecha de registro)
+            models.Index(fields=['-fecha_registro', '-id'], name='usuario_registro_idx'),
+            # Selección de clientes activos en pedidos y reseñas
+            models.Index(fields=['tipo_usuario', 'activo'], name='usuario_tipo_activo_idx'),
+            # Autocompletado de clientes por prefijo del nombre o del email (app_Shein.autocompletar)
+            models.Index(fields=['tipo_usuario', 'nombre_busqueda'], name='usuario_nombre_prefijo_idx'),
+            models.Index(fields=['tipo_usuario', 'email_busqueda'], name='usuario_email_prefijo_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nombre} ({self.email})"
 
+    def save(self, *args, **kwargs):
+        self.actualizar_claves_busqueda()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'nombre', 'email'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'nombre_busqueda', 'email_busqueda'}
+        super().save(*args, **kwargs)
+
+    def actualizar_claves_busqueda(self):
+        """Recalcula nombre_busqueda y email_busqueda (sin guardar); bulk_create no pasa por save()."""
+        self.nombre_busqueda = clave_busqueda(self.nombre)
+        self.email_busqueda = clave_busqueda(self.email)
+
 class Producto(models.Model):
     CATEGORIA_CHOICES = [
         ('ropa', 'Ropa'),
@@ -38,17 +88,60 @@ class Producto(models.Model):
         ('XL', 'XL'),
         ('Única', 'Única'),
     ]
+
+    ESTADO_IMAGEN_CHOICES = [
+        ('sin_imagen', 'Sin imagen'),
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('lista', 'Lista'),
+        ('error', 'Error'),
+    ]
     
+    # Clave del proveedor; la importación masiva la usa para actualizar en lugar de duplicar
+    sku = models.CharField(max_length=64, unique=True, blank=True, null=True)
     nombre = models.CharField(max_length=200)
     descripcion = models.TextField()
     precio = models.DecimalField(max_digits=10, decimal_places=2)
     categoria = models.CharField(max_length=20, choices=CATEGORIA_CHOICES)
     talla = models.CharField(max_length=10, choices=TALLA_CHOICES, blank=True, null=True)
     color = models.CharField(max_length=50)
+    # Copia de las existencias que usa el catálogo; la actualizan ventas, cancelaciones y ajustes junto con su
+    # movimiento de inventario (ver app_Shein.inventario)
     stock = models.PositiveIntegerField()
     imagen = models.ImageField(upload_to='productos/', blank=True, null=True)
+    # Derivados generados por app_Shein.imagenes: {formato: {ancho: ruta}}
+    imagen_variantes = models.JSONField(default=dict, blank=True)
+    # Lo actualiza el worker de tareas (run_shein_worker) mientras genera los derivados
+    estado_imagen = models.CharField(max_length=20, choices=ESTADO_IMAGEN_CHOICES, default='sin_imagen')
     fecha_agregado = models.DateTimeField(auto_now_add=True)
+    # Cambia con cualquier edición del producto, de su stock o de sus reseñas; de aquí salen el ETag y
+    # Last-Modified de la API. Los UPDATE directos sobre Producto deben asignarlo a mano
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
     disponible = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [
+            # Listado de productos (paginado por fecha)
+            models.Index(fields=['-fecha_agregado', '-id'], name='producto_agregado_idx'),
+            # Catálogo: solo productos disponibles con stock, con y sin filtro de categoría
+            models.Index(
+                fields=['-fecha_agregado', '-id'],
+                condition=models.Q(disponible=True, stock__gt=0),
+                name='producto_catalogo_idx',
+            ),
+            models.Index(
+                fields=['categoria', '-fecha_agregado', '-id'],
+                condition=models.Q(disponible=True, stock__gt=0),
+                name='producto_catalogo_cat_idx',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        producto = super().from_db(db, field_names, values)
+        # Stock con el que se cargó: al guardar, el historial registra solo lo que se cambió desde entonces
+        producto._stock_cargado = producto.__dict__.get('stock')
+        return producto
     
     def __str__(self):
         return f"{self.nombre} - ${self.precio}"
@@ -74,10 +167,25 @@ class CuponDescuento(models.Model):
     descuento_porcentaje = models.DecimalField(max_digits=5, decimal_places=2)  # Ejemplo: 10.00 para 10%
     fecha_expiracion = models.DateField(blank=True, null=True)
     activo = models.BooleanField(default=True)
+    # Límite de pedidos que pueden usar el cupón (vacío = sin límite); `usos` solo cambia con UPDATE atómicos
+    usos_maximos = models.PositiveIntegerField(blank=True, null=True)
+    usos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # La búsqueda por código ya usa el índice único de `codigo`
+        indexes = [
+            models.Index(fields=['-fecha_expiracion', '-id'], name='cupon_expiracion_idx'),
+        ]
     
     def __str__(self):
         return f"{self.codigo} ({self.descuento_porcentaje}%)"
 
+    def calcular_descuento(self, subtotal):
+        """Descuento en pesos para `subtotal`, redondeado a centavos y nunca mayor que el subtotal."""
+        subtotal = Decimal(subtotal or 0)
+        descuento = (subtotal * Decimal(str(self.descuento_porcentaje)) / 100).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+        return min(descuento, subtotal)
+
 class Pedido(models.Model):
     ESTADO_CHOICES = [
         ('pendiente', 'Pendiente'),
@@ -86,6 +194,14 @@ class Pedido(models.Model):
         ('entregado', 'Entregado'),
         ('cancelado', 'Cancelado'),
     ]
+    # Estados a los que puede pasar un pedido desde cada estado; entregado y cancelado son finales
+    TRANSICIONES = {
+        'pendiente': ('confirmado', 'cancelado'),
+        'confirmado': ('enviado', 'cancelado'),
+        'enviado': ('entregado',),
+        'entregado': (),
+        'cancelado': (),
+    }
     
     id_pedido = models.AutoField(primary_key=True)
     estado_pedido = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
@@ -96,21 +212,65 @@ class Pedido(models.Model):
     # Nuevos campos de relación
     metodo_pago = models.ForeignKey(MetodoPago, on_delete=models.SET_NULL, null=True, blank=True, related_name='pedidos')
     cupon = models.ForeignKey(CuponDescuento, on_delete=models.SET_NULL, null=True, blank=True, related_name='pedidos')
+    # Nombre del método de pago y código del cupón al crear el pedido, congelados como precio_unitario: los
+    # resúmenes de ventas se agrupan por ellos y no deben cambiar si el método o el cupón se renombra o se borra
+    metodo_pago_nombre = models.CharField(max_length=100, blank=True, default='')
+    cupon_codigo = models.CharField(max_length=50, blank=True, default='')
+    # Totales materializados: se recalculan al escribir los items, no al leer
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    descuento = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-fecha', '-id_pedido'], name='pedido_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"Pedido {self.id_pedido} - {self.id_usuario.nombre}"
     
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.congelar_etiquetas()
+        super().save(*args, **kwargs)
+
     def total_pedido(self):
-        # Lógica para calcular el total. Se puede añadir la lógica del cupón aquí si es necesario.
-        return sum(item.subtotal() for item in self.items.all())
+        return self.total
+
+    def congelar_etiquetas(self):
+        """Copia el nombre del método de pago y el código del cupón actuales (sin guardar)."""
+        self.metodo_pago_nombre = self.metodo_pago.nombre if self.metodo_pago_id else ''
+        self.cupon_codigo = self.cupon.codigo if self.cupon_id else ''
+
+    def estados_siguientes(self):
+        """(clave, nombre) de los estados a los que puede pasar el pedido."""
+        return [(clave, nombre) for clave, nombre in self.ESTADO_CHOICES if clave in self.TRANSICIONES[self.estado_pedido]]
+
+    def aplicar_totales(self, subtotal):
+        """Asigna subtotal, descuento del cupón y total (sin guardar)."""
+        self.subtotal = Decimal(subtotal or 0).quantize(CENTAVOS)
+        descuento = Decimal('0.00')
+        if self.cupon_id is not None:
+            descuento = self.cupon.calcular_descuento(self.subtotal)
+        self.descuento = descuento
+        self.total = self.subtotal - self.descuento
+
+    def recalcular_totales(self):
+        """Recalcula y guarda los totales a partir de los items en una sola consulta."""
+        subtotal = self.items.aggregate(subtotal=SUBTOTAL_ITEMS)['subtotal']
+        self.aplicar_totales(subtotal)
+        self.save(update_fields=['subtotal', 'descuento', 'total'])
 
 class ItemPedido(models.Model):
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='items')
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField(default=1)
+    # Precio congelado al crear el pedido; los cambios posteriores de Producto.precio no lo afectan
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     
     def subtotal(self):
-        return self.producto.precio * self.cantidad
+        precio = self.precio_unitario if self.precio_unitario is not None else self.producto.precio
+        return precio * self.cantidad
     
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre}"
@@ -134,6 +294,154 @@ class Resena(models.Model):
     class Meta:
         # Asegura que un usuario solo pueda dejar una reseña por producto
         unique_together = ('producto', 'usuario')
+        indexes = [
+            models.Index(fields=['-fecha_resena', '-id'], name='resena_fecha_idx'),
+            # Reseñas de un producto, más recientes primero (detalle de producto)
+            models.Index(fields=['producto', '-fecha_resena'], name='resena_producto_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reseña de {self.usuario.nombre} para {self.producto.nombre} ({self.calificacion} estrellas)"
+
+class ResumenCalificacion(models.Model):
+    """Resumen precalculado de las reseñas de un producto (conteo, suma e histograma)."""
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='resumen_calificacion')
+    total = models.PositiveIntegerField(default=0)
+    suma = models.PositiveIntegerField(default=0)
+    estrellas_1 = models.PositiveIntegerField(default=0)
+    estrellas_2 = models.PositiveIntegerField(default=0)
+    estrellas_3 = models.PositiveIntegerField(default=0)
+    estrellas_4 = models.PositiveIntegerField(default=0)
+    estrellas_5 = models.PositiveIntegerField(default=0)
+
+    @property
+    def promedio(self):
+        return round(self.suma / self.total, 1) if self.total else None
+
+    def distribucion(self):
+        """Lista de (estrellas, cantidad, porcentaje) de 5 a 1 estrellas."""
+        return [
+            (estrellas, cantidad, round(cantidad * 100 / self.total) if self.total else 0)
+            for estrellas in range(5, 0, -1)
+            for cantidad in [getattr(self, f'estrellas_{estrellas}')]
+        ]
+
+    def __str__(self):
+        return f"Resumen de {self.producto_id}: {self.promedio} ({self.total} reseñas)"
+
+class VentaDiaria(models.Model):
+    """Resumen precalculado de los pedidos de un día por estado, método de pago y cupón (lo mantiene app_Shein.ventas)."""
+    fecha = models.DateField()
+    estado_pedido = models.CharField(max_length=20, choices=Pedido.ESTADO_CHOICES)
+    # Nombre del método y código del cupón como texto ('' = sin método / sin cupón): los informes no
+    # necesitan JOIN y borrar un método o un cupón no reescribe la historia
+    metodo_pago = models.CharField(max_length=100, blank=True)
+    cupon = models.CharField(max_length=50, blank=True)
+    pedidos = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    descuento = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        # El índice único empieza por la fecha: también sirve a los filtros por rango del panel
+        unique_together = ('fecha', 'estado_pedido', 'metodo_pago', 'cupon')
+
+    def __str__(self):
+        return f"{self.fecha} {self.estado_pedido}: {self.pedidos} pedidos, ${self.total}"
+
+class VentaDiariaCategoria(models.Model):
+    """Resumen precalculado de los items vendidos en un día por estado y categoría de producto."""
+    fecha = models.DateField()
+    estado_pedido = models.CharField(max_length=20, choices=Pedido.ESTADO_CHOICES)
+    categoria = models.CharField(max_length=20, choices=Producto.CATEGORIA_CHOICES)
+    # Pedidos con al menos un item de la categoría: un pedido cuenta en cada categoría que incluye
+    pedidos = models.PositiveIntegerField(default=0)
+    unidades = models.PositiveIntegerField(default=0)
+    # Precio x cantidad de los items, antes del descuento del cupón (que es por pedido)
+    importe = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        unique_together = ('fecha', 'estado_pedido', 'categoria')
+
+    def __str__(self):
+        return f"{self.fecha} {self.estado_pedido} {self.categoria}: {self.unidades} unidades, ${self.importe}"
+
+class MovimientoInventario(models.Model):
+    """Entrada o salida de stock de un producto. Solo se insertan: las existencias son su suma desde el último corte."""
+    TIPO_CHOICES = [
+        ('venta', 'Venta'),
+        ('cancelacion', 'Cancelación'),
+        ('reabastecimiento', 'Reabastecimiento'),
+        ('ajuste', 'Ajuste manual'),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos_inventario')
+    # Positiva si entra stock, negativa si sale
+    cantidad = models.IntegerField()
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    pedido = models.ForeignKey(Pedido, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_inventario')
+    nota = models.CharField(max_length=200, blank=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Movimientos de un producto posteriores a su corte (existencias) y su historial paginado por id
+            models.Index(fields=['producto', 'id'], name='movimiento_producto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} de {self.cantidad:+} para {self.producto_id}"
+
+class CorteInventario(models.Model):
+    """Existencias de un producto sumando sus movimientos hasta `ultimo_movimiento` (lo avanza compactar_inventario)."""
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='corte_inventario')
+    cantidad = models.IntegerField(default=0)
+    # id del último MovimientoInventario incluido en `cantidad`
+    ultimo_movimiento = models.PositiveBigIntegerField(default=0)
+    fecha = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Corte de {self.producto_id}: {self.cantidad} (hasta el movimiento {self.ultimo_movimiento})"
+
+class TareaFondo(models.Model):
+    """Cola de trabajos en segundo plano guardada en la base de datos (la consume run_shein_worker)."""
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    datos = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=3)
+    # Con reintentos se pospone la tarea (espera exponencial)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    iniciada = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # El worker toma las pendientes más antiguas que ya están disponibles
+            models.Index(fields=['estado', 'disponible_desde', 'id'], name='tarea_pendiente_idx'),
+        ]
+
+    def __str__(self):
+        return f"Tarea {self.pk} ({self.tipo}) - {self.estado}"
+
+class TerminoProducto(models.Model):
+    """Índice invertido portable (término -> producto) para el backend de búsqueda sin FTS5."""
+    termino = models.CharField(max_length=100)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='terminos_busqueda')
+    # Peso del campo donde aparece el término (nombre pesa más que descripción)
+    peso = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('termino', 'producto')
 
     def __str__(self):
-        return f"Reseña de {self.usuario.nombre} para {self.producto.nombre} ({self.calificacion} estrellas)"
\ No newline at end of file
+        return f"{self.termino} -> {self.producto_id}"
\ No newline at end of file
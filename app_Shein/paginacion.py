@@ -0,0 +1,155 @@
+"""
+Paginación por cursor (keyset) para las vistas de listado.
+
+En lugar de OFFSET, cada página se pide a partir del último registro visto
+(columna de orden + clave primaria), así que el costo de una página no
+depende de qué tan profunda sea. Los cursores viajan en la query string
+como tokens firmados y opacos.
+"""
+from django.core import signing
+from django.db.models import F, Q
+from django.http import QueryDict
+
+TAMANO_PAGINA = 25
+
+_SALT = 'app_Shein.paginacion'
+_SIGUIENTE = 's'
+_ANTERIOR = 'a'
+
+
+class PaginaCursor:
+    """Página de resultados con los tokens hacia la página siguiente y anterior."""
+
+    def __init__(self, objetos, cursor_siguiente=None, cursor_anterior=None, parametros=None, parametro='cursor'):
+        self.objetos = objetos
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+        self._parametros = parametros
+        self._parametro = parametro
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    def __getitem__(self, indice):
+        return self.objetos[indice]
+
+    @property
+    def url_siguiente(self):
+        return self._url(self.cursor_siguiente)
+
+    @property
+    def url_anterior(self):
+        return self._url(self.cursor_anterior)
+
+    def _url(self, cursor):
+        if cursor is None:
+            return None
+        parametros = self._parametros.copy() if self._parametros is not None else QueryDict(mutable=True)
+        parametros[self._parametro] = cursor
+        return '?' + parametros.urlencode()
+
+
+def _crear_cursor(campo_modelo, objeto, direccion):
+    valor = getattr(objeto, campo_modelo.attname)
+    return signing.dumps({
+        'v': campo_modelo.value_to_string(objeto) if valor is not None else None,
+        'pk': objeto.pk,
+        'd': direccion,
+    }, salt=_SALT)
+
+
+def _leer_cursor(token):
+    """Devuelve el contenido del cursor, o None si falta o fue manipulado."""
+    if not token:
+        return None
+    try:
+        datos = signing.loads(token, salt=_SALT)
+    except signing.BadSignature:
+        return None
+    if not isinstance(datos, dict) or datos.get('d') not in (_SIGUIENTE, _ANTERIOR):
+        return None
+    return datos
+
+
+def _condicion(campo, anulable, valor, pk, hacia_atras):
+    """
+    Filtro de keyset para un orden descendente por (campo, pk), con los
+    valores nulos al final cuando el campo admite NULL.
+
+    Se escribe como `campo <= v AND (campo < v OR pk < p)` en lugar de
+    `campo < v OR (campo = v AND pk < p)` para que la base pueda buscar el
+    rango directamente en el índice en vez de recorrerlo desde el inicio.
+    """
+    if not hacia_atras:
+        if valor is None:
+            return Q(**{f'{campo}__isnull': True, 'pk__lt': pk})
+        condicion = Q(**{f'{campo}__lte': valor}) & (Q(**{f'{campo}__lt': valor}) | Q(pk__lt=pk))
+        if anulable:
+            condicion |= Q(**{f'{campo}__isnull': True})
+        return condicion
+
+    if valor is None:
+        return Q(**{f'{campo}__isnull': False}) | Q(**{f'{campo}__isnull': True, 'pk__gt': pk})
+    return Q(**{f'{campo}__gte': valor}) & (Q(**{f'{campo}__gt': valor}) | Q(pk__gt=pk))
+
+
+def _orden(campo, anulable, hacia_atras):
+    if not anulable:
+        return (campo, 'pk') if hacia_atras else (f'-{campo}', '-pk')
+    if hacia_atras:
+        return (F(campo).asc(nulls_first=True), 'pk')
+    return (F(campo).desc(nulls_last=True), '-pk')
+
+
+def _consulta_pagina(request, queryset, campo, tamano, parametro):
+    """Queryset de la página pedida (con una fila de más) y el cursor leído."""
+    campo_modelo = queryset.model._meta.get_field(campo)
+    anulable = campo_modelo.null
+    datos = _leer_cursor(request.GET.get(parametro))
+    hacia_atras = datos is not None and datos['d'] == _ANTERIOR
+
+    if datos is not None:
+        valor = campo_modelo.to_python(datos['v']) if datos['v'] is not None else None
+        queryset = queryset.filter(_condicion(campo, anulable, valor, datos['pk'], hacia_atras))
+    return queryset.order_by(*_orden(campo, anulable, hacia_atras))[:tamano + 1], datos
+
+
+def paginar_por_cursor(request, queryset, campo, tamano=TAMANO_PAGINA, parametro='cursor'):
+    """
+    Pagina `queryset` en orden descendente por `campo` (desempatando por la
+    clave primaria) usando el cursor recibido en `request.GET[parametro]`.
+    """
+    consulta, datos = _consulta_pagina(request, queryset, campo, tamano, parametro)
+    return _armar_pagina(request, list(consulta), datos, queryset.model._meta.get_field(campo), tamano, parametro)
+
+
+async def apaginar_por_cursor(request, queryset, campo, tamano=TAMANO_PAGINA, parametro='cursor'):
+    """Como paginar_por_cursor, para vistas asíncronas (lee la página con iteración asíncrona)."""
+    consulta, datos = _consulta_pagina(request, queryset, campo, tamano, parametro)
+    filas = [fila async for fila in consulta]
+    return _armar_pagina(request, filas, datos, queryset.model._meta.get_field(campo), tamano, parametro)
+
+
+def _armar_pagina(request, filas, datos, campo_modelo, tamano, parametro):
+    hacia_atras = datos is not None and datos['d'] == _ANTERIOR
+    hay_mas = len(filas) > tamano
+    filas = filas[:tamano]
+    if hacia_atras:
+        filas.reverse()
+
+    cursor_siguiente = cursor_anterior = None
+    if filas:
+        if hacia_atras:
+            cursor_siguiente = _crear_cursor(campo_modelo, filas[-1], _SIGUIENTE)
+            if hay_mas:
+                cursor_anterior = _crear_cursor(campo_modelo, filas[0], _ANTERIOR)
+        else:
+            if hay_mas:
+                cursor_siguiente = _crear_cursor(campo_modelo, filas[-1], _SIGUIENTE)
+            if datos is not None:
+                cursor_anterior = _crear_cursor(campo_modelo, filas[0], _ANTERIOR)
+
+    return PaginaCursor(filas, cursor_siguiente, cursor_anterior, request.GET, parametro)
@@ -0,0 +1,110 @@
+"""Creación de pedidos a partir de las líneas seleccionadas por el cliente y cambios de estado."""
+from django.db import transaction
+from django.db.models import Count
+
+from . import cache_catalogo, cupones, ventas
+from .inventario import liberar_stock, registrar_movimientos, reservar_stock
+from .models import Pedido, ItemPedido, Producto
+
+
+def crear_pedido(usuario, direccion, cantidades, metodo_pago=None, cupon=None):
+    """
+    Crea un pedido con sus items para `cantidades` ({producto_id: cantidad}).
+
+    La reserva de stock, el pedido y sus items se escriben en una sola
+    transacción con un número fijo de consultas (un SELECT que bloquea los
+    productos, otro de sus existencias, un UPDATE del stock del catálogo y
+    tres INSERT: pedido, items y movimientos de inventario)
+    sin importar cuántas líneas tenga: si una línea falla no queda nada
+    guardado. Con cupón se suma un UPDATE que cuenta su uso; los resúmenes
+    de ventas agregan dos INSERT, un UPDATE para la fila del día y uno por
+    categoría del pedido. Todo en la misma transacción.
+    """
+    if not cantidades:
+        raise ValueError('Selecciona al menos un producto.')
+    cantidades = {int(producto_id): cantidad for producto_id, cantidad in cantidades.items()}
+
+    with transaction.atomic():
+        productos = reservar_stock(cantidades)
+        if cupon is not None:
+            cupones.registrar_uso(cupon)
+        pedido = Pedido(
+            id_usuario=usuario,
+            direccion=direccion,
+            metodo_pago=metodo_pago,
+            cupon=cupon,
+        )
+        pedido.aplicar_totales(sum(
+            productos[producto_id].precio * cantidad for producto_id, cantidad in cantidades.items()
+        ))
+        pedido.save()
+        items = ItemPedido.objects.bulk_create([
+            ItemPedido(
+                pedido=pedido,
+                producto=productos[producto_id],
+                cantidad=cantidad,
+                precio_unitario=productos[producto_id].precio,
+            )
+            for producto_id, cantidad in cantidades.items()
+        ])
+        registrar_movimientos('venta', [
+            (producto_id, -cantidad, pedido.pk) for producto_id, cantidad in cantidades.items()
+        ])
+        ventas.registrar_pedido(pedido, items)
+        # El stock cambió con un UPDATE directo, que no dispara las señales de Producto
+        cache_catalogo.invalidar_productos(productos.values())
+    return pedido
+
+
+def cambiar_estado(pedidos, estado):
+    """
+    Pasa a `estado` los pedidos que lo permiten según Pedido.TRANSICIONES.
+
+    `pedidos` es un queryset de Pedido o una lista de ids. Devuelve
+    (ids actualizados, {id: motivo} de los rechazados). Una consulta lee el
+    estado actual de todos y un solo UPDATE cambia los válidos, así que marcar
+    miles de pedidos como enviados cuesta lo mismo que marcar uno. Al cancelar,
+    el stock de sus items y los usos de sus cupones se devuelven en la misma
+    transacción.
+    """
+    estados = dict(Pedido.ESTADO_CHOICES)
+    if estado not in estados:
+        raise ValueError(f'Estado desconocido: {estado}')
+    ids_pedidos = None
+    if not hasattr(pedidos, 'values_list'):
+        ids_pedidos = {int(pedido_id) for pedido_id in pedidos}
+        pedidos = Pedido.objects.filter(pk__in=ids_pedidos)
+    origenes = [anterior for anterior, siguientes in Pedido.TRANSICIONES.items() if estado in siguientes]
+
+    with transaction.atomic():
+        actuales = dict(pedidos.select_for_update().order_by('pk').values_list('pk', 'estado_pedido'))
+        rechazados = {
+            pedido_id: f'No existe el pedido {pedido_id}.' for pedido_id in sorted((ids_pedidos or set()) - set(actuales))
+        }
+        for pedido_id, actual in actuales.items():
+            if actual == estado:
+                rechazados[pedido_id] = f'El pedido ya está {estados[estado].lower()}.'
+            elif actual not in origenes:
+                rechazados[pedido_id] = (
+                    f'Un pedido {estados[actual].lower()} no puede pasar a {estados[estado].lower()}.'
+                )
+        validos = [pedido_id for pedido_id, actual in actuales.items() if actual in origenes]
+        if not validos:
+            return [], rechazados
+
+        # Subconsulta en lugar de una lista de miles de ids; la condición de estado se repite por seguridad
+        cambiados = Pedido.objects.filter(pk__in=pedidos.values('pk'), estado_pedido__in=origenes)
+        ventas.mover_pedidos(cambiados, estado)
+        if estado == 'cancelado':
+            lineas = list(ItemPedido.objects.filter(pedido__in=cambiados).values_list('pedido_id', 'producto_id', 'cantidad'))
+            liberar_stock(lineas)
+            cupones.liberar_usos(dict(
+                cambiados.exclude(cupon=None).values('cupon_id').annotate(n=Count('pk')).order_by()
+                .values_list('cupon_id', 'n')
+            ))
+            # El stock cambió con un UPDATE directo, que no dispara las señales de Producto
+            cache_catalogo.invalidar_productos(
+                Producto.objects.filter(pk__in={producto_id for _, producto_id, _ in lineas}).only('categoria')
+            )
+        cambiados.update(estado_pedido=estado)
+    return validos, rechazados
@@ -0,0 +1,45 @@
+"""
+Revisión de los planes de ejecución de las consultas más usadas.
+
+`consultas_criticas()` reproduce la forma (filtros, orden y límite) de las
+consultas que generan las vistas; `escaneos_completos()` corre EXPLAIN y
+devuelve las líneas del plan que recorren una tabla completa sin índice.
+Lo usan el comando `verificar_indices` y las pruebas.
+"""
+import re
+
+from django.db import connection
+
+from .autocompletar import clientes_por_prefijo
+from .models import Usuario, Producto, Pedido, CuponDescuento, Resena
+from .paginacion import TAMANO_PAGINA
+
+# SQLite: "SCAN tabla" sin "USING [COVERING] INDEX"; PostgreSQL: "Seq Scan on tabla"
+_ESCANEO_SQLITE = re.compile(r'\bSCAN (?!CONSTANT ROW)\S+(?!.*\bUSING (COVERING )?INDEX\b)')
+_ESCANEO_POSTGRES = re.compile(r'\bSeq Scan on\b')
+
+
+def consultas_criticas():
+    """Consultas de las vistas de listado y de checkout, tal como las ejecutan."""
+    limite = TAMANO_PAGINA + 1
+    catalogo = Producto.objects.filter(disponible=True, stock__gt=0)
+    return {
+        'catalogo_productos': catalogo.order_by('-fecha_agregado', '-pk')[:limite],
+        'catalogo_por_categoria': catalogo.filter(categoria='ropa').order_by('-fecha_agregado', '-pk')[:limite],
+        'ver_productos': Producto.objects.order_by('-fecha_agregado', '-pk')[:limite],
+        'ver_usuarios': Usuario.objects.order_by('-fecha_registro', '-pk')[:limite],
+        'clientes_activos': Usuario.objects.filter(activo=True, tipo_usuario='cliente'),
+        'autocompletar_clientes_nombre': clientes_por_prefijo('nombre', 'ana')[:10],
+        'autocompletar_clientes_email': clientes_por_prefijo('email', 'ana')[:10],
+        'ver_pedidos': Pedido.objects.order_by('-fecha', '-pk')[:limite],
+        'ver_resenas': Resena.objects.order_by('-fecha_resena', '-pk')[:limite],
+        'resenas_de_producto': Resena.objects.filter(producto_id=1).order_by('-fecha_resena'),
+        'cupon_por_codigo': CuponDescuento.objects.filter(codigo='DESCUENTO', activo=True),
+    }
+
+
+def escaneos_completos(queryset):
+    """Líneas del plan de `queryset` que hacen un escaneo completo de tabla."""
+    plan = queryset.explain()
+    patron = _ESCANEO_POSTGRES if connection.vendor == 'postgresql' else _ESCANEO_SQLITE
+    return [linea.strip() for linea in plan.splitlines() if patron.search(linea)]
@@ -0,0 +1,135 @@
+"""
+Señales que mantienen sincronizados la caché del catálogo, los resúmenes de
+calificaciones y de ventas y el historial de inventario.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import busqueda, cache_catalogo, calificaciones, cupones, inventario, tareas, ventas
+from .models import CuponDescuento, Pedido, Producto, Resena
+
+
+@receiver(pre_save, sender=Producto)
+def recordar_estado_anterior(sender, instance, update_fields=None, **kwargs):
+    # Si el producto cambia de categoría hay que invalidar también la anterior
+    instance._categoria_anterior = None
+    imagen_anterior = None
+    stock_guardado = None
+    if instance.pk:
+        consulta = Producto.objects.filter(pk=instance.pk)
+        if transaction.get_connection().in_atomic_block:
+            consulta = consulta.select_for_update()
+        instance._categoria_anterior, imagen_anterior, stock_guardado = (
+            consulta.values_list('categoria', 'imagen', 'stock').first() or (None, None, None)
+        )
+
+    # El historial registra solo lo que cambió quien guarda desde que cargó el producto, aplicado sobre el
+    # stock actual: guardar una instancia cargada antes de una venta no devuelve la unidad vendida
+    instance._diferencia_stock = 0
+    cargado = getattr(instance, '_stock_cargado', None)
+    if update_fields is None or 'stock' in update_fields:
+        if stock_guardado is not None and cargado is not None:
+            instance._diferencia_stock = instance.stock - cargado
+            instance.stock = stock_guardado + instance._diferencia_stock
+        else:
+            instance._diferencia_stock = instance.stock - (stock_guardado or 0)
+
+    # Una imagen nueva se procesa en el worker; los guardados parciales (los del propio worker) no cuentan
+    instance._encolar_imagen = False
+    if update_fields is None and (instance.imagen.name or None) != (imagen_anterior or None):
+        if instance.imagen:
+            instance.estado_imagen = 'pendiente'
+            instance._encolar_imagen = True
+        else:
+            instance.estado_imagen = 'sin_imagen'
+        instance.imagen_variantes = {}
+
+
+@receiver(post_save, sender=Producto)
+def encolar_imagen_nueva(sender, instance, **kwargs):
+    if getattr(instance, '_encolar_imagen', False):
+        tareas.encolar_imagen(instance)
+        instance._encolar_imagen = False
+
+
+@receiver(post_save, sender=Producto)
+def registrar_cambio_de_stock(sender, instance, created, update_fields=None, **kwargs):
+    diferencia = getattr(instance, '_diferencia_stock', 0)
+    instance._diferencia_stock = 0
+    instance._stock_cargado = instance.stock
+    if created:
+        inventario.registrar_movimientos('reabastecimiento', [(instance.pk, diferencia, None)], nota='Alta del producto')
+    else:
+        inventario.registrar_movimientos('ajuste', [(instance.pk, diferencia, None)], nota='Edición del producto')
+
+
+@receiver(post_save, sender=Producto)
+def indexar_para_busqueda(sender, instance, update_fields=None, **kwargs):
+    # FTS5 se mantiene con triggers; al borrar, los términos se van en cascada con el producto
+    campos = {campo for campo, _ in busqueda.BusquedaTerminos.CAMPOS}
+    if update_fields is None or campos & set(update_fields):
+        busqueda.backend().indexar([instance])
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_cache_producto(sender, instance, **kwargs):
+    cache_catalogo.invalidar_producto(
+        instance.pk, instance.categoria, getattr(instance, '_categoria_anterior', None)
+    )
+
+
+@receiver(post_save, sender=Resena)
+def actualizar_resumen_al_guardar(sender, instance, created, **kwargs):
+    if created:
+        calificaciones.registrar_resena(instance)
+    else:
+        # Una edición puede cambiar la calificación: se recalcula el producto completo
+        calificaciones.recalcular_resumen(instance.producto_id)
+
+
+@receiver(post_delete, sender=Resena)
+def actualizar_resumen_al_borrar(sender, instance, **kwargs):
+    calificaciones.descontar_resena(instance)
+
+
+@receiver(post_save, sender=Resena)
+@receiver(post_delete, sender=Resena)
+def marcar_producto_actualizado(sender, instance, **kwargs):
+    # Las reseñas forman parte del producto en la API: cambian su ETag y Last-Modified
+    Producto.objects.filter(pk=instance.producto_id).update(fecha_actualizacion=timezone.now())
+
+
+@receiver(post_save, sender=Resena)
+@receiver(post_delete, sender=Resena)
+def invalidar_cache_resena(sender, instance, **kwargs):
+    categoria = Producto.objects.filter(pk=instance.producto_id).values_list('categoria', flat=True).first()
+    cache_catalogo.invalidar_producto(instance.producto_id, categoria)
+
+
+@receiver(post_save, sender=CuponDescuento)
+@receiver(post_delete, sender=CuponDescuento)
+def invalidar_cache_cupon(sender, instance, **kwargs):
+    cupones.invalidar(instance)
+
+
+@receiver(pre_save, sender=Pedido)
+def recordar_venta_anterior(sender, instance, **kwargs):
+    # Los pedidos nuevos los registra pedidos.crear_pedido() cuando ya tienen items
+    instance._venta_anterior = None if instance._state.adding else ventas.datos_pedido(instance.pk)
+
+
+@receiver(post_save, sender=Pedido)
+def mover_venta(sender, instance, created, **kwargs):
+    anterior = getattr(instance, '_venta_anterior', None)
+    if not created and anterior is not None:
+        # Un cambio de estado (o de totales) pasa las cifras a las filas que corresponden
+        ventas.mover_pedido(instance.pk, anterior, ventas.datos_pedido(instance.pk))
+
+
+@receiver(pre_delete, sender=Pedido)
+def descontar_venta(sender, instance, **kwargs):
+    # pre_delete: después del borrado ya no quedan items para saber qué categorías descontar
+    ventas.descontar_pedido(instance.pk)
@@ -0,0 +1,120 @@
+"""
+Cola de tareas en segundo plano sobre la tabla TareaFondo, sin broker externo.
+
+`encolar()` inserta la tarea en la misma transacción que la escritura que la
+origina, así que nunca hay tareas de cambios que se deshicieron. El comando
+`run_shein_worker` toma lotes con `tomar_tareas()` (que los marca como
+'procesando' de forma atómica) y ejecuta cada tarea con `ejecutar_tarea()` en
+un pool de procesos. Una tarea que falla se reintenta con espera exponencial
+hasta `max_intentos`; después queda como 'fallida'. Cada toma cuenta como un
+intento, así que una tarea que tumba a su worker también se agota.
+"""
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .imagenes import generar_derivados
+from .models import Producto, TareaFondo
+
+ESPERA_BASE_SEGUNDOS = 5
+# Una tarea 'procesando' por más de este tiempo se considera abandonada (el worker murió)
+TIEMPO_MAXIMO = timedelta(minutes=10)
+
+
+def encolar(tipo, datos, max_intentos=3):
+    return TareaFondo.objects.create(tipo=tipo, datos=datos, max_intentos=max_intentos)
+
+
+def tomar_tareas(limite):
+    """Marca como 'procesando' hasta `limite` tareas disponibles y devuelve sus ids."""
+    ahora = timezone.now()
+    with transaction.atomic():
+        # En PostgreSQL, skip_locked deja que varios workers tomen lotes distintos;
+        # en SQLite la transacción IMMEDIATE ya serializa a los workers
+        ids = list(
+            TareaFondo.objects.select_for_update(skip_locked=True)
+            .filter(estado='pendiente', disponible_desde__lte=ahora)
+            .order_by('disponible_desde', 'id')
+            .values_list('pk', flat=True)[:limite]
+        )
+        TareaFondo.objects.filter(pk__in=ids, estado='pendiente').update(
+            estado='procesando', iniciada=ahora, intentos=F('intentos') + 1, fecha_actualizacion=ahora,
+        )
+    return ids
+
+
+def recuperar_abandonadas():
+    """
+    Devuelve a la cola las tareas que quedaron 'procesando' por un worker que
+    se detuvo; las que ya agotaron sus intentos quedan como 'fallida'.
+    Devuelve (devueltas, fallidas).
+    """
+    ahora = timezone.now()
+    abandonadas = TareaFondo.objects.filter(estado='procesando', iniciada__lt=ahora - TIEMPO_MAXIMO)
+    with transaction.atomic():
+        agotadas = list(
+            abandonadas.select_for_update().filter(intentos__gte=F('max_intentos')).values_list('pk', 'tipo', 'datos')
+        )
+        fallidas = abandonadas.filter(pk__in=[pk for pk, _, _ in agotadas]).update(
+            estado='fallida', error='El worker se detuvo mientras ejecutaba la tarea.', fecha_actualizacion=ahora,
+        )
+        devueltas = abandonadas.update(estado='pendiente', fecha_actualizacion=ahora)
+    for _, tipo, datos in agotadas:
+        _, al_fallar = MANEJADORES.get(tipo, (None, None))
+        if al_fallar:
+            al_fallar(datos)
+    return devueltas, fallidas
+
+
+def ejecutar_tarea(tarea_id):
+    """Ejecuta una tarea ya tomada; devuelve True si terminó bien."""
+    tarea = TareaFondo.objects.get(pk=tarea_id)
+    funcion, al_fallar = MANEJADORES.get(tarea.tipo, (None, None))
+    try:
+        if funcion is None:
+            raise LookupError(f'Tipo de tarea desconocido: {tarea.tipo}')
+        funcion(tarea.datos)
+    except Exception:
+        ahora = timezone.now()
+        cambios = {'error': traceback.format_exc(), 'fecha_actualizacion': ahora}
+        if tarea.intentos >= tarea.max_intentos:
+            TareaFondo.objects.filter(pk=tarea_id).update(estado='fallida', **cambios)
+            if al_fallar:
+                al_fallar(tarea.datos)
+        else:
+            espera = timedelta(seconds=ESPERA_BASE_SEGUNDOS * 2 ** (tarea.intentos - 1))
+            TareaFondo.objects.filter(pk=tarea_id).update(estado='pendiente', disponible_desde=ahora + espera, **cambios)
+        return False
+
+    TareaFondo.objects.filter(pk=tarea_id).update(estado='completada', error='', fecha_actualizacion=timezone.now())
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Imágenes de producto
+
+def encolar_imagen(producto):
+    return encolar('procesar_imagen', {'producto_id': producto.pk})
+
+
+def procesar_imagen(datos):
+    producto = Producto.objects.filter(pk=datos['producto_id']).first()
+    if producto is None or not producto.imagen:
+        return  # Se borró el producto o su imagen mientras esperaba
+    # update() no dispara señales: el estado intermedio no necesita invalidar la caché.
+    # Si ya se subió otra imagen, su propia tarea la procesará
+    Producto.objects.filter(pk=producto.pk, imagen=producto.imagen.name).update(estado_imagen='procesando')
+    generar_derivados(producto)
+
+
+def marcar_error_imagen(datos):
+    Producto.objects.filter(pk=datos['producto_id']).update(estado_imagen='error')
+
+
+# tipo -> (función que la ejecuta, función a llamar cuando se agotan los intentos)
+MANEJADORES = {
+    'procesar_imagen': (procesar_imagen, marcar_error_imagen),
+}
@@ -0,0 +1,45 @@
+"""
+Etiqueta `{% imagen_producto producto %}`: emite un <picture> con un <source>
+por formato moderno (AVIF, WebP) y un <img> JPEG de respaldo, todos con
+`srcset` por ancho, para que el navegador descargue la miniatura adecuada.
+Si el producto aún no tiene derivados se usa la imagen original.
+"""
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from app_Shein.imagenes import TIPOS_MIME
+
+register = template.Library()
+
+
+def _srcset(rutas):
+    return ', '.join(
+        f'{default_storage.url(ruta)} {ancho}w'
+        for ancho, ruta in sorted(rutas.items(), key=lambda par: int(par[0]))
+    )
+
+
+@register.simple_tag
+def imagen_producto(producto, sizes='100vw', style='', loading='lazy'):
+    variantes = producto.imagen_variantes or {}
+    respaldo = variantes.get('jpg')
+    if not respaldo:
+        return format_html(
+            '<img src="{}" alt="{}" style="{}" loading="{}">',
+            producto.imagen.url, producto.nombre, style, loading,
+        )
+
+    fuentes = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (TIPOS_MIME[extension], _srcset(variantes[extension]), sizes)
+            for extension in ('avif', 'webp') if variantes.get(extension)
+        ),
+    )
+    mayor = max(respaldo, key=int)
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" style="{}" loading="{}" decoding="async"></picture>',
+        fuentes, default_storage.url(respaldo[mayor]), _srcset(respaldo), sizes,
+        producto.nombre, style, loading,
+    )
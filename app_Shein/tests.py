@@ -1,3 +1,2034 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse, QueryDict
+from django.core.management import call_command
+from django.db import models
+from django.db import OperationalError, connection, connections
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .models import (
+    Usuario, Producto, Pedido, ItemPedido, MetodoPago, CuponDescuento, Resena, ResumenCalificacion, TareaFondo,
+    VentaDiaria, VentaDiariaCategoria, MovimientoInventario, CorteInventario,
+)
+from . import cache_catalogo, middleware
+from . import api, autocompletar, busqueda, carrito, cupones, facetas, importacion, inventario, ventas
+from .imagenes import formatos_disponibles, generar_derivados
+from . import tareas
+from .inventario import StockInsuficiente
+from .management.commands import seed_shein
+from .paginacion import paginar_por_cursor
+from .planes_consulta import consultas_criticas, escaneos_completos
+from .pedidos import cambiar_estado, crear_pedido
+
+
+def crear_usuario(**kwargs):
+    datos = {
+        'nombre': 'Cliente',
+        'email': f'cliente{Usuario.objects.count()}@example.com',
+        'telefono': '5550000000',
+        'direccion': 'Calle 1',
+    }
+    datos.update(kwargs)
+    return Usuario.objects.create(**datos)
+
+
+def consultas_por_vista(logs):
+    """{vista: consultas} de las líneas que escribió la instrumentación en `logs` (de assertLogs)."""
+    return {json.loads(r.getMessage())['vista']: json.loads(r.getMessage())['consultas'] for r in logs.records}
+
+
+def crear_producto(**kwargs):
+    datos = {
+        'nombre': 'Blusa',
+        'descripcion': 'Blusa de algodón',
+        'precio': Decimal('199.90'),
+        'categoria': 'ropa',
+        'talla': 'M',
+        'color': 'Rosa',
+        'stock': 10,
+    }
+    datos.update(kwargs)
+    return Producto.objects.create(**datos)
+
+
+# =================================================================================
+# ========== CATÁLOGO ==========
+
+class CatalogoProductosTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def consultas_catalogo(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('catalogo_productos'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_calificacion_anotada(self):
+        producto = crear_producto()
+        crear_producto(nombre='Falda')
+        Resena.objects.create(producto=producto, usuario=crear_usuario(), calificacion=5)
+        Resena.objects.create(producto=producto, usuario=crear_usuario(), calificacion=4)
+
+        response, _ = self.consultas_catalogo()
+        productos = {p.id: p for p in response.context['productos']}
+        self.assertEqual(productos[producto.id].calificacion_promedio, 4.5)
+        self.assertEqual(productos[producto.id].total_resenas, 2)
+        self.assertContains(response, '4.5 / 5 (2 reseñas)')
+
+    def test_numero_de_consultas_constante(self):
+        usuario = crear_usuario()
+        producto = crear_producto()
+        Resena.objects.create(producto=producto, usuario=usuario, calificacion=3)
+        _, consultas_pocos = self.consultas_catalogo()
+
+        for i in range(25):
+            producto = crear_producto(nombre=f'Producto {i}')
+            Resena.objects.create(producto=producto, usuario=usuario, calificacion=5)
+        _, consultas_muchos = self.consultas_catalogo()
+
+        self.assertEqual(consultas_pocos, consultas_muchos)
+        # Una para la página y una agrupada por cada faceta
+        self.assertEqual(consultas_muchos, 1 + len(facetas.FACETAS))
+
+
+# =================================================================================
+# ========== PAGINACIÓN POR CURSOR ==========
+
+class PaginacionCursorTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def recorrer(self, queryset, campo, tamano):
+        """Recorre todas las páginas hacia adelante y luego de regreso."""
+        paginas = [paginar_por_cursor(self.factory.get('/'), queryset, campo, tamano)]
+        while paginas[-1].cursor_siguiente:
+            request = self.factory.get('/', {'cursor': paginas[-1].cursor_siguiente})
+            paginas.append(paginar_por_cursor(request, queryset, campo, tamano))
+
+        regreso = [paginas[-1]]
+        while regreso[-1].cursor_anterior:
+            request = self.factory.get('/', {'cursor': regreso[-1].cursor_anterior})
+            regreso.append(paginar_por_cursor(request, queryset, campo, tamano))
+        return paginas, regreso
+
+    def test_recorrido_con_empates_en_la_columna_de_orden(self):
+        for i in range(7):
+            crear_usuario(nombre=f'Usuario {i}')
+        # Mismo timestamp para todos: el desempate lo hace la clave primaria
+        Usuario.objects.update(fecha_registro=Usuario.objects.first().fecha_registro)
+
+        paginas, regreso = self.recorrer(Usuario.objects.all(), 'fecha_registro', 3)
+        ids = [u.id for pagina in paginas for u in pagina]
+        self.assertEqual(ids, list(Usuario.objects.order_by('-pk').values_list('id', flat=True)))
+        self.assertEqual([len(p) for p in paginas], [3, 3, 1])
+        self.assertEqual(
+            [[u.id for u in p] for p in regreso],
+            [[u.id for u in p] for p in reversed(paginas)],
+        )
+
+    def test_columna_anulable_deja_los_nulos_al_final(self):
+        for i in range(5):
+            CuponDescuento.objects.create(
+                codigo=f'CUPON{i}',
+                descuento_porcentaje=Decimal('10.00'),
+                fecha_expiracion=f'2030-01-0{i + 1}' if i % 2 else None,
+            )
+
+        paginas, regreso = self.recorrer(CuponDescuento.objects.all(), 'fecha_expiracion', 2)
+        codigos = [c.codigo for pagina in paginas for c in pagina]
+        self.assertEqual(codigos, ['CUPON3', 'CUPON1', 'CUPON4', 'CUPON2', 'CUPON0'])
+        self.assertEqual(len(regreso), len(paginas))
+
+    def test_cursor_manipulado_regresa_a_la_primera_pagina(self):
+        crear_usuario()
+        pagina = paginar_por_cursor(self.factory.get('/', {'cursor': 'basura'}), Usuario.objects.all(), 'fecha_registro')
+        self.assertEqual(len(pagina), 1)
+        self.assertIsNone(pagina.cursor_anterior)
+
+    def test_vista_conserva_filtros_en_los_enlaces(self):
+        for i in range(30):
+            crear_producto(nombre=f'Producto {i}', categoria='zapatos')
+        response = self.client.get(reverse('catalogo_productos'), {'categoria': 'zapatos'})
+        pagina = response.context['productos']
+        self.assertEqual(len(pagina), 25)
+        self.assertIn('categoria=zapatos', pagina.url_siguiente)
+
+        response = self.client.get(reverse('catalogo_productos') + pagina.url_siguiente)
+        self.assertEqual(len(response.context['productos']), 5)
+
+
+# =================================================================================
+# ========== TOTALES DE PEDIDOS ==========
+
+class TotalesPedidoTests(TestCase):
+
+    def setUp(self):
+        self.usuario = crear_usuario()
+        self.blusa = crear_producto(precio=Decimal('100.00'))
+        self.falda = crear_producto(nombre='Falda', precio=Decimal('50.00'))
+
+    def test_pedido_multiple_guarda_totales_con_cupon(self):
+        cache.clear()
+        CuponDescuento.objects.create(codigo='DESC10', descuento_porcentaje=Decimal('10.00'))
+        self.client.post(reverse('agregar_al_carrito', args=[self.blusa.id]), {'cantidad': 2})
+        self.client.post(reverse('agregar_al_carrito', args=[self.falda.id]), {'cantidad': 1})
+        self.client.post(reverse('crear_pedido_multiple'), {
+            'usuario_id': self.usuario.id,
+            'direccion': 'Calle 1',
+            'cupon_codigo': 'DESC10',
+        })
+        pedido = Pedido.objects.get()
+        self.assertEqual(pedido.subtotal, Decimal('250.00'))
+        self.assertEqual(pedido.descuento, Decimal('25.00'))
+        self.assertEqual(pedido.total_pedido(), Decimal('225.00'))
+
+    def test_total_no_cambia_si_cambia_el_precio(self):
+        self.client.post(reverse('crear_pedido_directo', args=[self.blusa.id]), {
+            'usuario_id': self.usuario.id,
+            'direccion': 'Calle 1',
+            'cantidad': 3,
+        })
+        Producto.objects.filter(id=self.blusa.id).update(precio=Decimal('999.00'))
+
+        pedido = Pedido.objects.get()
+        pedido.recalcular_totales()
+        self.assertEqual(pedido.total, Decimal('300.00'))
+        self.assertEqual(pedido.items.get().subtotal(), Decimal('300.00'))
+
+    def test_comando_recalcula_pedidos_existentes(self):
+        pedidos = []
+        for _ in range(5):
+            pedido = Pedido.objects.create(id_usuario=self.usuario, direccion='Calle 1')
+            ItemPedido.objects.create(pedido=pedido, producto=self.blusa, cantidad=1)
+            ItemPedido.objects.create(pedido=pedido, producto=self.falda, cantidad=2)
+            pedidos.append(pedido)
+
+        call_command('recalcular_totales_pedidos', lote=2, stdout=StringIO())
+
+        self.assertFalse(ItemPedido.objects.filter(precio_unitario__isnull=True).exists())
+        self.assertEqual(
+            set(Pedido.objects.values_list('total', flat=True)),
+            {Decimal('200.00')},
+        )
+        # Los resúmenes de ventas quedan con los totales recalculados, no con los de antes
+        self.assertEqual(
+            list(VentaDiaria.objects.values_list('pedidos', 'total')), [(5, Decimal('1000.00'))],
+        )
+
+
+# =================================================================================
+# ========== RESERVA DE STOCK ==========
+
+class ReservaStockTests(TestCase):
+
+    def setUp(self):
+        self.usuario = crear_usuario()
+        self.blusa = crear_producto(stock=5)
+        self.falda = crear_producto(nombre='Falda', stock=1)
+
+    def test_rechaza_el_pedido_completo_si_una_linea_falla(self):
+        with self.assertRaises(StockInsuficiente):
+            crear_pedido(self.usuario, 'Calle 1', {self.blusa.id: 2, self.falda.id: 3})
+
+        self.assertFalse(Pedido.objects.exists())
+        self.blusa.refresh_from_db()
+        self.assertEqual(self.blusa.stock, 5)
+
+    def test_vista_muestra_el_error_de_stock(self):
+        response = self.client.post(reverse('crear_pedido_directo', args=[self.falda.id]), {
+            'usuario_id': self.usuario.id,
+            'direccion': 'Calle 1',
+            'cantidad': 2,
+        })
+        self.assertContains(response, 'Stock insuficiente para Falda. Solo hay 1 unidades.')
+        self.assertFalse(Pedido.objects.exists())
+
+
+    def test_consultas_constantes_sin_importar_las_lineas(self):
+        productos = [crear_producto(nombre=f'Producto {i}', stock=3) for i in range(50)]
+
+        with CaptureQueriesContext(connection) as una_linea:
+            crear_pedido(self.usuario, 'Calle 1', {self.blusa.id: 1})
+        with CaptureQueriesContext(connection) as cincuenta_lineas:
+            pedido = crear_pedido(self.usuario, 'Calle 1', {p.id: 2 for p in productos})
+
+        self.assertEqual(len(una_linea), len(cincuenta_lineas))
+        self.assertEqual(pedido.items.count(), 50)
+        self.assertEqual(pedido.total, Decimal('199.90') * 100)
+        self.assertEqual(set(inventario.existencias([p.id for p in productos]).values()), {1})
+
+
+class ReservaStockConcurrenteTests(TransactionTestCase):
+
+    def test_stock_nunca_queda_negativo(self):
+        usuario = crear_usuario()
+        productos = [crear_producto(nombre=f'Producto {i}', stock=20) for i in range(3)]
+        resultados = []
+
+        def comprar(indice):
+            # Cada hilo pide los mismos productos en distinto orden
+            orden = productos[indice % 3:] + productos[:indice % 3]
+            cantidades = {producto.id: 1 + (indice % 2) for producto in orden}
+            try:
+                while True:
+                    try:
+                        crear_pedido(usuario, 'Calle 1', cantidades)
+                        resultados.append('ok')
+                        return
+                    except StockInsuficiente:
+                        resultados.append('sin_stock')
+                        return
+                    except OperationalError:
+                        # SQLite en memoria no espera al bloqueo de otro hilo: reintentar
+                        time.sleep(0.01)
+                        continue
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=comprar, args=(i,)) for i in range(30)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(resultados), 30)
+        vendidos = ItemPedido.objects.values('producto_id').annotate(total=models.Sum('cantidad'))
+        for producto_id, existencias in inventario.existencias([p.id for p in productos]).items():
+            self.assertGreaterEqual(existencias, 0)
+            total = next(v['total'] for v in vendidos if v['producto_id'] == producto_id)
+            self.assertEqual(existencias + total, 20)
+        self.assertEqual(Pedido.objects.count(), resultados.count('ok'))
+
+
+# =================================================================================
+# ========== CACHÉ DEL CATÁLOGO ==========
+
+class CacheCatalogoTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        cache_catalogo.reiniciar_estadisticas()
+        self.producto = crear_producto(categoria='zapatos')
+
+    def test_segunda_lectura_no_consulta_la_base(self):
+        self.client.get(reverse('catalogo_productos'), {'categoria': 'zapatos'})
+        self.client.get(reverse('detalle_producto', args=[self.producto.id]))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('catalogo_productos'), {'categoria': 'zapatos'})
+            self.client.get(reverse('detalle_producto', args=[self.producto.id]))
+
+        estadisticas = self.client.get(reverse('estadisticas_cache')).json()
+        self.assertEqual(estadisticas['catalogo'], {'aciertos': 1, 'fallos': 1, 'tasa_aciertos': 0.5})
+        self.assertEqual(estadisticas['detalle']['aciertos'], 1)
+
+    def test_guardar_producto_invalida_categoria_anterior_y_nueva(self):
+        self.client.get(reverse('catalogo_productos'), {'categoria': 'zapatos'})
+        self.client.get(reverse('catalogo_productos'), {'categoria': 'hogar'})
+
+        self.producto.categoria = 'hogar'
+        self.producto.save()
+
+        response = self.client.get(reverse('catalogo_productos'), {'categoria': 'zapatos'})
+        self.assertEqual(len(response.context['productos']), 0)
+        response = self.client.get(reverse('catalogo_productos'), {'categoria': 'hogar'})
+        self.assertEqual(len(response.context['productos']), 1)
+
+    def test_resena_invalida_detalle_y_catalogo(self):
+        self.client.get(reverse('catalogo_productos'))
+        self.client.get(reverse('detalle_producto', args=[self.producto.id]))
+
+        Resena.objects.create(producto=self.producto, usuario=crear_usuario(), calificacion=4)
+
+        response = self.client.get(reverse('detalle_producto', args=[self.producto.id]))
+        self.assertEqual(response.context['total_resenas'], 1)
+        response = self.client.get(reverse('catalogo_productos'))
+        self.assertEqual(response.context['productos'][0].total_resenas, 1)
+
+    def test_pedido_invalida_el_stock_mostrado(self):
+        self.client.get(reverse('detalle_producto', args=[self.producto.id]))
+        crear_pedido(crear_usuario(), 'Calle 1', {self.producto.id: 4})
+
+        response = self.client.get(reverse('detalle_producto', args=[self.producto.id]))
+        self.assertEqual(response.context['producto'].existencias, 6)
+
+
+# =================================================================================
+# ========== RESUMEN DE CALIFICACIONES ==========
+
+class ResumenCalificacionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.producto = crear_producto()
+
+    def resumen(self):
+        return ResumenCalificacion.objects.get(producto=self.producto)
+
+    def test_agregar_y_borrar_resenas_actualiza_el_resumen(self):
+        for calificacion in (5, 5, 3):
+            self.client.post(reverse('agregar_resena', args=[self.producto.id]), {
+                'usuario_id': crear_usuario().id,
+                'calificacion': calificacion,
+            })
+        resumen = self.resumen()
+        self.assertEqual((resumen.total, resumen.suma, resumen.estrellas_5, resumen.estrellas_3), (3, 13, 2, 1))
+        self.assertEqual(resumen.promedio, 4.3)
+
+        resena = Resena.objects.filter(calificacion=5).first()
+        self.client.post(reverse('borrar_resena', args=[resena.id]))
+        resumen = self.resumen()
+        self.assertEqual((resumen.total, resumen.suma, resumen.estrellas_5), (2, 8, 1))
+
+    def test_detalle_muestra_la_distribucion(self):
+        Resena.objects.create(producto=self.producto, usuario=crear_usuario(), calificacion=4)
+        response = self.client.get(reverse('detalle_producto', args=[self.producto.id]))
+        self.assertEqual(response.context['media_calificacion'], 4.0)
+        self.assertEqual(response.context['distribucion_calificaciones'][1], (4, 1, 100))
+
+    def test_comando_repara_desfases(self):
+        Resena.objects.create(producto=self.producto, usuario=crear_usuario(), calificacion=2)
+        Resena.objects.create(producto=self.producto, usuario=crear_usuario(), calificacion=4)
+        ResumenCalificacion.objects.update(total=99, suma=0, estrellas_2=7)
+
+        call_command('reconstruir_resumen_calificaciones', stdout=StringIO())
+        resumen = self.resumen()
+        self.assertEqual((resumen.total, resumen.suma, resumen.estrellas_2, resumen.estrellas_4), (2, 6, 1, 1))
+
+
+# =================================================================================
+# ========== ÍNDICES ==========
+
+class IndicesConsultasTests(TestCase):
+
+    def test_consultas_criticas_no_recorren_tablas_completas(self):
+        usuarios = [crear_usuario(tipo_usuario='cliente' if i % 3 else 'vendedor') for i in range(60)]
+        productos = [crear_producto(categoria=['ropa', 'hogar'][i % 2], stock=i % 4) for i in range(60)]
+        for usuario, producto in zip(usuarios, productos):
+            Resena.objects.create(producto=producto, usuario=usuario, calificacion=3)
+            Pedido.objects.create(id_usuario=usuario, direccion='Calle 1')
+        for i in range(20):
+            CuponDescuento.objects.create(codigo=f'CUPON{i}', descuento_porcentaje=Decimal('5.00'))
+
+        for nombre, queryset in consultas_criticas().items():
+            with self.subTest(consulta=nombre):
+                self.assertEqual(escaneos_completos(queryset), [])
+
+    def test_detecta_escaneo_completo(self):
+        self.assertNotEqual(escaneos_completos(Producto.objects.filter(color='Rosa')), [])
+
+
+# =================================================================================
+# ========== DATOS SINTÉTICOS Y BENCHMARK ==========
+
+class SeedYBenchmarkTests(TestCase):
+
+    def sembrar(self):
+        call_command(
+            'seed_shein', usuarios=30, productos=20, pedidos=40, resenas=50, lote=7, semilla=7, stdout=StringIO(),
+        )
+
+    def test_seed_genera_volumenes_y_totales_consistentes(self):
+        self.sembrar()
+        self.assertEqual(Usuario.objects.count(), 30)
+        self.assertEqual(Producto.objects.count(), 20)
+        self.assertEqual(Pedido.objects.count(), 40)
+        self.assertEqual(Resena.objects.count(), 50)
+        self.assertEqual(ResumenCalificacion.objects.aggregate(n=models.Sum('total'))['n'], 50)
+
+        pedido = Pedido.objects.filter(cupon__isnull=True).first()
+        esperado = pedido.subtotal
+        pedido.recalcular_totales()
+        self.assertEqual(pedido.subtotal, esperado)
+        # Los descuentos generados redondean igual que los de las vistas
+        for pedido in Pedido.objects.exclude(cupon=None).select_related('cupon'):
+            self.assertEqual(pedido.descuento, pedido.cupon.calcular_descuento(pedido.subtotal))
+
+        # Después de insertar con pk explícitas los INSERT normales siguen funcionando
+        self.assertEqual(crear_usuario().pk, Usuario.objects.aggregate(n=models.Max('pk'))['n'])
+        self.assertEqual(crear_producto().pk, Producto.objects.aggregate(n=models.Max('pk'))['n'])
+
+    def test_seed_es_reproducible(self):
+        self.sembrar()
+        TareaFondo.objects.create(tipo='imagen', datos={'producto_id': Producto.objects.first().pk})
+        primeros = list(Producto.objects.order_by('pk').values_list('nombre', 'precio'))
+        call_command(
+            'seed_shein', usuarios=30, productos=20, pedidos=40, resenas=50, lote=7, semilla=7,
+            limpiar=True, stdout=StringIO(),
+        )
+        self.assertFalse(TareaFondo.objects.exists())
+        self.assertEqual(
+            [fila[1] for fila in primeros],
+            list(Producto.objects.order_by('pk').values_list('precio', flat=True)),
+        )
+
+    def test_resenas_no_repiten_pares_existentes(self):
+        usuarios = [crear_usuario(email=f'u{i}@example.com').pk for i in range(2)]
+        productos = [crear_producto().pk for _ in range(2)]
+        Resena.objects.create(producto_id=productos[0], usuario_id=usuarios[0], calificacion=5)
+        comando = seed_shein.Command(stdout=StringIO())
+        comando.rng, comando.lote, comando.ahora = random.Random(7), 7, timezone.now()
+        # Solo quedan 3 pares libres: se generan esos sin chocar con unique_together
+        comando.crear_resenas(10, usuarios, productos)
+        self.assertEqual(Resena.objects.count(), 4)
+
+    def test_benchmark_cubre_las_urls_y_compara_con_la_linea_base(self):
+        cache.clear()
+        self.sembrar()
+        salida = StringIO()
+        with tempfile.NamedTemporaryFile(suffix='.json') as archivo:
+            call_command('benchmark_shein', repeticiones=2, guardar=archivo.name, stdout=salida)
+            with open(archivo.name, encoding='utf-8') as f:
+                resultados = json.load(f)
+            call_command('benchmark_shein', repeticiones=2, comparar=archivo.name, tolerancia=1000, stdout=salida)
+
+        self.assertIn('catalogo_productos', resultados)
+        self.assertIn('detalle_producto', resultados)
+        self.assertEqual(resultados['ver_pedidos']['estado'], 200)
+        # La exportación consulta mientras genera el cuerpo: se mide recorriéndolo
+        self.assertGreater(resultados['exportar_pedidos']['consultas'], 0)
+
+
+# =================================================================================
+# ========== INSTRUMENTACIÓN ==========
+
+class InstrumentacionMiddlewareTests(TestCase):
+
+    def setUp(self):
+        middleware.reiniciar_metricas()
+
+    def test_registra_consultas_y_repetidas(self):
+        productos = [crear_producto(nombre=f'Producto {i}') for i in range(3)]
+
+        def vista_con_n_mas_1(request):
+            for producto in productos:
+                Producto.objects.get(pk=producto.pk)
+            Usuario.objects.count()
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/prueba/')
+        with self.assertLogs('app_Shein.rendimiento', level='INFO') as logs:
+            middleware.InstrumentacionMiddleware(vista_con_n_mas_1)(request)
+
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logs.records[0].levelname, 'WARNING')
+        self.assertEqual(registro['consultas'], 4)
+        self.assertEqual([r['veces'] for r in registro['repetidas']], [3])
+
+        metricas = middleware.metricas()['/prueba/']
+        self.assertEqual(metricas['peticiones'], 1)
+        self.assertEqual(metricas['consultas_total'], 4)
+        self.assertEqual(metricas['peticiones_con_repetidas'], 1)
+
+    def test_endpoint_agrega_por_nombre_de_vista(self):
+        cache.clear()
+        with self.assertLogs('app_Shein.rendimiento', level='INFO'):
+            self.client.get(reverse('catalogo_productos'))
+            self.client.get(reverse('catalogo_productos'))
+        datos = self.client.get(reverse('metricas_rendimiento')).json()
+        self.assertEqual(datos['catalogo_productos']['peticiones'], 2)
+        self.assertIn('sql_ms_promedio', datos['catalogo_productos'])
+
+
+# =================================================================================
+# ========== DERIVADOS DE IMÁGENES ==========
+
+def imagen_subida(nombre='foto.png', ancho=1000, alto=500, color=(200, 30, 90)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (ancho, alto), color).save(buffer, format='PNG')
+    return SimpleUploadedFile(nombre, buffer.getvalue(), content_type='image/png')
+
+
+class ImagenesProductoTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=self.media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        cache.clear()
+
+    def test_genera_derivados_con_nombre_por_hash(self):
+        producto = crear_producto(imagen=imagen_subida())
+        variantes = generar_derivados(producto)
+
+        producto.refresh_from_db()
+        self.assertRegex(producto.imagen.name, r'^productos/[0-9a-f]{20}\.png$')
+        extensiones = {extension for _, extension, _, _ in formatos_disponibles()}
+        self.assertEqual(set(variantes), extensiones)
+        self.assertEqual(set(variantes['jpg']), {'200', '400', '800'})
+        with Image.open(producto.imagen.storage.path(variantes['jpg']['400'])) as miniatura:
+            self.assertEqual(miniatura.size, (400, 200))
+        self.assertEqual(producto.imagen_variantes, variantes)
+
+    def test_misma_imagen_reutiliza_archivos_y_no_amplia(self):
+        primero = crear_producto(imagen=imagen_subida(ancho=300, alto=300))
+        segundo = crear_producto(imagen=imagen_subida(nombre='otra.png', ancho=300, alto=300))
+        variantes = generar_derivados(primero)
+        self.assertEqual(generar_derivados(segundo), variantes)
+        self.assertEqual(set(variantes['jpg']), {'200', '300'})
+        primero.refresh_from_db()
+        segundo.refresh_from_db()
+        self.assertEqual(primero.imagen.name, segundo.imagen.name)
+
+    def test_etiqueta_emite_srcset(self):
+        producto = crear_producto(imagen=imagen_subida())
+        plantilla = Template('{% load imagenes_producto %}{% imagen_producto producto sizes="300px" %}')
+
+        html = plantilla.render(Context({'producto': producto}))
+        self.assertNotIn('<picture>', html)
+        self.assertIn(producto.imagen.url, html)
+
+        generar_derivados(producto)
+        html = plantilla.render(Context({'producto': producto}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('-200.jpg 200w', html)
+        self.assertIn('sizes="300px"', html)
+
+    def test_catalogo_usa_derivados_tras_subida(self):
+        self.client.post(reverse('agregar_producto'), {
+            'nombre': 'Vestido', 'descripcion': 'Vestido floral', 'precio': '350.00', 'categoria': 'ropa',
+            'talla': 'M', 'color': 'Azul', 'stock': '5', 'disponible': 'on', 'imagen': imagen_subida(),
+        })
+        producto = Producto.objects.get(nombre='Vestido')
+        self.assertEqual(producto.estado_imagen, 'pendiente')
+        self.assertNotContains(self.client.get(reverse('catalogo_productos')), '<picture>')
+
+        call_command('run_shein_worker', procesos=0, una_vez=True, stdout=StringIO())
+        producto.refresh_from_db()
+        self.assertEqual(producto.estado_imagen, 'lista')
+        self.assertTrue(producto.imagen_variantes)
+        respuesta = self.client.get(reverse('catalogo_productos'))
+        self.assertContains(respuesta, '<picture>')
+        self.assertContains(respuesta, 'srcset=')
+
+
+# =================================================================================
+# ========== COLA DE TAREAS ==========
+
+class TareasFondoTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=self.media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+    def test_guardar_imagen_encola_una_sola_tarea(self):
+        producto = crear_producto(imagen=imagen_subida())
+        self.assertEqual(producto.estado_imagen, 'pendiente')
+        self.assertEqual(TareaFondo.objects.filter(tipo='procesar_imagen').count(), 1)
+
+        # Editar otros campos no vuelve a procesar la imagen
+        producto.stock = 3
+        producto.save()
+        self.assertEqual(TareaFondo.objects.count(), 1)
+
+        self.assertTrue(tareas.ejecutar_tarea(tareas.tomar_tareas(10)[0]))
+        producto.refresh_from_db()
+        self.assertEqual(producto.estado_imagen, 'lista')
+        # El guardado del worker (que renombra la imagen) tampoco encola otra tarea
+        self.assertEqual(TareaFondo.objects.get().estado, 'completada')
+        self.assertEqual(TareaFondo.objects.count(), 1)
+
+    def test_producto_sin_imagen_no_encola(self):
+        producto = crear_producto()
+        self.assertEqual(producto.estado_imagen, 'sin_imagen')
+        self.assertFalse(TareaFondo.objects.exists())
+
+    def test_reintenta_con_espera_y_luego_falla(self):
+        producto = crear_producto(imagen=SimpleUploadedFile('rota.jpg', b'no es una imagen'))
+        tarea = TareaFondo.objects.get()
+        tarea.max_intentos = 2
+        tarea.save()
+
+        self.assertFalse(tareas.ejecutar_tarea(tareas.tomar_tareas(10)[0]))
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('pendiente', 1))
+        self.assertGreater(tarea.disponible_desde, tarea.iniciada)
+        self.assertEqual(tareas.tomar_tareas(10), [])  # Aún en espera
+
+        TareaFondo.objects.update(disponible_desde=tarea.iniciada)
+        self.assertFalse(tareas.ejecutar_tarea(tareas.tomar_tareas(10)[0]))
+        tarea.refresh_from_db()
+        producto.refresh_from_db()
+        self.assertEqual(tarea.estado, 'fallida')
+        self.assertIn('Traceback', tarea.error)
+        self.assertEqual(producto.estado_imagen, 'error')
+
+    def test_recupera_tareas_abandonadas(self):
+        tarea = tareas.encolar('procesar_imagen', {'producto_id': 0})
+        tareas.tomar_tareas(10)
+        TareaFondo.objects.update(iniciada=tarea.disponible_desde - tareas.TIEMPO_MAXIMO * 2)
+        self.assertEqual(tareas.recuperar_abandonadas(), (1, 0))
+        self.assertEqual(tareas.tomar_tareas(10), [tarea.pk])
+
+    def test_tarea_que_tumba_al_worker_agota_sus_intentos(self):
+        producto = crear_producto(imagen=imagen_subida())
+        tarea = TareaFondo.objects.get()
+        tarea.max_intentos = 2
+        tarea.save()
+        for devueltas, fallidas in [(1, 0), (0, 1)]:
+            self.assertEqual(tareas.tomar_tareas(10), [tarea.pk])
+            TareaFondo.objects.update(iniciada=timezone.now() - tareas.TIEMPO_MAXIMO * 2)
+            self.assertEqual(tareas.recuperar_abandonadas(), (devueltas, fallidas))
+        tarea.refresh_from_db()
+        producto.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('fallida', 2))
+        self.assertEqual(producto.estado_imagen, 'error')
+        self.assertEqual(tareas.tomar_tareas(10), [])
+
+    def test_imagen_reemplazada_durante_el_proceso_no_se_pisa(self):
+        producto = crear_producto(imagen=imagen_subida())
+        leido = Producto.objects.get(pk=producto.pk)
+        # Otra subida llega mientras el worker trabaja con la instancia que leyó antes
+        producto.imagen = imagen_subida(nombre='nueva.png', color=(10, 200, 10))
+        producto.save()
+        nueva = producto.imagen.name
+
+        self.assertEqual(generar_derivados(leido), {})
+        producto.refresh_from_db()
+        self.assertEqual((producto.imagen.name, producto.estado_imagen), (nueva, 'pendiente'))
+        self.assertEqual(producto.imagen_variantes, {})
+        # La copia por hash que se descartó no queda huérfana en el disco
+        self.assertEqual(sorted(os.listdir(os.path.join(self.media, 'productos'))), sorted([
+            'derivadas', os.path.basename(leido.imagen.name), os.path.basename(nueva),
+        ]))
+
+        for tarea_id in tareas.tomar_tareas(10):
+            tareas.ejecutar_tarea(tarea_id)
+        producto.refresh_from_db()
+        self.assertEqual(producto.estado_imagen, 'lista')
+        self.assertNotEqual(producto.imagen.name, nueva)
+
+
+# =================================================================================
+# ========== EXPORTACIÓN DE PEDIDOS ==========
+
+class ExportacionPedidosTests(TestCase):
+
+    def setUp(self):
+        usuario = crear_usuario()
+        blusa = crear_producto(precio=Decimal('100.00'))
+        falda = crear_producto(nombre='Falda', precio=Decimal('50.00'))
+        metodo = MetodoPago.objects.create(nombre='Visa', tipo='tarjeta')
+        cupon = CuponDescuento.objects.create(codigo='DESC10', descuento_porcentaje=Decimal('10.00'))
+        self.con_cupon = crear_pedido(usuario, 'Calle 1', {blusa.pk: 2, falda.pk: 1}, metodo, cupon)
+        self.sencillo = crear_pedido(usuario, 'Calle 2', {falda.pk: 1})
+        self.sin_items = Pedido.objects.create(id_usuario=usuario, direccion='Calle 3')
+
+    def contenido(self, respuesta):
+        return b''.join(respuesta.streaming_content).decode()
+
+    def test_csv_una_fila_por_item(self):
+        respuesta = self.client.get(reverse('exportar_pedidos'))
+        self.assertTrue(respuesta.streaming)
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+
+        filas = list(csv.DictReader(io.StringIO(self.contenido(respuesta))))
+        self.assertEqual([int(fila['pedido_id']) for fila in filas], [self.con_cupon.pk] * 2 + [self.sencillo.pk, self.sin_items.pk])
+        primera = filas[0]
+        self.assertEqual((primera['metodo_pago'], primera['cupon'], primera['total']), ('Visa', 'DESC10', '225.00'))
+        self.assertEqual((primera['producto_nombre'], primera['cantidad'], primera['subtotal_item']), ('Blusa', '2', '200.00'))
+        self.assertEqual(filas[-1]['producto_id'], '')
+
+    def test_jsonl_anida_items_y_filtra(self):
+        respuesta = self.client.get(reverse('exportar_pedidos'), {'formato': 'jsonl', 'estado': 'pendiente'})
+        pedidos = [json.loads(linea) for linea in self.contenido(respuesta).splitlines()]
+        self.assertEqual(len(pedidos), 3)
+        self.assertEqual(len(pedidos[0]['items']), 2)
+        self.assertEqual(pedidos[0]['descuento'], '25.00')
+
+        respuesta = self.client.get(reverse('exportar_pedidos'), {'formato': 'jsonl', 'desde': '2000-01-01', 'hasta': '2000-12-31'})
+        self.assertEqual(self.contenido(respuesta), '')
+        self.assertEqual(self.client.get(reverse('exportar_pedidos'), {'desde': '31/12/2000'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('exportar_pedidos'), {'formato': 'xml'}).status_code, 400)
+
+    def test_comando_lee_por_lotes(self):
+        salida = StringIO()
+        # Una consulta de pedidos y una de items por cada lote de 2 pedidos
+        with self.assertNumQueries(3):
+            call_command('exportar_pedidos', formato='jsonl', lote=2, stdout=salida, stderr=StringIO())
+        self.assertEqual(len(salida.getvalue().splitlines()), 3)
+
+
+# =================================================================================
+# ========== IMPORTACIÓN DE PRODUCTOS ==========
+
+CSV_PRODUCTOS = """sku,nombre,descripcion,precio,categoria,talla,color,stock,disponible
+SKU-1,Blusa floral,Blusa de temporada,199.90,ropa,m,Rosa,10,si
+SKU-2,Bolsa,Bolsa de piel,450,accesorios,,Negro,5,
+SKU-3,Tenis,Tenis blancos,abc,zapatos,M,Blanco,3,si
+SKU-4,Cojín,Cojín bordado,120.00,jardin,,Beige,4,si
+SKU-5,Vestido,Vestido largo,350.00,ropa,XXL,Azul,2,no
+"""
+
+
+class ImportacionProductosTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def importar(self, contenido, **kwargs):
+        salida, errores = StringIO(), StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as archivo:
+            archivo.write(contenido)
+        self.addCleanup(os.remove, archivo.name)
+        call_command('importar_productos', archivo.name, stdout=salida, stderr=errores, **kwargs)
+        return salida.getvalue(), errores.getvalue()
+
+    def test_comando_valida_y_reporta_por_fila(self):
+        salida, errores = self.importar(CSV_PRODUCTOS, lote=2)
+
+        self.assertEqual(set(Producto.objects.values_list('sku', flat=True)), {'SKU-1', 'SKU-2'})
+        blusa = Producto.objects.get(sku='SKU-1')
+        self.assertEqual((blusa.precio, blusa.talla, blusa.disponible), (Decimal('199.90'), 'M', True))
+        self.assertIn('Línea 4: precio inválido', errores)
+        self.assertIn('Línea 5: categoría desconocida', errores)
+        self.assertIn('Línea 6: talla desconocida', errores)
+        self.assertIn('5 filas', salida)
+        self.assertIn('2 creados, 0 actualizados, 3 con error', salida)
+        self.assertIn('filas/s', salida)
+
+    def test_actualiza_por_sku_e_invalida_catalogo(self):
+        self.importar(CSV_PRODUCTOS)
+        self.assertContains(self.client.get(reverse('catalogo_productos')), 'Blusa floral')
+
+        salida, _ = self.importar(
+            'sku,nombre,descripcion,precio,categoria,talla,color,stock\n'
+            'SKU-1,Blusa lisa,Blusa básica,149.90,ropa,S,Blanco,0\n'
+            'SKU-9,Labial,Labial mate,89.00,belleza,,Rojo,30\n'
+        )
+        self.assertIn('1 creados, 1 actualizados, 0 con error', salida)
+        self.assertEqual(Producto.objects.count(), 3)
+        blusa = Producto.objects.get(sku='SKU-1')
+        self.assertEqual((blusa.nombre, blusa.precio, blusa.stock), ('Blusa lisa', Decimal('149.90'), 0))
+
+        respuesta = self.client.get(reverse('catalogo_productos'))
+        self.assertNotContains(respuesta, 'Blusa')
+        self.assertContains(respuesta, 'Labial')
+
+    def test_sku_repetido_usa_la_ultima_fila(self):
+        salida, errores = self.importar(
+            'sku,nombre,descripcion,precio,categoria,color,stock\n'
+            'SKU-1,Primera,Desc,10,ropa,Rojo,1\n'
+            'SKU-1,Segunda,Desc,20,ropa,Rojo,1\n'
+        )
+        self.assertEqual(Producto.objects.get().nombre, 'Segunda')
+        self.assertIn('Línea 2: SKU SKU-1 repetido en la línea 3', errores)
+
+    def test_vista_de_carga(self):
+        archivo = SimpleUploadedFile('productos.csv', CSV_PRODUCTOS.encode('utf-8-sig'), content_type='text/csv')
+        respuesta = self.client.post(reverse('importar_productos'), {'archivo': archivo})
+        self.assertContains(respuesta, '2 creados')
+        self.assertContains(respuesta, 'categoría desconocida')
+        self.assertEqual(Producto.objects.count(), 2)
+
+        respuesta = self.client.post(reverse('importar_productos'), {
+            'archivo': SimpleUploadedFile('malo.csv', b'nombre,precio\nBlusa,10\n'),
+        })
+        self.assertContains(respuesta, 'faltan columnas: sku')
+
+
+# =================================================================================
+# ========== BÚSQUEDA ==========
+
+class BusquedaFTS5Tests(TestCase):
+
+    def setUp(self):
+        self.vestido = crear_producto(nombre='Vestido Floral', descripcion='Vestido de algodón para verano', color='Azul')
+        self.blusa = crear_producto(nombre='Blusa Básica', descripcion='Combina con cualquier vestido', color='Blanco')
+        self.cafe = crear_producto(nombre='Taza Café', descripcion='Taza de cerámica', categoria='hogar', color='Café')
+
+    def buscar(self, texto):
+        return busqueda.backend().buscar(texto)
+
+    def test_ordena_por_relevancia_y_busca_por_prefijo(self):
+        self.assertEqual(self.buscar('vestido'), [self.vestido.pk, self.blusa.pk])
+        self.assertEqual(self.buscar('vest'), [self.vestido.pk, self.blusa.pk])
+        self.assertEqual(self.buscar('vestido azul'), [self.vestido.pk])
+        self.assertEqual(self.buscar('   '), [])
+        self.assertEqual(self.buscar('"vestido* AND'), [])  # La sintaxis de FTS5 no se interpreta
+
+    def test_ignora_acentos(self):
+        self.assertEqual(self.buscar('basica'), [self.blusa.pk])
+        self.assertEqual(self.buscar('CAFÉ'), [self.cafe.pk])
+        self.assertEqual(self.buscar('ceramica'), [self.cafe.pk])
+
+    def test_indice_sigue_a_los_cambios(self):
+        self.vestido.nombre = 'Falda Floral'
+        self.vestido.save()
+        self.assertEqual(self.buscar('falda'), [self.vestido.pk])
+        # Las escrituras que no pasan por save() también llegan al índice
+        Producto.objects.filter(pk=self.blusa.pk).update(descripcion='Ideal para la oficina')
+        self.assertEqual(self.buscar('vestido'), [self.vestido.pk])
+        self.cafe.delete()
+        self.assertEqual(self.buscar('taza'), [])
+
+    def test_solo_catalogo(self):
+        Producto.objects.filter(pk=self.vestido.pk).update(stock=0)
+        self.assertEqual(self.buscar('floral'), [])
+        self.assertEqual(busqueda.backend().buscar('floral', solo_catalogo=False), [self.vestido.pk])
+
+    def test_vista_de_busqueda(self):
+        respuesta = self.client.get(reverse('buscar_productos'), {'q': 'vestido'})
+        self.assertEqual([p.pk for p in respuesta.context['productos']], [self.vestido.pk, self.blusa.pk])
+        self.assertContains(respuesta, 'Vestido Floral')
+        self.assertContains(self.client.get(reverse('buscar_productos'), {'q': 'zzz'}), 'Sin resultados')
+
+
+@override_settings(SHEIN_BUSQUEDA_BACKEND='app_Shein.busqueda.BusquedaTerminos')
+class BusquedaTerminosTests(TestCase):
+
+    def setUp(self):
+        self.vestido = crear_producto(nombre='Vestido Floral', descripcion='Vestido de algodón para verano', color='Azul')
+        self.blusa = crear_producto(nombre='Blusa Básica', descripcion='Combina con cualquier vestido', color='Blanco')
+
+    def buscar(self, texto):
+        return busqueda.backend().buscar(texto)
+
+    def test_busca_con_el_indice_de_terminos(self):
+        self.assertEqual(self.buscar('vest'), [self.vestido.pk, self.blusa.pk])
+        self.assertEqual(self.buscar('basica blan'), [self.blusa.pk])
+        self.assertEqual(self.buscar('vestido rojo'), [])
+
+    def test_sincroniza_al_guardar_y_reconstruir(self):
+        self.blusa.nombre = 'Top Satinado'
+        self.blusa.save()
+        self.assertEqual(self.buscar('satinado'), [self.blusa.pk])
+        self.assertEqual(self.buscar('basica'), [])
+
+        Producto.objects.filter(pk=self.vestido.pk).update(nombre='Chamarra')
+        self.assertEqual(self.buscar('chamarra'), [])
+        call_command('reconstruir_indice_busqueda', stdout=StringIO())
+        self.assertEqual(self.buscar('chamarra'), [self.vestido.pk])
+
+
+# =================================================================================
+# ========== FACETAS ==========
+
+class FacetasCatalogoTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        usuario = crear_usuario()
+        self.blusa = crear_producto(nombre='Blusa', precio=Decimal('150.00'), talla='M', color='Rosa')
+        self.vestido = crear_producto(nombre='Vestido', precio=Decimal('450.00'), talla='S', color='Rosa')
+        self.jeans = crear_producto(nombre='Jeans', precio=Decimal('650.00'), talla='M', color='Azul')
+        self.bolsa = crear_producto(nombre='Bolsa', categoria='accesorios', precio=Decimal('1200.00'), talla=None, color='Negro')
+        crear_producto(nombre='Agotado', stock=0, color='Verde')
+        Resena.objects.create(producto=self.blusa, usuario=usuario, calificacion=5)
+        Resena.objects.create(producto=self.vestido, usuario=usuario, calificacion=3)
+
+    def facetas(self, **parametros):
+        respuesta = self.client.get(reverse('catalogo_productos'), parametros)
+        conteos = {
+            faceta['nombre']: {opcion['valor']: opcion['cantidad'] for opcion in faceta['opciones']}
+            for faceta in respuesta.context['facetas']
+        }
+        return respuesta, conteos
+
+    def test_conteos_sin_filtros(self):
+        _, conteos = self.facetas()
+        self.assertEqual(conteos['categoria'], {'ropa': 3, 'accesorios': 1})
+        self.assertEqual(conteos['talla'], {'M': 2, 'S': 1})
+        self.assertEqual(conteos['color'], {'Rosa': 2, 'Azul': 1, 'Negro': 1})
+        self.assertEqual(conteos['precio'], {'0-199': 1, '200-499': 1, '500-999': 1, '1000+': 1})
+        self.assertEqual(conteos['calificacion'], {'4': 1, '3': 2, '2': 2, '1': 2})
+
+    def test_filtros_combinados(self):
+        respuesta, conteos = self.facetas(color='Rosa', talla='M')
+        self.assertEqual([p.pk for p in respuesta.context['productos']], [self.blusa.pk])
+        # La faceta filtrada cuenta con los demás filtros, no consigo misma
+        self.assertEqual(conteos['color'], {'Rosa': 1, 'Azul': 1})
+        self.assertEqual(conteos['talla'], {'M': 1, 'S': 1})
+        self.assertEqual(conteos['categoria'], {'ropa': 1})
+
+        respuesta, _ = self.facetas(precio=['0-199', '500-999'], calificacion='4')
+        self.assertEqual([p.pk for p in respuesta.context['productos']], [self.blusa.pk])
+
+    def test_filtros_invalidos_se_ignoran(self):
+        respuesta, _ = self.facetas(categoria='ropa', talla='XXXL', precio='gratis', calificacion='9')
+        self.assertEqual(len(respuesta.context['productos']), 3)
+
+    def test_consultas_acotadas_y_cache(self):
+        with CaptureQueriesContext(connection) as ctx:
+            facetas.conteos_facetas(facetas.leer_filtros(QueryDict('color=Rosa&precio=0-199&precio=200-499')))
+        self.assertEqual(len(ctx.captured_queries), len(facetas.FACETAS))
+
+        for i in range(10):
+            crear_producto(nombre=f'Top {i}', color=f'Color {i}')
+        cache_catalogo.reiniciar_estadisticas()
+        self.facetas()
+        self.facetas()
+        self.assertEqual(cache_catalogo.estadisticas()['facetas'], {'aciertos': 1, 'fallos': 1, 'tasa_aciertos': 0.5})
+
+    def test_cambio_de_producto_invalida_conteos(self):
+        _, antes = self.facetas()
+        self.jeans.color = 'Rosa'
+        self.jeans.save()
+        _, despues = self.facetas()
+        self.assertEqual(antes['color']['Rosa'], 2)
+        self.assertEqual(despues['color']['Rosa'], 3)
+
+    def test_enlaces_alternan_el_filtro(self):
+        respuesta, _ = self.facetas(color='Rosa')
+        color = next(faceta for faceta in respuesta.context['facetas'] if faceta['nombre'] == 'color')
+        opciones = {opcion['valor']: opcion for opcion in color['opciones']}
+        self.assertTrue(opciones['Rosa']['activo'])
+        self.assertEqual(opciones['Rosa']['url'], '?')
+        self.assertEqual(opciones['Azul']['url'], '?color=Rosa&color=Azul')
+
+
+# =================================================================================
+# ========== NÚMERO DE CONSULTAS ==========
+
+class ConsultasPorVistaTests(TestCase):
+    """Cada listado y detalle hace el mismo número de consultas con 1 fila que con muchas."""
+
+    def setUp(self):
+        cache.clear()
+        self.metodo = MetodoPago.objects.create(nombre='Visa', tipo='tarjeta')
+        self.cupon = CuponDescuento.objects.create(codigo='DESC10', descuento_porcentaje=Decimal('10.00'))
+        self.agregar_datos(1)
+
+    def agregar_datos(self, cantidad):
+        """Agrega `cantidad` usuarios, productos, reseñas, cupones, métodos de pago y pedidos de varios items."""
+        inicio = Producto.objects.count()
+        for i in range(inicio, inicio + cantidad):
+            usuario = crear_usuario(nombre=f'Cliente {i}')
+            productos = [crear_producto(nombre=f'Blusa {i}'), crear_producto(nombre=f'Falda {i}', categoria='accesorios')]
+            for producto in productos:
+                Resena.objects.create(producto=producto, usuario=usuario, calificacion=4, comentario='Me gustó')
+            MetodoPago.objects.create(nombre=f'Tarjeta {i}', tipo='tarjeta')
+            CuponDescuento.objects.create(codigo=f'CUPON{i}', descuento_porcentaje=Decimal('5.00'))
+            self.pedido = crear_pedido(usuario, 'Calle 1', {p.pk: 1 for p in productos}, self.metodo, self.cupon)
+            self.producto = productos[0]
+
+    def urls(self):
+        return {
+            'ver_usuarios': reverse('ver_usuarios'),
+            'ver_productos': reverse('ver_productos'),
+            'catalogo_productos': reverse('catalogo_productos'),
+            'detalle_producto': reverse('detalle_producto', args=[self.producto.pk]),
+            'buscar_productos': reverse('buscar_productos') + '?q=blusa',
+            'ver_pedidos': reverse('ver_pedidos'),
+            'detalle_pedido': reverse('detalle_pedido', args=[self.pedido.pk]),
+            'ver_metodos_pago': reverse('ver_metodos_pago'),
+            'ver_cupones': reverse('ver_cupones'),
+            'ver_resenas': reverse('ver_resenas'),
+        }
+
+    # Consultas esperadas por vista; ninguna depende del número de filas
+    ESPERADAS = {
+        'ver_usuarios': 1,
+        'ver_productos': 1,
+        'catalogo_productos': 1 + len(facetas.FACETAS),
+        'detalle_producto': 2,  # producto con su resumen + reseñas con su usuario
+        'buscar_productos': 2,  # ids del índice + productos
+        'ver_pedidos': 1,
+        'detalle_pedido': 2,  # pedido con cliente, pago y cupón + items con su producto
+        'ver_metodos_pago': 1,
+        'ver_cupones': 1,
+        'ver_resenas': 1,
+    }
+
+    def comprobar_consultas(self):
+        for nombre, url in self.urls().items():
+            cache.clear()
+            with self.subTest(vista=nombre), self.assertNumQueries(self.ESPERADAS[nombre]):
+                respuesta = self.client.get(url)
+                self.assertEqual(respuesta.status_code, 200)
+
+    def test_consultas_con_una_fila(self):
+        self.comprobar_consultas()
+
+    def test_consultas_con_muchas_filas(self):
+        self.agregar_datos(15)
+        self.comprobar_consultas()
+
+    def test_detalle_pedido_muestra_items(self):
+        respuesta = self.client.get(reverse('detalle_pedido', args=[self.pedido.pk]))
+        self.assertContains(respuesta, 'Blusa 0')
+        self.assertContains(respuesta, 'Falda 0')
+        self.assertContains(respuesta, 'DESC10')
+        self.assertContains(respuesta, self.pedido.id_usuario.nombre)
+
+
+# =================================================================================
+# ========== CUPONES ==========
+
+class CuponesTests(TestCase):
+
+    def setUp(self):
+        cupones.limpiar()
+        self.usuario = crear_usuario()
+        self.blusa = crear_producto(precio=Decimal('100.01'), stock=5)
+        self.cupon = CuponDescuento.objects.create(codigo='VERANO', descuento_porcentaje=Decimal('33.33'))
+
+    def test_validacion_cacheada(self):
+        cupones.validar_cupon('VERANO')
+        with self.assertNumQueries(0):
+            self.assertEqual(cupones.validar_cupon(' VERANO ').pk, self.cupon.pk)
+        with self.assertRaisesMessage(cupones.CuponInvalido, 'no existe'):
+            cupones.validar_cupon('NADA')
+        # Los códigos inexistentes también se recuerdan
+        with self.assertNumQueries(0), self.assertRaises(cupones.CuponInvalido):
+            cupones.validar_cupon('NADA')
+
+    def test_rechaza_inactivo_y_expirado(self):
+        CuponDescuento.objects.create(codigo='VIEJO', descuento_porcentaje=10, fecha_expiracion=date(2000, 1, 1))
+        CuponDescuento.objects.create(codigo='PAUSA', descuento_porcentaje=10, activo=False)
+        with self.assertRaisesMessage(cupones.CuponInvalido, 'expiró el 01/01/2000'):
+            cupones.validar_cupon('VIEJO')
+        with self.assertRaisesMessage(cupones.CuponInvalido, 'no está activo'):
+            cupones.validar_cupon('PAUSA')
+
+    def test_editar_y_borrar_invalidan(self):
+        cupones.validar_cupon('VERANO')
+        self.cupon.descuento_porcentaje = Decimal('50.00')
+        self.cupon.save()
+        self.assertEqual(cupones.validar_cupon('VERANO').descuento_porcentaje, Decimal('50.00'))
+
+        self.cupon.codigo = 'OTONO'
+        self.cupon.save()
+        self.assertRaises(cupones.CuponInvalido, cupones.validar_cupon, 'VERANO')
+        cupones.validar_cupon('OTONO')
+
+        self.cupon.delete()
+        self.assertRaises(cupones.CuponInvalido, cupones.validar_cupon, 'OTONO')
+
+    def test_descuento_en_decimal(self):
+        pedido = crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 3}, cupon=cupones.validar_cupon('VERANO'))
+        # 300.03 * 33.33% = 100.0000 -> 100.00
+        self.assertEqual((pedido.subtotal, pedido.descuento, pedido.total), (Decimal('300.03'), Decimal('100.00'), Decimal('200.03')))
+        self.assertEqual(pedido.total_pedido(), pedido.total)
+
+    def test_limite_de_usos(self):
+        self.cupon.usos_maximos = 1
+        self.cupon.save()
+        cupon = cupones.validar_cupon('VERANO')
+        crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 1}, cupon=cupon)
+        # La instancia cacheada no conoce el uso: el límite lo aplica el UPDATE
+        with self.assertRaisesMessage(cupones.CuponInvalido, 'límite de usos'):
+            crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 1}, cupon=cupones.validar_cupon('VERANO'))
+        self.cupon.refresh_from_db()
+        self.assertEqual(self.cupon.usos, 1)
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(inventario.existencias([self.blusa.pk]), {self.blusa.pk: 4})
+
+    def test_pedido_fallido_no_consume_usos(self):
+        with self.assertRaises(StockInsuficiente):
+            crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 50}, cupon=cupones.validar_cupon('VERANO'))
+        self.cupon.refresh_from_db()
+        self.assertEqual(self.cupon.usos, 0)
+
+    def test_vista_muestra_el_error_del_cupon(self):
+        CuponDescuento.objects.filter(pk=self.cupon.pk).update(activo=False)
+        response = self.client.post(reverse('crear_pedido_directo', args=[self.blusa.id]), {
+            'usuario_id': self.usuario.id,
+            'direccion': 'Calle 1',
+            'cantidad': 1,
+            'cupon_codigo': 'VERANO',
+        })
+        self.assertContains(response, 'El cupón VERANO no está activo.')
+        self.assertFalse(Pedido.objects.exists())
+
+
+class CuponesConcurrentesTests(TransactionTestCase):
+
+    def test_limite_de_usos_con_checkouts_simultaneos(self):
+        cupones.limpiar()
+        usuario = crear_usuario()
+        producto = crear_producto(stock=100)
+        CuponDescuento.objects.create(codigo='FLASH', descuento_porcentaje=20, usos_maximos=5)
+        resultados = []
+
+        def comprar():
+            try:
+                while True:
+                    try:
+                        crear_pedido(usuario, 'Calle 1', {producto.pk: 1}, cupon=cupones.validar_cupon('FLASH'))
+                        resultados.append('ok')
+                        return
+                    except cupones.CuponInvalido:
+                        resultados.append('agotado')
+                        return
+                    except OperationalError:
+                        # SQLite en memoria no espera al bloqueo de otro hilo: reintentar
+                        time.sleep(0.01)
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=comprar) for _ in range(20)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(resultados.count('ok'), 5)
+        self.assertEqual(resultados.count('agotado'), 15)
+        self.assertEqual(CuponDescuento.objects.get(codigo='FLASH').usos, 5)
+        self.assertEqual(Pedido.objects.filter(cupon__codigo='FLASH').count(), 5)
+        cupones.limpiar()
+
+
+# =================================================================================
+# ========== API JSON ==========
+
+class ApiProductosTests(TestCase):
+
+    def setUp(self):
+        self.usuario = crear_usuario(nombre='Ana')
+        self.blusa = crear_producto(nombre='Blusa', sku='B-1')
+        self.falda = crear_producto(nombre='Falda', categoria='accesorios')
+        self.agotado = crear_producto(nombre='Agotado', stock=0)
+        Resena.objects.create(producto=self.blusa, usuario=self.usuario, calificacion=4, comentario='Linda')
+
+    def get(self, nombre, *args, **parametros):
+        encabezados = {clave: parametros.pop(clave) for clave in list(parametros) if clave.startswith('HTTP_')}
+        return self.client.get(reverse(nombre, args=args), parametros, **encabezados)
+
+    def test_listado_con_campos_y_cursor(self):
+        respuesta = self.get('api_productos', campos='id,nombre,calificacion_promedio', limite=2)
+        datos = respuesta.json()
+        self.assertEqual(datos['total'], 3)
+        self.assertEqual(datos['resultados'], [
+            {'id': self.agotado.pk, 'nombre': 'Agotado', 'calificacion_promedio': None},
+            {'id': self.falda.pk, 'nombre': 'Falda', 'calificacion_promedio': None},
+        ])
+        self.assertIsNone(datos['anterior'])
+
+        siguiente = self.client.get(datos['siguiente']).json()
+        self.assertEqual(siguiente['resultados'], [{'id': self.blusa.pk, 'nombre': 'Blusa', 'calificacion_promedio': 4.0}])
+        self.assertIsNone(siguiente['siguiente'])
+
+    def test_catalogo_filtra_como_la_pagina(self):
+        datos = self.get('api_catalogo', categoria='ropa').json()
+        self.assertEqual([producto['id'] for producto in datos['resultados']], [self.blusa.pk])
+        self.assertEqual(set(datos['resultados'][0]), set(api.CAMPOS_LISTADO))
+
+    def test_detalle_con_calificaciones(self):
+        datos = self.get('api_producto', self.blusa.pk).json()
+        self.assertEqual(datos['sku'], 'B-1')
+        self.assertEqual(datos['precio'], '199.90')
+        self.assertEqual((datos['calificacion_promedio'], datos['total_resenas']), (4.0, 1))
+        self.assertEqual(datos['distribucion'], {'5': 0, '4': 1, '3': 0, '2': 0, '1': 0})
+        self.assertEqual([(r['usuario'], r['comentario']) for r in datos['resenas']], [('Ana', 'Linda')])
+
+        with self.assertNumQueries(2):
+            datos = self.get('api_producto', self.blusa.pk, campos='nombre,precio').json()
+        self.assertEqual(datos, {'nombre': 'Blusa', 'precio': '199.90'})
+
+    def test_errores(self):
+        self.assertEqual(self.get('api_productos', campos='nombre,clave').status_code, 400)
+        self.assertEqual(self.get('api_productos', limite='500').status_code, 400)
+        self.assertEqual(self.get('api_producto', 999).status_code, 404)
+        self.assertEqual(self.client.post(reverse('api_productos')).status_code, 405)
+
+    def test_304_sin_serializar(self):
+        respuesta = self.get('api_catalogo')
+        self.assertIn('Last-Modified', respuesta)
+        self.assertFalse(respuesta['ETag'].startswith('W/'))
+
+        # Solo la consulta de la versión: ni productos ni serialización
+        with self.assertNumQueries(1):
+            condicional = self.get('api_catalogo', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(condicional.status_code, 304)
+        self.assertEqual(condicional.content, b'')
+        self.assertEqual(condicional['ETag'], respuesta['ETag'])
+
+        with self.assertNumQueries(1):
+            condicional = self.get('api_producto', self.blusa.pk, HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified'])
+        self.assertEqual(condicional.status_code, 304)
+
+        # Otra selección de campos es otra representación
+        self.assertNotEqual(self.get('api_catalogo', campos='id')['ETag'], respuesta['ETag'])
+
+    def test_etag_cambia_con_producto_stock_y_resenas(self):
+        def etag():
+            return self.get('api_producto', self.blusa.pk)['ETag']
+
+        etags = [etag()]
+        self.blusa.precio = Decimal('149.90')
+        self.blusa.save()
+        etags.append(etag())
+        crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 1})
+        etags.append(etag())
+        Resena.objects.create(producto=self.blusa, usuario=crear_usuario(), calificacion=2)
+        etags.append(etag())
+        Resena.objects.filter(producto=self.blusa).last().delete()
+        etags.append(etag())
+        self.assertEqual(len(set(etags)), len(etags))
+
+        listado = self.get('api_catalogo')['ETag']
+        self.falda.delete()
+        self.assertNotEqual(self.get('api_catalogo')['ETag'], listado)
+
+
+# =================================================================================
+# ========== VISTAS ASÍNCRONAS ==========
+
+class VistasAsincronasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        usuario = crear_usuario(nombre='Ana')
+        self.blusa = crear_producto(nombre='Blusa', color='Rosa')
+        self.falda = crear_producto(nombre='Falda', color='Azul')
+        Resena.objects.create(producto=self.blusa, usuario=usuario, calificacion=5, comentario='Excelente')
+        self.pedido = crear_pedido(usuario, 'Calle 1', {self.blusa.pk: 2, self.falda.pk: 1})
+
+    def comparar(self, sincrona, asincrona, *args, **parametros):
+        cache.clear()
+        esperado = self.client.get(reverse(sincrona, args=args), parametros)
+        cache.clear()
+        obtenido = self.client.get(reverse(asincrona, args=args), parametros)
+        self.assertEqual(obtenido.status_code, esperado.status_code)
+        return esperado, obtenido
+
+    def test_mismo_contexto_que_las_vistas_sincronas(self):
+        esperado, obtenido = self.comparar('catalogo_productos', 'catalogo_productos_async', color='Rosa')
+        self.assertEqual([p.pk for p in obtenido.context['productos']], [self.blusa.pk])
+        self.assertEqual(obtenido.context['facetas'], esperado.context['facetas'])
+
+        esperado, obtenido = self.comparar('detalle_producto', 'detalle_producto_async', self.blusa.pk)
+        self.assertEqual(obtenido.context['distribucion_calificaciones'], esperado.context['distribucion_calificaciones'])
+        self.assertEqual([r.comentario for r in obtenido.context['resenas']], ['Excelente'])
+
+        esperado, obtenido = self.comparar('detalle_pedido', 'detalle_pedido_async', self.pedido.pk)
+        self.assertEqual(obtenido.context['items'], list(esperado.context['items']))
+        self.assertContains(obtenido, 'Falda')
+
+    def test_no_existe(self):
+        self.assertEqual(self.client.get(reverse('detalle_producto_async', args=[999])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('detalle_pedido_async', args=[999])).status_code, 404)
+
+    def test_mismas_consultas_y_cache(self):
+        for nombre, args, consultas in [
+            ('catalogo_productos_async', [], 1 + len(facetas.FACETAS)),
+            ('detalle_producto_async', [self.blusa.pk], 2),
+            ('detalle_pedido_async', [self.pedido.pk], 2),
+        ]:
+            cache.clear()
+            with self.subTest(vista=nombre), self.assertNumQueries(consultas):
+                self.client.get(reverse(nombre, args=args))
+        # La página y las facetas quedan en la caché que comparte con la vista síncrona
+        cache.clear()
+        self.client.get(reverse('catalogo_productos_async'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('catalogo_productos'))
+
+    async def test_middleware_cuenta_consultas_bajo_asgi(self):
+        middleware.reiniciar_metricas()
+        with self.assertLogs('app_Shein.rendimiento', level='INFO'):
+            await self.async_client.get(reverse('detalle_producto_async', args=[self.blusa.pk]))
+            await self.async_client.get(reverse('ver_productos'))
+        metricas = middleware.metricas()
+        self.assertEqual(metricas['detalle_producto_async']['consultas_total'], 2)
+        self.assertGreater(metricas['ver_productos']['consultas_total'], 0)
+
+        # Peticiones concurrentes comparten el hilo del ORM, pero cada una cuenta solo sus consultas
+        middleware.reiniciar_metricas()
+        url = reverse('detalle_pedido_async', args=[self.pedido.pk])
+        with self.assertLogs('app_Shein.rendimiento', level='INFO') as logs:
+            await asyncio.gather(*(self.async_client.get(url) for _ in range(3)))
+        self.assertEqual([json.loads(r.getMessage())['consultas'] for r in logs.records], [2, 2, 2])
+
+    async def test_una_peticion_que_termina_no_quita_el_registro_de_otra(self):
+        # B empieza antes que A y termina primero, mientras A todavía no consultó
+        eventos = {nombre: asyncio.Event() for nombre in ('b_en_vista', 'a_en_vista', 'b_termina', 'a_consulta')}
+
+        async def vista(request):
+            if request.path == '/b/':
+                eventos['b_en_vista'].set()
+                await eventos['b_termina'].wait()
+            else:
+                eventos['a_en_vista'].set()
+                await eventos['a_consulta'].wait()
+                await Producto.objects.acount()
+            return HttpResponse()
+
+        instrumentacion = middleware.InstrumentacionMiddleware(vista)
+        fabrica = RequestFactory()
+        with self.assertLogs('app_Shein.rendimiento', level='INFO') as logs:
+            peticion_b = asyncio.ensure_future(instrumentacion(fabrica.get('/b/')))
+            await eventos['b_en_vista'].wait()
+            peticion_a = asyncio.ensure_future(instrumentacion(fabrica.get('/a/')))
+            await eventos['a_en_vista'].wait()
+            eventos['b_termina'].set()
+            await peticion_b
+            eventos['a_consulta'].set()
+            await peticion_a
+        self.assertEqual(consultas_por_vista(logs), {'/b/': 0, '/a/': 1})
+
+    async def test_cliente_asgi(self):
+        respuesta = await self.async_client.get(reverse('detalle_producto_async', args=[self.blusa.pk]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['producto'].pk, self.blusa.pk)
+
+
+class BenchmarkAsgiTests(TransactionTestCase):
+    # TransactionTestCase: el ORM asíncrono puede consultar desde otro hilo, que no vería datos sin confirmar
+
+    def test_comando_compara_wsgi_y_asgi(self):
+        cache.clear()
+        usuario = crear_usuario()
+        producto = crear_producto()
+        crear_pedido(usuario, 'Calle 1', {producto.pk: 1})
+        salida = StringIO()
+        call_command('benchmark_asgi', peticiones=3, concurrencia=2, stdout=salida)
+        lineas = salida.getvalue().splitlines()
+        self.assertEqual(len(lineas), 7)
+        self.assertEqual([linea.split()[1] for linea in lineas[1:]], ['wsgi', 'asgi'] * 3)
+        self.assertTrue(all(linea.split()[2] == '200' for linea in lineas[1:]))
+
+
+# =================================================================================
+# ========== RESÚMENES DIARIOS DE VENTAS ==========
+
+class VentasDiariasTests(TestCase):
+
+    def setUp(self):
+        cupones.limpiar()
+        self.usuario = crear_usuario()
+        self.blusa = crear_producto(precio=Decimal('100.00'))
+        self.bolsa = crear_producto(nombre='Bolsa', categoria='accesorios', precio=Decimal('50.00'))
+        self.tarjeta = MetodoPago.objects.create(nombre='Visa', tipo='tarjeta')
+        self.cupon = CuponDescuento.objects.create(codigo='VERANO', descuento_porcentaje=10)
+
+    def filas(self):
+        return (
+            sorted(VentaDiaria.objects.values_list('fecha', 'estado_pedido', 'metodo_pago', 'cupon', 'pedidos', 'subtotal', 'descuento', 'total')),
+            sorted(VentaDiariaCategoria.objects.values_list('fecha', 'estado_pedido', 'categoria', 'pedidos', 'unidades', 'importe')),
+        )
+
+    def test_crear_pedido_suma_al_dia(self):
+        hoy = timezone.localdate()
+        crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 2, self.bolsa.pk: 1}, self.tarjeta, self.cupon)
+        crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 1}, self.tarjeta, self.cupon)
+        crear_pedido(self.usuario, 'Calle 1', {self.bolsa.pk: 1})
+
+        ventas_dia, categorias = self.filas()
+        self.assertEqual(ventas_dia, [
+            (hoy, 'pendiente', '', '', 1, Decimal('50.00'), Decimal('0.00'), Decimal('50.00')),
+            (hoy, 'pendiente', 'Visa', 'VERANO', 2, Decimal('350.00'), Decimal('35.00'), Decimal('315.00')),
+        ])
+        self.assertEqual(categorias, [
+            (hoy, 'pendiente', 'accesorios', 2, 2, Decimal('100.00')),
+            (hoy, 'pendiente', 'ropa', 2, 3, Decimal('300.00')),
+        ])
+
+    def test_renombrar_o_borrar_metodo_y_cupon_no_desfasa_las_filas(self):
+        primero = crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 1}, self.tarjeta, self.cupon)
+        segundo = crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 1}, self.tarjeta, self.cupon)
+        tercero = crear_pedido(self.usuario, 'Calle 1', {self.bolsa.pk: 1}, self.tarjeta, self.cupon)
+
+        self.tarjeta.nombre = 'Visa Oro'
+        self.tarjeta.save()
+        self.cupon.codigo = 'OTONO'
+        self.cupon.save()
+        cambiar_estado([primero.pk], 'cancelado')
+        cambiar_estado([segundo.pk], 'confirmado')
+        # Al borrarlos, el pedido queda sin método ni cupón (SET_NULL) pero conserva sus etiquetas
+        self.tarjeta.delete()
+        self.cupon.delete()
+        cambiar_estado([tercero.pk], 'confirmado')
+
+        self.assertEqual(
+            Pedido.objects.values_list('metodo_pago_nombre', 'cupon_codigo').distinct().get(), ('Visa', 'VERANO'),
+        )
+        self.assertEqual(VentaDiaria.objects.filter(estado_pedido='pendiente').count(), 0)
+        self.assertEqual(
+            sorted(VentaDiaria.objects.values_list('estado_pedido', 'metodo_pago', 'cupon', 'pedidos')),
+            [('cancelado', 'Visa', 'VERANO', 1), ('confirmado', 'Visa', 'VERANO', 2)],
+        )
+        incrementales = self.filas()
+        ventas.reconstruir_ventas()
+        self.assertEqual(self.filas(), incrementales)
+
+    def test_cambio_de_estado_y_borrado_mueven_las_cifras(self):
+        pedido = crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 1, self.bolsa.pk: 1})
+        crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 1})
+
+        self.client.post(reverse('actualizar_estado_pedido', args=[pedido.pk]), {'estado_pedido': 'cancelado'})
+        self.assertEqual(
+            dict(VentaDiaria.objects.values_list('estado_pedido', 'pedidos')), {'pendiente': 1, 'cancelado': 1},
+        )
+        self.assertEqual(
+            sorted(VentaDiariaCategoria.objects.values_list('estado_pedido', 'categoria', 'pedidos')),
+            [('cancelado', 'accesorios', 1), ('cancelado', 'ropa', 1), ('pendiente', 'ropa', 1)],
+        )
+
+        # Las filas que se quedan sin pedidos desaparecen
+        pedido.delete()
+        self.assertEqual(list(VentaDiaria.objects.values_list('estado_pedido', 'pedidos')), [('pendiente', 1)])
+        self.assertEqual(list(VentaDiariaCategoria.objects.values_list('estado_pedido', 'categoria')), [('pendiente', 'ropa')])
+
+    def test_reconstruir_coincide_con_lo_incremental(self):
+        pedidos = [
+            crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 2, self.bolsa.pk: 1}, self.tarjeta, self.cupon),
+            crear_pedido(self.usuario, 'Calle 1', {self.bolsa.pk: 3}, self.tarjeta),
+            crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 1}),
+        ]
+        pedidos[1].estado_pedido = 'enviado'
+        pedidos[1].save()
+        incremental = self.filas()
+
+        VentaDiaria.objects.update(pedidos=99)
+        salida = StringIO()
+        call_command('reconstruir_ventas_diarias', stdout=salida)
+        self.assertIn('6 filas', salida.getvalue())
+        self.assertEqual(self.filas(), incremental)
+
+        # Con --desde solo se tocan los días desde esa fecha
+        VentaDiaria.objects.create(fecha=date(2000, 1, 1), estado_pedido='entregado', pedidos=1)
+        call_command('reconstruir_ventas_diarias', desde=timezone.localdate().isoformat(), stdout=StringIO())
+        self.assertTrue(VentaDiaria.objects.filter(fecha=date(2000, 1, 1)).exists())
+        self.assertEqual(VentaDiaria.objects.filter(fecha=timezone.localdate()).count(), 3)
+
+    def test_panel_solo_lee_los_resumenes(self):
+        crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 2, self.bolsa.pk: 1}, self.tarjeta, self.cupon)
+        cancelado = crear_pedido(self.usuario, 'Calle 1', {self.bolsa.pk: 1})
+        cancelado.estado_pedido = 'cancelado'
+        cancelado.save()
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('panel_ventas'))
+        self.assertEqual(len(consultas), 7)
+        for consulta in consultas:
+            self.assertNotIn('"app_Shein_pedido"', consulta['sql'])
+            self.assertNotIn('"app_Shein_itempedido"', consulta['sql'])
+
+        # Los cancelados cuentan por estado, no como venta
+        self.assertEqual(response.context['totales']['pedidos'], 1)
+        self.assertEqual(response.context['totales']['total'], Decimal('225.00'))
+        self.assertEqual(
+            [(fila['nombre'], fila['pedidos']) for fila in response.context['por_estado']],
+            [('Cancelado', 1), ('Pendiente', 1)],
+        )
+        self.assertEqual(
+            [(fila['nombre'], fila['importe']) for fila in response.context['por_categoria']],
+            [('Ropa', Decimal('200.00')), ('Accesorios', Decimal('50.00'))],
+        )
+        self.assertEqual([fila['cupon'] for fila in response.context['por_cupon']], ['VERANO'])
+        self.assertContains(response, 'Visa')
+
+    def test_panel_filtra_por_fechas(self):
+        crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 1})
+        response = self.client.get(reverse('panel_ventas'), {'desde': '2000-01-01', 'hasta': '2000-01-31'})
+        self.assertEqual(response.context['totales']['pedidos'], 0)
+        self.assertContains(response, 'No hay ventas en este periodo.')
+
+        self.assertEqual(self.client.get(reverse('panel_ventas'), {'desde': 'ayer'}).status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse('panel_ventas'), {'desde': '2000-02-01', 'hasta': '2000-01-01'}).status_code, 400,
+        )
+
+
+# =================================================================================
+# ========== CAMBIO DE ESTADO MASIVO ==========
+
+class CambioEstadoPedidosTests(TestCase):
+
+    def setUp(self):
+        cupones.limpiar()
+        cache.clear()
+        self.usuario = crear_usuario()
+        self.blusa = crear_producto(stock=100)
+        self.bolsa = crear_producto(nombre='Bolsa', categoria='accesorios', stock=50)
+        self.cupon = CuponDescuento.objects.create(codigo='VERANO', descuento_porcentaje=10, usos_maximos=5)
+
+    def pedido(self, estado='pendiente', cupon=None):
+        pedido = crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 2, self.bolsa.pk: 1}, cupon=cupon)
+        if estado != 'pendiente':
+            pedido.estado_pedido = estado
+            pedido.save()
+        return pedido
+
+    def test_aplica_solo_transiciones_validas(self):
+        uno, dos, entregado = self.pedido(), self.pedido(), self.pedido('entregado')
+        confirmado = self.pedido('confirmado')
+
+        actualizados, rechazados = cambiar_estado([uno.pk, dos.pk, entregado.pk, confirmado.pk, 999], 'confirmado')
+        self.assertEqual(actualizados, [uno.pk, dos.pk])
+        self.assertEqual(rechazados, {
+            999: 'No existe el pedido 999.',
+            entregado.pk: 'Un pedido entregado no puede pasar a confirmado.',
+            confirmado.pk: 'El pedido ya está confirmado.',
+        })
+        self.assertEqual(
+            dict(Pedido.objects.values_list('pk', 'estado_pedido')),
+            {uno.pk: 'confirmado', dos.pk: 'confirmado', entregado.pk: 'entregado', confirmado.pk: 'confirmado'},
+        )
+        with self.assertRaisesMessage(ValueError, 'Estado desconocido: perdido'):
+            cambiar_estado([uno.pk], 'perdido')
+
+    def test_un_solo_update_sin_importar_cuantos_pedidos(self):
+        pocos = [self.pedido('confirmado') for _ in range(2)]
+        muchos = [self.pedido('confirmado') for _ in range(30)]
+
+        with CaptureQueriesContext(connection) as con_pocos:
+            cambiar_estado([pedido.pk for pedido in pocos], 'enviado')
+        with CaptureQueriesContext(connection) as con_muchos:
+            actualizados, _ = cambiar_estado(Pedido.objects.filter(estado_pedido='confirmado'), 'enviado')
+
+        self.assertEqual(len(actualizados), 30)
+        self.assertEqual(len(con_pocos), len(con_muchos))
+        updates = [q['sql'] for q in con_muchos if q['sql'].startswith('UPDATE "app_Shein_pedido"')]
+        self.assertEqual(len(updates), 1)
+        # Los resúmenes de ventas siguen a los pedidos aunque el UPDATE no dispare señales
+        self.assertEqual(dict(VentaDiaria.objects.values_list('estado_pedido', 'pedidos')), {'enviado': 32})
+        self.assertEqual(
+            dict(VentaDiariaCategoria.objects.values_list('categoria', 'unidades')), {'ropa': 64, 'accesorios': 32},
+        )
+
+    def test_cancelar_devuelve_stock_y_usos_del_cupon(self):
+        pedido = self.pedido(cupon=cupones.validar_cupon('VERANO'))
+        enviado = self.pedido('enviado')
+        self.assertEqual(inventario.existencias([self.blusa.pk]), {self.blusa.pk: 96})
+        self.assertEqual(CuponDescuento.objects.get(pk=self.cupon.pk).usos, 1)
+
+        actualizados, rechazados = cambiar_estado([pedido.pk, enviado.pk], 'cancelado')
+        self.assertEqual(actualizados, [pedido.pk])
+        self.assertEqual(rechazados, {enviado.pk: 'Un pedido enviado no puede pasar a cancelado.'})
+        self.assertEqual(inventario.existencias([self.blusa.pk, self.bolsa.pk]), {self.blusa.pk: 98, self.bolsa.pk: 49})
+        self.assertEqual(CuponDescuento.objects.get(pk=self.cupon.pk).usos, 0)
+        self.assertEqual(
+            sorted(VentaDiaria.objects.values_list('estado_pedido', 'cupon', 'pedidos')),
+            [('cancelado', 'VERANO', 1), ('enviado', '', 1)],
+        )
+
+    def test_si_algo_falla_no_cambia_nada(self):
+        pedido = self.pedido()
+        with mock.patch('app_Shein.pedidos.liberar_stock', side_effect=RuntimeError('falla')):
+            with self.assertRaises(RuntimeError):
+                cambiar_estado([pedido.pk], 'cancelado')
+        self.assertEqual(Pedido.objects.get(pk=pedido.pk).estado_pedido, 'pendiente')
+        self.assertEqual(list(VentaDiaria.objects.values_list('estado_pedido', flat=True)), ['pendiente'])
+
+    def test_vista_masiva(self):
+        uno, dos, entregado = self.pedido('confirmado'), self.pedido('confirmado'), self.pedido('entregado')
+        url = reverse('cambiar_estado_pedidos')
+
+        respuesta = self.client.post(url, {'estado': 'enviado', 'ids': f'{uno.pk},{entregado.pk}'})
+        self.assertEqual(respuesta.json(), {
+            'estado': 'enviado',
+            'actualizados': [uno.pk],
+            'rechazados': {str(entregado.pk): 'Un pedido entregado no puede pasar a enviado.'},
+        })
+        respuesta = self.client.post(url, {'estado': 'enviado', 'estado_actual': 'confirmado'})
+        self.assertEqual(respuesta.json()['actualizados'], [dos.pk])
+
+        self.assertEqual(self.client.post(url, {'estado': 'enviado'}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'estado': 'perdido', 'ids': uno.pk}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'estado': 'enviado', 'ids': 'uno'}).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+    def test_vista_individual_valida_la_transicion(self):
+        entregado = self.pedido('entregado')
+        url = reverse('actualizar_estado_pedido', args=[entregado.pk])
+        self.assertContains(self.client.get(url), 'ya no puede cambiar de estado')
+        respuesta = self.client.post(url, {'estado_pedido': 'pendiente'})
+        self.assertContains(respuesta, 'Un pedido entregado no puede pasar a pendiente.')
+
+        pendiente = self.pedido()
+        respuesta = self.client.get(reverse('actualizar_estado_pedido', args=[pendiente.pk]))
+        self.assertEqual(
+            [clave for clave, _ in respuesta.context['pedido'].estados_siguientes()], ['confirmado', 'cancelado'],
+        )
+        respuesta = self.client.post(reverse('actualizar_estado_pedido', args=[pendiente.pk]), {'estado_pedido': 'x'})
+        self.assertContains(respuesta, 'Estado desconocido: x')
+
+    def test_comando(self):
+        confirmados = [self.pedido('confirmado') for _ in range(3)]
+        self.pedido()
+        salida, errores = StringIO(), StringIO()
+        call_command('cambiar_estado_pedidos', 'enviado', estado_actual='confirmado', stdout=salida, stderr=errores)
+        self.assertIn('3 pedidos pasaron a enviado; 0 rechazados.', salida.getvalue())
+        self.assertEqual(Pedido.objects.filter(estado_pedido='enviado').count(), len(confirmados))
+
+        call_command('cambiar_estado_pedidos', 'cancelado', ids=[confirmados[0].pk], stdout=salida, stderr=errores)
+        self.assertIn('no puede pasar a cancelado', errores.getvalue())
+
+
+# =================================================================================
+# ========== HISTORIAL DE INVENTARIO ==========
+
+class InventarioMovimientosTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = crear_usuario()
+        self.blusa = crear_producto(stock=10)
+
+    def movimientos(self):
+        return list(MovimientoInventario.objects.order_by('pk').values_list('tipo', 'cantidad', 'pedido_id'))
+
+    def test_pedidos_y_cancelaciones_dejan_movimientos(self):
+        falda = crear_producto(nombre='Falda', stock=5)
+        pedido = crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 3, falda.pk: 1})
+        cambiar_estado([pedido.pk], 'cancelado')
+
+        self.assertEqual(self.movimientos(), [
+            ('reabastecimiento', 10, None),
+            ('reabastecimiento', 5, None),
+            ('venta', -3, pedido.pk),
+            ('venta', -1, pedido.pk),
+            ('cancelacion', 3, pedido.pk),
+            ('cancelacion', 1, pedido.pk),
+        ])
+        self.assertEqual(inventario.existencias([self.blusa.pk, falda.pk]), {self.blusa.pk: 10, falda.pk: 5})
+
+    def test_edicion_y_ajustes_manuales(self):
+        self.blusa.stock = 4
+        self.blusa.save()
+        # Un guardado parcial que no toca el stock no registra nada
+        self.blusa.save(update_fields=['nombre'])
+        inventario.ajustar_stock(self.blusa.pk, 6, 'reabastecimiento', 'Llegó el proveedor')
+        with self.assertRaisesMessage(ValueError, 'negativo'):
+            inventario.ajustar_stock(self.blusa.pk, -11)
+
+        self.assertEqual(Producto.objects.get(pk=self.blusa.pk).stock, 10)
+        self.assertEqual(
+            [(tipo, cantidad) for tipo, cantidad, _ in self.movimientos()],
+            [('reabastecimiento', 10), ('ajuste', -6), ('reabastecimiento', 6)],
+        )
+        self.assertEqual(inventario.existencias([self.blusa.pk]), {self.blusa.pk: 10})
+
+    def test_guardar_una_instancia_vieja_no_devuelve_unidades_vendidas(self):
+        vieja = Producto.objects.get(pk=self.blusa.pk)
+        crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 10})
+
+        vieja.nombre = 'Blusa lisa'
+        vieja.save()
+        self.assertEqual(inventario.existencias([self.blusa.pk]), {self.blusa.pk: 0})
+        self.assertEqual(Producto.objects.get(pk=self.blusa.pk).stock, 0)
+
+        # Cambiar el stock de una instancia vieja aplica solo la diferencia sobre el stock actual
+        vieja.stock += 2
+        vieja.save()
+        self.assertEqual(inventario.existencias([self.blusa.pk]), {self.blusa.pk: 2})
+        self.assertEqual(Producto.objects.get(pk=self.blusa.pk).stock, 2)
+        self.assertEqual([tipo for tipo, _, _ in self.movimientos()], ['reabastecimiento', 'venta', 'ajuste'])
+
+    def test_el_formulario_de_edicion_no_cambia_el_stock(self):
+        producto = Producto.objects.get(pk=self.blusa.pk)
+        respuesta = self.client.get(reverse('actualizar_producto', args=[producto.pk]))
+        self.assertNotContains(respuesta, 'name="stock"')
+        crear_pedido(self.usuario, 'Calle 1', {producto.pk: 10})
+
+        self.client.post(reverse('actualizar_producto', args=[producto.pk]), {
+            'nombre': 'Blusa lisa', 'descripcion': producto.descripcion, 'precio': '199.90',
+            'categoria': producto.categoria, 'talla': producto.talla or '', 'color': producto.color, 'stock': '10',
+        })
+        producto.refresh_from_db()
+        self.assertEqual((producto.nombre, producto.stock), ('Blusa lisa', 0))
+        self.assertEqual(inventario.existencias([producto.pk]), {producto.pk: 0})
+
+    def test_compactar_mueve_los_movimientos_al_corte(self):
+        crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 2})
+        self.assertFalse(CorteInventario.objects.exists())
+        # Con margen solo se compactan los movimientos viejos
+        self.assertEqual(inventario.compactar(), 0)
+        self.assertFalse(CorteInventario.objects.exists())
+
+        self.assertEqual(inventario.compactar(margen=timedelta(0)), 1)
+        corte = CorteInventario.objects.get(pk=self.blusa.pk)
+        self.assertEqual((corte.cantidad, corte.ultimo_movimiento), (8, MovimientoInventario.objects.latest('pk').pk))
+        self.assertEqual(inventario.compactar(margen=timedelta(0)), 0)
+        self.assertEqual(CorteInventario.objects.get(pk=self.blusa.pk).cantidad, 8)
+
+        # Los movimientos posteriores al corte se suman al leer, en una sola consulta
+        crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 1})
+        with self.assertNumQueries(1):
+            self.assertEqual(inventario.existencias([self.blusa.pk]), {self.blusa.pk: 7})
+        self.assertEqual(MovimientoInventario.objects.count(), 3)
+
+    def test_agotado_sale_del_catalogo_sin_esperar_a_compactar(self):
+        self.client.get(reverse('catalogo_productos'))
+        pedido = crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 10})
+        self.assertEqual(Producto.objects.get(pk=self.blusa.pk).stock, 0)
+        self.assertEqual(list(self.client.get(reverse('catalogo_productos')).context['productos']), [])
+        with self.assertRaises(StockInsuficiente):
+            crear_pedido(self.usuario, 'Calle 1', {self.blusa.pk: 1})
+
+        cambiar_estado([pedido.pk], 'cancelado')
+        self.assertEqual(self.client.get(reverse('catalogo_productos')).context['productos'][0].stock, 10)
+
+    def test_comando_compactar_corrige_el_catalogo(self):
+        # Una copia que se desvió del historial (un UPDATE a mano) la corrige la compactación
+        Producto.objects.filter(pk=self.blusa.pk).update(stock=99)
+        salida = StringIO()
+        call_command('compactar_inventario', margen=0, stdout=salida)
+        self.assertIn('1 cortes actualizados', salida.getvalue())
+        self.assertEqual(Producto.objects.get(pk=self.blusa.pk).stock, 10)
+
+        Producto.objects.filter(pk=self.blusa.pk).update(stock=99)
+        call_command('compactar_inventario', desde_stock=True, stdout=salida)
+        self.assertEqual(inventario.existencias([self.blusa.pk]), {self.blusa.pk: 99})
+
+    def test_importacion_registra_las_diferencias(self):
+        csv_productos = (
+            'sku,nombre,descripcion,precio,categoria,talla,color,stock\n'
+            'SKU-1,Blusa,Blusa básica,149.90,ropa,S,Blanco,{stock}\n'
+        )
+        importacion.importar_productos(io.StringIO(csv_productos.format(stock=20)))
+        importacion.importar_productos(io.StringIO(csv_productos.format(stock=15)))
+        producto = Producto.objects.get(sku='SKU-1')
+        self.assertEqual(
+            list(MovimientoInventario.objects.filter(producto=producto).values_list('tipo', 'cantidad')),
+            [('reabastecimiento', 20), ('ajuste', -5)],
+        )
+        self.assertEqual(inventario.existencias([producto.pk]), {producto.pk: 15})
+
+    def test_vista_de_inventario(self):
+        url = reverse('inventario_producto', args=[self.blusa.pk])
+        respuesta = self.client.post(url, {'tipo': 'ajuste', 'cantidad': '-3', 'nota': 'Merma'})
+        self.assertRedirects(respuesta, url)
+        respuesta = self.client.get(url)
+        self.assertContains(respuesta, 'Merma')
+        self.assertEqual(respuesta.context['existencias'], 7)
+        self.assertNotContains(respuesta, 'próxima compactación')
+
+        self.assertContains(self.client.post(url, {'tipo': 'venta', 'cantidad': '1'}), 'Elige reabastecimiento')
+        self.assertContains(self.client.post(url, {'tipo': 'ajuste', 'cantidad': '-50'}), 'negativo')
+        self.assertEqual(inventario.existencias([self.blusa.pk]), {self.blusa.pk: 7})
+
+
+class CompactacionConcurrenteTests(TransactionTestCase):
+
+    def test_compactaciones_simultaneas_no_suman_dos_veces(self):
+        usuario = crear_usuario()
+        productos = [crear_producto(nombre=f'Producto {i}', stock=100) for i in range(3)]
+        inventario.compactar(margen=timedelta(0))
+
+        def trabajar(indice):
+            try:
+                for vuelta in range(5):
+                    while True:
+                        try:
+                            if indice % 2:
+                                crear_pedido(usuario, 'Calle 1', {producto.id: 1 for producto in productos})
+                            else:
+                                inventario.compactar(margen=timedelta(0))
+                            break
+                        except OperationalError:
+                            # SQLite en memoria no espera al bloqueo de otro hilo: reintentar
+                            time.sleep(0.01)
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=trabajar, args=(i,)) for i in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        # 4 hilos compraron 5 veces una unidad de cada producto
+        ids = [producto.id for producto in productos]
+        self.assertEqual(inventario.existencias(ids), {producto_id: 80 for producto_id in ids})
+        inventario.compactar(margen=timedelta(0))
+        self.assertEqual(dict(CorteInventario.objects.values_list('producto_id', 'cantidad')), {producto_id: 80 for producto_id in ids})
+        self.assertEqual(set(Producto.objects.values_list('stock', flat=True)), {80})
+
+
+# =================================================================================
+# ========== CARRITO EN CACHÉ ==========
+
+class CarritoTests(TestCase):
+    JSON = {'HTTP_ACCEPT': 'application/json'}
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = crear_usuario()
+        self.blusa = crear_producto(precio=Decimal('100.00'), stock=5)
+        self.falda = crear_producto(nombre='Falda', precio=Decimal('50.00'))
+
+    def post_json(self, nombre, producto, **datos):
+        return self.client.post(reverse(nombre, args=[producto.pk]), datos, **self.JSON)
+
+    def test_agregar_actualizar_y_quitar_lineas(self):
+        respuesta = self.post_json('agregar_al_carrito', self.blusa, cantidad=2)
+        self.assertEqual(respuesta.json()['unidades'], 2)
+        self.post_json('agregar_al_carrito', self.blusa)
+        self.post_json('agregar_al_carrito', self.falda, cantidad=4)
+
+        datos = self.post_json('actualizar_carrito', self.falda, cantidad=1).json()
+        self.assertEqual(
+            [(linea['nombre'], linea['cantidad'], linea['subtotal']) for linea in datos['lineas']],
+            [('Blusa', 3, '300.00'), ('Falda', 1, '50.00')],
+        )
+        self.assertEqual(datos['total'], '350.00')
+
+        datos = self.post_json('quitar_del_carrito', self.blusa).json()
+        self.assertEqual([linea['producto_id'] for linea in datos['lineas']], [self.falda.pk])
+
+    def test_errores_no_cambian_el_carrito(self):
+        self.post_json('agregar_al_carrito', self.blusa, cantidad=4)
+        respuesta = self.post_json('agregar_al_carrito', self.blusa, cantidad=2)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['error'], 'Solo quedan 5 unidades de Blusa.')
+        self.assertEqual(self.post_json('actualizar_carrito', self.blusa, cantidad=0).status_code, 400)
+        self.assertEqual(self.post_json('actualizar_carrito', self.falda, cantidad=1).status_code, 400)
+        Producto.objects.filter(pk=self.falda.pk).update(disponible=False)
+        self.assertEqual(self.post_json('agregar_al_carrito', self.falda).status_code, 400)
+
+        self.assertEqual(self.client.get(reverse('crear_pedido_multiple')).context['carrito']['unidades'], 4)
+        # Los formularios vuelven a la página del carrito con el error
+        respuesta = self.client.post(reverse('actualizar_carrito', args=[self.blusa.pk]), {'cantidad': 'dos'})
+        self.assertContains(respuesta, 'número entero', status_code=400)
+
+    def test_leer_y_cambiar_el_carrito_no_recorre_productos(self):
+        crear_producto(nombre='Otro', stock=3)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post(reverse('agregar_al_carrito', args=[self.blusa.pk]), {'cantidad': 1})
+        sql_productos = [q['sql'] for q in consultas if 'app_Shein_producto' in q['sql']]
+        self.assertEqual(len(sql_productos), 1)
+        self.assertIn('WHERE', sql_productos[0])
+
+        for accion in (
+            lambda: self.client.get(reverse('crear_pedido_multiple')),
+            lambda: self.client.post(reverse('actualizar_carrito', args=[self.blusa.pk]), {'cantidad': 2}),
+            lambda: self.client.post(reverse('quitar_del_carrito', args=[self.falda.pk])),
+        ):
+            with CaptureQueriesContext(connection) as consultas:
+                accion()
+            self.assertFalse([q for q in consultas if 'app_Shein_producto' in q['sql']])
+
+    def test_confirmar_crea_el_pedido_y_vacia_el_carrito(self):
+        self.client.post(reverse('agregar_al_carrito', args=[self.blusa.pk]), {'cantidad': 2})
+        self.client.post(reverse('agregar_al_carrito', args=[self.falda.pk]), {'cantidad': 1})
+        # El precio se toma de la base al confirmar, no del carrito
+        Producto.objects.filter(pk=self.falda.pk).update(precio=Decimal('60.00'))
+
+        respuesta = self.client.post(reverse('crear_pedido_multiple'), {'usuario_id': self.usuario.pk, 'direccion': 'Calle 1'})
+        self.assertRedirects(respuesta, reverse('ver_pedidos'))
+        pedido = Pedido.objects.get()
+        self.assertEqual(pedido.total, Decimal('260.00'))
+        self.assertEqual(inventario.existencias([self.blusa.pk]), {self.blusa.pk: 3})
+        self.assertEqual(self.client.get(reverse('crear_pedido_multiple')).context['carrito']['lineas'], [])
+
+    def test_confirmar_sin_stock_conserva_el_carrito(self):
+        self.client.post(reverse('agregar_al_carrito', args=[self.blusa.pk]), {'cantidad': 5})
+        inventario.ajustar_stock(self.blusa.pk, -4)
+
+        respuesta = self.client.post(reverse('crear_pedido_multiple'), {'usuario_id': self.usuario.pk, 'direccion': 'Calle 1'})
+        self.assertContains(respuesta, 'Blusa')
+        self.assertFalse(Pedido.objects.exists())
+        self.assertEqual(respuesta.context['carrito']['unidades'], 5)
+
+        with self.assertRaisesMessage(ValueError, 'vacío'):
+            carrito.confirmar('carrito:sin-lineas', self.usuario, 'Calle 1')
+
+
+# =================================================================================
+# ========== AUTOCOMPLETADO ==========
+
+class AutocompletarTests(TestCase):
+
+    def setUp(self):
+        self.ana = crear_usuario(nombre='Ana López', email='ana@example.com')
+        self.mariana = crear_usuario(nombre='Mariana Ruiz', email='Anamar@example.com')
+        crear_usuario(nombre='Ana Inactiva', email='ana.inactiva@example.com', activo=False)
+        crear_usuario(nombre='Ana Vendedora', email='vendedora@example.com', tipo_usuario='vendedor')
+        self.producto = crear_producto(nombre='Vestido Floral', precio=Decimal('349.00'))
+
+    def clientes(self, q, **params):
+        respuesta = self.client.get(reverse('autocompletar_clientes'), {'q': q, **params})
+        return [(cliente['nombre'], cliente['email']) for cliente in respuesta.json()['resultados']]
+
+    def test_clientes_por_prefijo_de_nombre_o_email(self):
+        # Sin distinguir mayúsculas; primero los que coinciden por nombre y sin repetir
+        self.assertEqual(self.clientes('ANA'), [
+            ('Ana López', 'ana@example.com'),
+            ('Mariana Ruiz', 'Anamar@example.com'),
+        ])
+        self.assertEqual(self.clientes('mari'), [('Mariana Ruiz', 'Anamar@example.com')])
+        self.assertEqual(self.clientes('ana', limite=1), [('Ana López', 'ana@example.com')])
+        self.assertEqual(self.clientes('  '), [])
+        self.assertEqual(self.clientes('zz'), [])
+
+    def test_clientes_sin_distinguir_acentos(self):
+        crear_usuario(nombre='Álvaro Pérez', email='alvaro@example.com')
+        crear_usuario(nombre='Óscar Ruiz', email='OSCAR@example.com')
+        for q in ('Álv', 'álv', 'alv', 'ÁLVARO P', 'alvaro pé'):
+            with self.subTest(q=q):
+                self.assertEqual(self.clientes(q), [('Álvaro Pérez', 'alvaro@example.com')])
+        for q in ('Ó', 'ó', 'os', 'ÓSCAR'):
+            with self.subTest(q=q):
+                self.assertEqual(self.clientes(q), [('Óscar Ruiz', 'OSCAR@example.com')])
+        # Las claves siguen al nombre aunque se guarde solo ese campo
+        oscar = Usuario.objects.get(email='OSCAR@example.com')
+        oscar.nombre = 'Íñigo Ruiz'
+        oscar.save(update_fields=['nombre'])
+        self.assertEqual(self.clientes('iñi'), [('Íñigo Ruiz', 'OSCAR@example.com')])
+        self.assertEqual(self.clientes('óscar r'), [])
+
+    def test_limite_acotado(self):
+        self.assertEqual(autocompletar.leer_limite('500'), autocompletar.MAXIMO_RESULTADOS)
+        self.assertEqual(autocompletar.leer_limite('0'), 1)
+        self.assertEqual(autocompletar.leer_limite('diez'), autocompletar.LIMITE)
+
+    def test_productos_del_catalogo(self):
+        crear_producto(nombre='Vestido Agotado', stock=0)
+        respuesta = self.client.get(reverse('autocompletar_productos'), {'q': 'vest'})
+        self.assertEqual(respuesta.json()['resultados'], [
+            {'id': self.producto.pk, 'nombre': 'Vestido Floral', 'precio': '349.00', 'stock': 10},
+        ])
+
+    def test_consulta_de_clientes_usa_el_indice_en_orden(self):
+        for campo in ('nombre', 'email'):
+            with self.subTest(campo=campo):
+                plan = autocompletar.clientes_por_prefijo(campo, 'ana')[:10].explain()
+                self.assertIn(f'usuario_{campo}_prefijo_idx', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_formularios_no_cargan_la_lista_de_clientes(self):
+        cache.clear()
+        # El formulario de confirmación del carrito solo aparece con líneas
+        self.client.post(reverse('agregar_al_carrito', args=[self.producto.pk]))
+        for url in (
+            reverse('crear_pedido_directo', args=[self.producto.pk]),
+            reverse('crear_pedido_multiple'),
+            reverse('agregar_resena', args=[self.producto.pk]),
+        ):
+            with self.subTest(url=url), CaptureQueriesContext(connection) as consultas:
+                respuesta = self.client.get(url)
+            self.assertContains(respuesta, reverse('autocompletar_clientes'))
+            self.assertNotContains(respuesta, 'ana@example.com')
+            self.assertFalse([q for q in consultas if 'app_Shein_usuario' in q['sql']])
+
+    def test_error_conserva_el_cliente_elegido(self):
+        Resena.objects.create(producto=self.producto, usuario=self.ana, calificacion=4)
+        respuesta = self.client.post(reverse('agregar_resena', args=[self.producto.pk]), {
+            'usuario_id': self.ana.pk, 'calificacion': 5,
+        })
+        self.assertContains(respuesta, 'Ya existe una reseña')
+        self.assertContains(respuesta, f'value="{self.ana.pk}"')
+        self.assertContains(respuesta, 'ana@example.com')
@@ -5,6 +5,7 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('metricas/', views.metricas_rendimiento, name='metricas_rendimiento'),
     
     # URLs para Usuarios
     path('usuarios/agregar/', views.agregar_usuario, name='agregar_usuario'),
@@ -15,19 +16,41 @@ urlpatterns = [
     # URLs para Productos
     path('productos/agregar/', views.agregar_producto, name='agregar_producto'),
     path('productos/', views.ver_productos, name='ver_productos'),
+    path('productos/importar/', views.importar_productos, name='importar_productos'),
     path('productos/actualizar/<int:producto_id>/', views.actualizar_producto, name='actualizar_producto'),
     path('productos/borrar/<int:producto_id>/', views.borrar_producto, name='borrar_producto'),
+    path('productos/inventario/<int:producto_id>/', views.inventario_producto, name='inventario_producto'),
     
     # URLs para Catálogo
     path('catalogo/', views.catalogo_productos, name='catalogo_productos'),
     path('catalogo/producto/<int:producto_id>/', views.detalle_producto, name='detalle_producto'),
+    path('catalogo/buscar/', views.buscar_productos, name='buscar_productos'),
+    path('catalogo/cache/', views.estadisticas_cache, name='estadisticas_cache'),
+
+    # Versiones asíncronas de las vistas de lectura (para servir con ASGI)
+    path('async/catalogo/', views.catalogo_productos_async, name='catalogo_productos_async'),
+    path('async/catalogo/producto/<int:producto_id>/', views.detalle_producto_async, name='detalle_producto_async'),
+    path('async/pedidos/<int:pedido_id>/', views.detalle_pedido_async, name='detalle_pedido_async'),
+
+    # API JSON de solo lectura
+    path('api/productos/', views.api_productos, name='api_productos'),
+    path('api/productos/<int:producto_id>/', views.api_producto, name='api_producto'),
+    path('api/catalogo/', views.api_catalogo, name='api_catalogo'),
+    path('api/clientes/autocompletar/', views.autocompletar_clientes, name='autocompletar_clientes'),
+    path('api/productos/autocompletar/', views.autocompletar_productos, name='autocompletar_productos'),
     
     # URLs para Pedidos
     path('pedidos/crear-directo/<int:producto_id>/', views.crear_pedido_directo, name='crear_pedido_directo'),
     path('pedidos/crear-multiple/', views.crear_pedido_multiple, name='crear_pedido_multiple'),
+    path('pedidos/carrito/agregar/<int:producto_id>/', views.agregar_al_carrito, name='agregar_al_carrito'),
+    path('pedidos/carrito/actualizar/<int:producto_id>/', views.actualizar_carrito, name='actualizar_carrito'),
+    path('pedidos/carrito/quitar/<int:producto_id>/', views.quitar_del_carrito, name='quitar_del_carrito'),
     path('pedidos/', views.ver_pedidos, name='ver_pedidos'),
     path('pedidos/<int:pedido_id>/', views.detalle_pedido, name='detalle_pedido'),
+    path('pedidos/exportar/', views.exportar_pedidos, name='exportar_pedidos'),
+    path('pedidos/ventas/', views.panel_ventas, name='panel_ventas'),
     path('pedidos/actualizar-estado/<int:pedido_id>/', views.actualizar_estado_pedido, name='actualizar_estado_pedido'),
+    path('pedidos/cambiar-estado/', views.cambiar_estado_pedidos, name='cambiar_estado_pedidos'),
 
     # URLs para MetodoPago (NUEVOS)
     path('pagos/agregar/', views.agregar_metodo_pago, name='agregar_metodo_pago'),
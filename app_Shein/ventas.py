@@ -0,0 +1,270 @@
+"""
+Resúmenes diarios de ventas (VentaDiaria y VentaDiariaCategoria).
+
+Cada pedido suma sus cifras a la fila de su día, estado, método de pago y
+cupón, y sus items a las filas de su día, estado y categoría, con UPDATE de
+F() como ResumenCalificacion. Cuando un pedido cambia de estado sus cifras
+pasan de las filas del estado anterior a las del nuevo. El panel de ventas
+agrega solo estas filas (unas cuantas por día), no los pedidos ni los items,
+así que cuesta lo mismo con un mes o con años de historia.
+
+Las filas se agrupan por el nombre del método de pago y el código del cupón
+congelados en el pedido (Pedido.metodo_pago_nombre / cupon_codigo), no por
+los actuales: renombrar o borrar un método o un cupón no cambia la fila de
+sus pedidos, así que los cambios de estado posteriores restan de la fila
+correcta.
+
+Los pedidos que no pasan por `pedidos.crear_pedido()` (bulk_create de
+seed_shein) o que cambian con UPDATE directos no quedan registrados:
+`reconstruir_ventas()` recalcula los resúmenes desde los pedidos.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import SUBTOTAL_ITEMS, ItemPedido, Pedido, Producto, VentaDiaria, VentaDiariaCategoria
+
+# Los pedidos cancelados cuentan en el panel por estado, pero no como venta
+ESTADOS_SIN_VENTA = ('cancelado',)
+DIAS_PANEL = 30
+
+# Columnas de Pedido que forman la clave y las cifras de su fila en VentaDiaria
+CAMPOS_PEDIDO = ('fecha', 'estado_pedido', 'metodo_pago_nombre', 'cupon_codigo', 'subtotal', 'descuento', 'total')
+
+
+def datos_pedido(pedido_id):
+    """Cifras del pedido tal como están en la base ({campo: valor}) o None si no existe."""
+    return Pedido.objects.filter(pk=pedido_id).values(*CAMPOS_PEDIDO).first()
+
+
+def _categorias(pedido_id):
+    """{categoria: (unidades, importe)} de los items del pedido, en una consulta agrupada."""
+    filas = (
+        ItemPedido.objects.filter(pedido_id=pedido_id)
+        .values('producto__categoria')
+        .annotate(unidades=Sum('cantidad'), importe=SUBTOTAL_ITEMS)
+        .order_by()
+    )
+    return {fila['producto__categoria']: (fila['unidades'], fila['importe']) for fila in filas}
+
+
+def _sumar(modelo, clave, cifras, signo):
+    cambios = {campo: F(campo) + signo * valor for campo, valor in cifras.items()}
+    modelo.objects.filter(**clave).update(**cambios)
+
+
+def _aplicar(datos, categorias, signo):
+    fecha = timezone.localdate(datos['fecha'])
+    estado = datos['estado_pedido']
+    clave = {
+        'fecha': fecha,
+        'estado_pedido': estado,
+        'metodo_pago': datos['metodo_pago_nombre'],
+        'cupon': datos['cupon_codigo'],
+    }
+    if signo > 0:
+        # Crea las filas que falten sin leerlas antes (INSERT que ignora las existentes): el número de
+        # consultas no depende de si es el primer pedido del día
+        VentaDiaria.objects.bulk_create([VentaDiaria(**clave)], ignore_conflicts=True)
+        VentaDiariaCategoria.objects.bulk_create([
+            VentaDiariaCategoria(fecha=fecha, estado_pedido=estado, categoria=categoria) for categoria in categorias
+        ], ignore_conflicts=True)
+
+    _sumar(
+        VentaDiaria, clave,
+        {'pedidos': 1, 'subtotal': datos['subtotal'], 'descuento': datos['descuento'], 'total': datos['total']},
+        signo,
+    )
+    for categoria, (unidades, importe) in sorted(categorias.items()):
+        _sumar(
+            VentaDiariaCategoria, {'fecha': fecha, 'estado_pedido': estado, 'categoria': categoria},
+            {'pedidos': 1, 'unidades': unidades, 'importe': importe},
+            signo,
+        )
+
+    if signo < 0:
+        # Sin pedidos la fila ya no aporta nada al panel
+        VentaDiaria.objects.filter(fecha=fecha, estado_pedido=estado, pedidos=0).delete()
+        VentaDiariaCategoria.objects.filter(fecha=fecha, estado_pedido=estado, pedidos=0).delete()
+
+
+def registrar_pedido(pedido, items):
+    """
+    Suma un pedido recién creado. `items` son sus ItemPedido con el producto
+    cargado, así no hace falta volver a leerlos. Cuesta dos INSERT y un UPDATE
+    por fila afectada (la del día y una por categoría).
+    """
+    categorias = {}
+    for item in items:
+        unidades, importe = categorias.get(item.producto.categoria, (0, Decimal('0.00')))
+        categorias[item.producto.categoria] = (unidades + item.cantidad, importe + item.subtotal())
+    datos = {
+        'fecha': pedido.fecha,
+        'estado_pedido': pedido.estado_pedido,
+        'metodo_pago_nombre': pedido.metodo_pago_nombre,
+        'cupon_codigo': pedido.cupon_codigo,
+        'subtotal': pedido.subtotal,
+        'descuento': pedido.descuento,
+        'total': pedido.total,
+    }
+    _aplicar(datos, categorias, 1)
+
+
+def mover_pedido(pedido_id, anterior, nuevo):
+    """Pasa las cifras del pedido de `anterior` a `nuevo` (dos resultados de `datos_pedido()`)."""
+    if anterior == nuevo:
+        return
+    categorias = _categorias(pedido_id)
+    with transaction.atomic():
+        if anterior is not None:
+            _aplicar(anterior, categorias, -1)
+        if nuevo is not None:
+            _aplicar(nuevo, categorias, 1)
+
+
+def _mover_filas(modelo, filas, claves, cifras, estado):
+    if not filas:
+        return
+    modelo.objects.bulk_create([
+        modelo(**{campo: getattr(fila, campo) for campo in claves}, estado_pedido=estado) for fila in filas
+    ], ignore_conflicts=True)
+    for fila in filas:
+        clave = {campo: getattr(fila, campo) for campo in claves}
+        valores = {campo: getattr(fila, campo) for campo in cifras}
+        _sumar(modelo, {**clave, 'estado_pedido': fila.estado_pedido}, valores, -1)
+        _sumar(modelo, {**clave, 'estado_pedido': estado}, valores, 1)
+    modelo.objects.filter(fecha__in={fila.fecha for fila in filas}, pedidos=0).delete()
+
+
+def mover_pedidos(pedidos, estado):
+    """
+    Pasa a `estado` las cifras de los pedidos del queryset, que después cambian
+    con un UPDATE masivo (sin señales). Agrupa por fila de resumen: cuesta
+    lo mismo con 10 que con 10 000 pedidos del mismo día y combinación.
+    """
+    _mover_filas(
+        VentaDiaria, _filas_ventas(pedidos),
+        ('fecha', 'metodo_pago', 'cupon'), ('pedidos', 'subtotal', 'descuento', 'total'), estado,
+    )
+    _mover_filas(
+        VentaDiariaCategoria, _filas_categorias(ItemPedido.objects.filter(pedido__in=pedidos)),
+        ('fecha', 'categoria'), ('pedidos', 'unidades', 'importe'), estado,
+    )
+
+
+def descontar_pedido(pedido_id):
+    """Resta el pedido de los resúmenes; debe llamarse antes de borrar sus items."""
+    mover_pedido(pedido_id, datos_pedido(pedido_id), None)
+
+
+def _filas_ventas(pedidos):
+    filas = (
+        pedidos.annotate(dia=TruncDate('fecha'))
+        .values('dia', 'estado_pedido', 'metodo_pago_nombre', 'cupon_codigo')
+        .annotate(n=Count('pk'), suma_subtotal=Sum('subtotal'), suma_descuento=Sum('descuento'), suma_total=Sum('total'))
+        .order_by()
+    )
+    return [
+        VentaDiaria(
+            fecha=fila['dia'],
+            estado_pedido=fila['estado_pedido'],
+            metodo_pago=fila['metodo_pago_nombre'],
+            cupon=fila['cupon_codigo'],
+            pedidos=fila['n'],
+            subtotal=fila['suma_subtotal'],
+            descuento=fila['suma_descuento'],
+            total=fila['suma_total'],
+        )
+        for fila in filas
+    ]
+
+
+def _filas_categorias(items):
+    filas = (
+        items.annotate(dia=TruncDate('pedido__fecha'))
+        .values('dia', 'pedido__estado_pedido', 'producto__categoria')
+        .annotate(n=Count('pedido', distinct=True), suma_unidades=Sum('cantidad'), suma_importe=SUBTOTAL_ITEMS)
+        .order_by()
+    )
+    return [
+        VentaDiariaCategoria(
+            fecha=fila['dia'],
+            estado_pedido=fila['pedido__estado_pedido'],
+            categoria=fila['producto__categoria'],
+            pedidos=fila['n'],
+            unidades=fila['suma_unidades'],
+            importe=fila['suma_importe'],
+        )
+        for fila in filas
+    ]
+
+
+def reconstruir_ventas(desde=None, lote=1000):
+    """
+    Recalcula los resúmenes desde los pedidos con dos consultas agrupadas (todo,
+    o solo desde la fecha `desde`); devuelve cuántas filas quedaron.
+    """
+    pedidos, items = Pedido.objects.all(), ItemPedido.objects.all()
+    ventas, categorias = VentaDiaria.objects.all(), VentaDiariaCategoria.objects.all()
+    if desde is not None:
+        pedidos, items = pedidos.filter(fecha__date__gte=desde), items.filter(pedido__fecha__date__gte=desde)
+        ventas, categorias = ventas.filter(fecha__gte=desde), categorias.filter(fecha__gte=desde)
+
+    filas_ventas, filas_categorias = _filas_ventas(pedidos), _filas_categorias(items)
+    with transaction.atomic():
+        ventas.delete()
+        categorias.delete()
+        VentaDiaria.objects.bulk_create(filas_ventas, batch_size=lote)
+        VentaDiariaCategoria.objects.bulk_create(filas_categorias, batch_size=lote)
+    return len(filas_ventas) + len(filas_categorias)
+
+
+def rango_por_defecto():
+    hasta = timezone.localdate()
+    return hasta - timedelta(days=DIAS_PANEL - 1), hasta
+
+
+def panel(desde, hasta):
+    """Cifras del panel de ventas entre `desde` y `hasta` (inclusive), leídas solo de los resúmenes."""
+    ventas = VentaDiaria.objects.filter(fecha__range=(desde, hasta))
+    categorias = VentaDiariaCategoria.objects.filter(fecha__range=(desde, hasta))
+    vendidas = ventas.exclude(estado_pedido__in=ESTADOS_SIN_VENTA)
+    categorias_vendidas = categorias.exclude(estado_pedido__in=ESTADOS_SIN_VENTA)
+    cifras = {'pedidos': Sum('pedidos'), 'subtotal': Sum('subtotal'), 'descuento': Sum('descuento'), 'total': Sum('total')}
+    estados = dict(Pedido.ESTADO_CHOICES)
+    nombres_categoria = dict(Producto.CATEGORIA_CHOICES)
+
+    totales = vendidas.aggregate(**cifras)
+    por_estado = [
+        {**fila, 'nombre': estados.get(fila['estado_pedido'], fila['estado_pedido'])}
+        for fila in ventas.values('estado_pedido').annotate(**cifras).order_by('-pedidos', 'estado_pedido')
+    ]
+    por_categoria = [
+        {**fila, 'nombre': nombres_categoria.get(fila['categoria'], fila['categoria'])}
+        for fila in categorias_vendidas.values('categoria').annotate(
+            pedidos=Sum('pedidos'), unidades=Sum('unidades'), importe=Sum('importe'),
+        ).order_by('-importe', 'categoria')
+    ]
+    categoria_por_dia = [
+        {**fila, 'nombre': nombres_categoria.get(fila['categoria'], fila['categoria'])}
+        for fila in categorias_vendidas.values('fecha', 'categoria').annotate(
+            unidades=Sum('unidades'), importe=Sum('importe'),
+        ).order_by('fecha', 'categoria')
+    ]
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'totales': {campo: valor or 0 for campo, valor in totales.items()},
+        'por_dia': list(vendidas.values('fecha').annotate(**cifras).order_by('fecha')),
+        'por_estado': por_estado,
+        'por_metodo': list(vendidas.values('metodo_pago').annotate(**cifras).order_by('-total', 'metodo_pago')),
+        'por_cupon': list(
+            vendidas.exclude(cupon='').values('cupon').annotate(**cifras).order_by('-pedidos', 'cupon')
+        ),
+        'por_categoria': por_categoria,
+        'categoria_por_dia': categoria_por_dia,
+    }
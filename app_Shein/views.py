@@ -1,10 +1,23 @@
+import io
+from decimal import Decimal
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
-from django.db import models # Añade esta línea
-from django.db.models import Avg # Importar Avg para calcular el promedio de reseñas
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import F, FloatField, Prefetch # Para leer el promedio desde el resumen de calificaciones
+from django.db.models.functions import Cast, NullIf
+from django.views.decorators.http import require_POST, require_safe
 
 # Importar todos los modelos, incluyendo los nuevos
-from .models import Usuario, Producto, Pedido, ItemPedido, MetodoPago, CuponDescuento, Resena
+from .models import (
+    Usuario, Producto, Pedido, ItemPedido, MetodoPago, CuponDescuento, Resena, ResumenCalificacion, MovimientoInventario,
+)
+from . import (
+    api, autocompletar, busqueda, cache_catalogo, carrito, cupones, exportacion, facetas, importacion, inventario,
+    middleware, ventas,
+)
+from .paginacion import apaginar_por_cursor, paginar_por_cursor
+from .pedidos import cambiar_estado, crear_pedido
 
 def index(request):
     """Página de inicio/base."""
@@ -36,7 +49,8 @@ def agregar_usuario(request):
     return render(request, 'usuario/agregar_usuario.html')
 
 def ver_usuarios(request):
-    usuarios = Usuario.objects.all().order_by('-fecha_registro')
+    usuarios = Usuario.objects.only('nombre', 'email', 'telefono', 'tipo_usuario', 'activo', 'fecha_registro')
+    usuarios = paginar_por_cursor(request, usuarios, 'fecha_registro')
     return render(request, 'usuario/ver_usuarios.html', {'usuarios': usuarios})
 
 def actualizar_usuario(request, usuario_id):
@@ -78,7 +92,7 @@ def agregar_producto(request):
             stock = int(request.POST.get('stock'))
             disponible = request.POST.get('disponible') == 'on'
             
-            # Obtener el archivo de imagen de request.FILES
+            # Obtener el archivo de imagen de request.FILES (los derivados los genera run_shein_worker)
             imagen_subida = request.FILES.get('imagen') 
             
             producto = Producto.objects.create(
@@ -100,12 +114,35 @@ def agregar_producto(request):
     
     return render(request, 'producto/agregar_producto.html')
 
+def importar_productos(request):
+    """Carga masiva de productos desde un CSV; muestra el resumen y los errores por fila."""
+    contexto = {'columnas': 'sku,nombre,descripcion,precio,categoria,talla,color,stock,disponible'}
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            contexto['error'] = 'Selecciona un archivo CSV.'
+        else:
+            # Se decodifica al vuelo: el archivo no se carga completo en memoria
+            texto = io.TextIOWrapper(archivo.file, encoding='utf-8-sig', newline='')
+            try:
+                contexto['resultado'] = importacion.importar_productos(texto)
+            except UnicodeDecodeError:
+                contexto['error'] = 'El archivo debe estar codificado en UTF-8.'
+            finally:
+                texto.detach()
+    return render(request, 'producto/importar_productos.html', contexto)
+
 def ver_productos(request):
-    productos = Producto.objects.all().order_by('-fecha_agregado')
+    productos = Producto.objects.only(
+        'nombre', 'precio', 'categoria', 'talla', 'color', 'stock', 'disponible', 'estado_imagen', 'fecha_agregado',
+    )
+    productos = paginar_por_cursor(request, productos, 'fecha_agregado')
     return render(request, 'producto/ver_productos.html', {'productos': productos})
 
 def actualizar_producto(request, producto_id):
-    producto = get_object_or_404(Producto, id=producto_id)
+    # El stock no se edita aquí: solo cambia con movimientos de inventario (ventas, cancelaciones y los
+    # ajustes de inventario_producto)
+    producto = get_object_or_404(inventario.con_existencias(Producto.objects.all()), id=producto_id)
     
     if request.method == 'POST':
         try:
@@ -115,7 +152,6 @@ def actualizar_producto(request, producto_id):
             producto.categoria = request.POST.get('categoria')
             producto.talla = request.POST.get('talla')
             producto.color = request.POST.get('color')
-            producto.stock = int(request.POST.get('stock'))
             producto.disponible = request.POST.get('disponible') == 'on'
             
             # Manejar la actualización de la imagen
@@ -123,7 +159,9 @@ def actualizar_producto(request, producto_id):
                 # Esto reemplazará la imagen existente (y la anterior podría borrarse si se usa un almacenamiento adecuado)
                 producto.imagen = request.FILES['imagen']
             
-            producto.save()
+            # En una transacción para que la señal bloquee la fila mientras toma el stock actual
+            with transaction.atomic():
+                producto.save()
             return redirect('ver_productos')
         except Exception as e:
             return render(request, 'producto/actualizar_producto.html', {'producto': producto, 'error': str(e)})
@@ -139,52 +177,277 @@ def borrar_producto(request, producto_id):
     
     return render(request, 'producto/borrar_producto.html', {'producto': producto})
 
+def inventario_producto(request, producto_id):
+    """Existencias según el historial, movimientos del producto y ajustes manuales de stock."""
+    producto = get_object_or_404(
+        inventario.con_existencias(Producto.objects.only('nombre', 'categoria', 'stock')), id=producto_id,
+    )
+    error = None
+    if request.method == 'POST':
+        tipo = request.POST.get('tipo')
+        try:
+            if tipo not in ('reabastecimiento', 'ajuste'):
+                raise ValueError('Elige reabastecimiento o ajuste manual.')
+            cantidad = int(request.POST.get('cantidad', ''))
+            inventario.ajustar_stock(producto.pk, cantidad, tipo, request.POST.get('nota', '')[:200])
+            cache_catalogo.invalidar_producto(producto.pk, producto.categoria)
+            return redirect('inventario_producto', producto_id=producto.pk)
+        except ValueError as e:
+            error = str(e)
+
+    movimientos = MovimientoInventario.objects.filter(producto_id=producto.pk).only(
+        'cantidad', 'tipo', 'pedido_id', 'nota', 'fecha', 'producto_id',
+    )
+    return render(request, 'producto/inventario_producto.html', {
+        'producto': producto,
+        'existencias': producto.existencias,
+        'movimientos': paginar_por_cursor(request, movimientos, 'id'),
+        'tipos': [
+            (clave, nombre) for clave, nombre in MovimientoInventario.TIPO_CHOICES if clave in ('reabastecimiento', 'ajuste')
+        ],
+        'error': error,
+    })
+
 # =================================================================================
 # ========== VISTAS PARA CATÁLOGO Y PEDIDOS ==========
 
+def _catalogo_productos_consulta(filtros):
+    productos = facetas.aplicar_filtros(facetas.productos_catalogo(), filtros)
+    # Promedio y conteo leídos del resumen precalculado (un JOIN, sin agregar reseñas)
+    return productos.annotate(
+        calificacion_promedio=Cast('resumen_calificacion__suma', FloatField()) / NullIf('resumen_calificacion__total', 0),
+        total_resenas=F('resumen_calificacion__total'),
+    )
+
 def catalogo_productos(request):
-    productos = Producto.objects.filter(disponible=True, stock__gt=0).order_by('-fecha_agregado')
     categorias = Producto.CATEGORIA_CHOICES
-    categoria_seleccionada = request.GET.get('categoria', '')
-    
-    if categoria_seleccionada:
-        productos = productos.filter(categoria=categoria_seleccionada)
-    
-    # Calcular calificación promedio para cada producto y pasar el conteo de reseñas
-    productos_con_calificacion = []
-    for producto in productos:
-        # Usa .annotate() para obtener el promedio y el conteo de una vez (más eficiente si lo usaras en el QuerySet)
-        # Pero mantendremos tu lógica de agregación aquí para no reescribir demasiado.
-        resena_data = producto.resenas.aggregate(Avg('calificacion'), count=models.Count('id'))
-        promedio = resena_data['calificacion__avg']
-        
-        producto.calificacion_promedio = round(promedio, 1) if promedio else None
-        productos_con_calificacion.append(producto)
+    filtros = facetas.leer_filtros(request.GET)
+    # Con una sola categoría la página se cachea bajo la versión de esa categoría
+    seleccionadas = filtros.get('categoria', ())
+    categoria_seleccionada = seleccionadas[0] if len(seleccionadas) == 1 else ''
+
+    def consultar_catalogo():
+        return paginar_por_cursor(request, _catalogo_productos_consulta(filtros), 'fecha_agregado')
+
+    clave = cache_catalogo.clave_catalogo(categoria_seleccionada, request.GET.get('cursor'), facetas.firma(filtros))
+    productos = cache_catalogo.obtener_o_calcular('catalogo', clave, consultar_catalogo)
 
     return render(request, 'catalogo/catalogo.html', {
-        'productos': productos_con_calificacion,
+        'productos': productos,
         'categorias': categorias,
-        'categoria_seleccionada': categoria_seleccionada
+        'categoria_seleccionada': categoria_seleccionada,
+        'facetas': facetas.facetas_para_plantilla(request.GET, filtros),
+        'hay_filtros': bool(filtros),
+    })
+
+def buscar_productos(request):
+    """Búsqueda de texto en el catálogo, ordenada por relevancia."""
+    consulta = request.GET.get('q', '').strip()
+    try:
+        pagina = max(1, int(request.GET.get('pagina', 1)))
+    except ValueError:
+        pagina = 1
+    # Se pide uno de más para saber si hay página siguiente
+    productos = busqueda.buscar_productos(consulta, busqueda.LIMITE + 1, (pagina - 1) * busqueda.LIMITE)
+    for producto in productos:
+        resumen = getattr(producto, 'resumen_calificacion', None)
+        producto.calificacion_promedio = resumen.promedio if resumen else None
+        producto.total_resenas = resumen.total if resumen else 0
+
+    return render(request, 'catalogo/buscar.html', {
+        'consulta': consulta,
+        'productos': productos[:busqueda.LIMITE],
+        'pagina': pagina,
+        'hay_siguiente': len(productos) > busqueda.LIMITE,
     })
 
 def detalle_producto(request, producto_id):
-    producto = get_object_or_404(Producto, id=producto_id)
-    resenas = producto.resenas.all().order_by('-fecha_resena')
-    
-    resena_data = producto.resenas.aggregate(Avg('calificacion'), count=models.Count('id'))
-    promedio = resena_data['calificacion__avg']
-    total_resenas = resena_data['count'] # Nueva variable para el conteo
+    def consultar_detalle():
+        producto = get_object_or_404(
+            inventario.con_existencias(Producto.objects.select_related('resumen_calificacion')), id=producto_id,
+        )
+        resenas = list(
+            producto.resenas.select_related('usuario')
+            .only('calificacion', 'comentario', 'fecha_resena', 'producto_id', 'usuario__nombre')
+            .order_by('-fecha_resena')
+        )
 
-    calificacion_promedio = round(promedio, 1) if promedio else None
-    
-    context = {
-        'producto': producto,
-        'resenas': resenas,
-        'media_calificacion': calificacion_promedio, # Renombrado para coincidir con template sugerido
-        'total_resenas': total_resenas, # Nueva variable para el conteo de reseñas
-    }
+        try:
+            resumen = producto.resumen_calificacion
+        except ResumenCalificacion.DoesNotExist:
+            resumen = ResumenCalificacion(producto=producto)
+
+        return {
+            'producto': producto,
+            'resenas': resenas,
+            'media_calificacion': resumen.promedio,
+            'total_resenas': resumen.total,
+            'distribucion_calificaciones': resumen.distribucion(),
+        }
+
+    context = cache_catalogo.obtener_o_calcular(
+        'detalle', cache_catalogo.clave_detalle(producto_id), consultar_detalle
+    )
+    return render(request, 'catalogo/detalle_producto.html', context)
+
+# =================================================================================
+# ========== API JSON (solo lectura) ==========
+
+def _api_listado(request, productos):
+    try:
+        campos = api.leer_campos(request.GET, api.CAMPOS, api.CAMPOS_LISTADO)
+        limite = api.leer_limite(request.GET)
+    except api.ParametroInvalido as e:
+        return api.error(str(e))
+    ultima, total = api.version_listado(productos)
+
+    def generar():
+        # El cursor se arma con fecha_agregado aunque no se haya pedido ese campo
+        seleccion = api.seleccionar(productos, campos, api.CAMPOS, extra=['fecha_agregado'])
+        pagina = paginar_por_cursor(request, seleccion, 'fecha_agregado', limite)
+        return {
+            'total': total,
+            'resultados': [api.serializar(producto, campos, api.CAMPOS) for producto in pagina],
+            'siguiente': request.path + pagina.url_siguiente if pagina.url_siguiente else None,
+            'anterior': request.path + pagina.url_anterior if pagina.url_anterior else None,
+        }
+
+    return api.respuesta_condicional(request, api.calcular_etag(request, ultima, total), ultima, generar)
+
+@require_safe
+def api_productos(request):
+    """Todos los productos (también los agotados o no disponibles)."""
+    return _api_listado(request, Producto.objects.all())
+
+@require_safe
+def api_catalogo(request):
+    """Productos del catálogo, con los mismos filtros que la página del catálogo."""
+    filtros = facetas.leer_filtros(request.GET)
+    return _api_listado(request, facetas.aplicar_filtros(facetas.productos_catalogo(), filtros))
+
+@require_safe
+def api_producto(request, producto_id):
+    """Detalle de un producto con su resumen de calificaciones y sus reseñas más recientes."""
+    try:
+        campos = api.leer_campos(request.GET, api.CAMPOS_DETALLE)
+    except api.ParametroInvalido as e:
+        return api.error(str(e))
+    ultima = Producto.objects.filter(pk=producto_id).values_list('fecha_actualizacion', flat=True).first()
+    if ultima is None:
+        return api.error('El producto no existe.', estado=404)
+
+    def generar():
+        producto = api.seleccionar(Producto.objects.filter(pk=producto_id), campos, api.CAMPOS_DETALLE).get()
+        return api.serializar(producto, campos, api.CAMPOS_DETALLE)
+
+    return api.respuesta_condicional(request, api.calcular_etag(request, ultima), ultima, generar)
+
+@require_safe
+def autocompletar_clientes(request):
+    """Clientes activos cuyo nombre o email empieza con `q` (como mucho `limite`), para los formularios."""
+    limite = autocompletar.leer_limite(request.GET.get('limite'))
+    return JsonResponse(
+        {'resultados': autocompletar.buscar_clientes(request.GET.get('q'), limite)}, json_dumps_params={'ensure_ascii': False},
+    )
+
+@require_safe
+def autocompletar_productos(request):
+    """Productos del catálogo que coinciden con `q` (como mucho `limite`), para agregarlos al carrito."""
+    limite = autocompletar.leer_limite(request.GET.get('limite'))
+    return JsonResponse(
+        {'resultados': autocompletar.buscar_productos(request.GET.get('q'), limite)}, json_dumps_params={'ensure_ascii': False},
+    )
+
+# =================================================================================
+# ========== VISTAS ASÍNCRONAS (ASGI) ==========
+# Mismo resultado que las vistas síncronas equivalentes, con el ORM asíncrono. Las
+# consultas no se solapan entre sí (el ORM las ejecuta una tras otra en el hilo de
+# sync_to_async(thread_sensitive=True)), pero mientras esperan el event loop atiende
+# otras peticiones. Todo se materializa antes de render(): la plantilla no puede
+# consultar la base desde el event loop.
+
+async def catalogo_productos_async(request):
+    filtros = facetas.leer_filtros(request.GET)
+    seleccionadas = filtros.get('categoria', ())
+    categoria_seleccionada = seleccionadas[0] if len(seleccionadas) == 1 else ''
+
+    async def consultar_catalogo():
+        return await apaginar_por_cursor(request, _catalogo_productos_consulta(filtros), 'fecha_agregado')
+
+    clave = cache_catalogo.clave_catalogo(categoria_seleccionada, request.GET.get('cursor'), facetas.firma(filtros))
+    productos = await cache_catalogo.aobtener_o_calcular('catalogo', clave, consultar_catalogo)
+    opciones = await facetas.afacetas_para_plantilla(request.GET, filtros)
+    return render(request, 'catalogo/catalogo.html', {
+        'productos': productos,
+        'categorias': Producto.CATEGORIA_CHOICES,
+        'categoria_seleccionada': categoria_seleccionada,
+        'facetas': opciones,
+        'hay_filtros': bool(filtros),
+    })
+
+async def detalle_producto_async(request, producto_id):
+    async def consultar_detalle():
+        resenas = (
+            Resena.objects.filter(producto_id=producto_id).select_related('usuario')
+            .only('calificacion', 'comentario', 'fecha_resena', 'producto_id', 'usuario__nombre')
+            .order_by('-fecha_resena')
+        )
+
+        try:
+            producto = await inventario.con_existencias(
+                Producto.objects.select_related('resumen_calificacion')
+            ).aget(id=producto_id)
+        except Producto.DoesNotExist:
+            raise Http404('No existe el producto.')
+        resenas = [resena async for resena in resenas]
+
+        try:
+            resumen = producto.resumen_calificacion
+        except ResumenCalificacion.DoesNotExist:
+            resumen = ResumenCalificacion(producto=producto)
+
+        return {
+            'producto': producto,
+            'resenas': resenas,
+            'media_calificacion': resumen.promedio,
+            'total_resenas': resumen.total,
+            'distribucion_calificaciones': resumen.distribucion(),
+        }
+
+    context = await cache_catalogo.aobtener_o_calcular(
+        'detalle', cache_catalogo.clave_detalle(producto_id), consultar_detalle
+    )
     return render(request, 'catalogo/detalle_producto.html', context)
 
+async def detalle_pedido_async(request, pedido_id):
+    items = (
+        ItemPedido.objects.filter(pedido_id=pedido_id).select_related('producto')
+        .only('pedido_id', 'cantidad', 'precio_unitario', 'producto__nombre', 'producto__precio')
+        .order_by('pk')
+    )
+
+    try:
+        pedido = await Pedido.objects.select_related('id_usuario', 'metodo_pago', 'cupon').aget(id_pedido=pedido_id)
+    except Pedido.DoesNotExist:
+        raise Http404('No existe el pedido.')
+    items = [item async for item in items]
+    return render(request, 'pedidos/detalle_pedido.html', {'pedido': pedido, 'items': items})
+
+def metricas_rendimiento(request):
+    """Tiempos y consultas por vista acumulados por el middleware de instrumentación."""
+    return JsonResponse(middleware.metricas())
+
+def estadisticas_cache(request):
+    """Aciertos/fallos de la caché del catálogo en este proceso."""
+    return JsonResponse(cache_catalogo.estadisticas())
+
+def _cliente_seleccionado(request):
+    """Cliente elegido en el formulario enviado, para volver a mostrarlo si hubo un error."""
+    usuario_id = request.POST.get('usuario_id', '')
+    if not usuario_id.isdigit():
+        return None
+    return Usuario.objects.filter(pk=usuario_id).only('nombre', 'email').first()
+
 def crear_pedido_directo(request, producto_id):
     if request.method == 'POST':
         try:
@@ -195,137 +458,184 @@ def crear_pedido_directo(request, producto_id):
             cupon_codigo = request.POST.get('cupon_codigo') 
             
             usuario = get_object_or_404(Usuario, id=usuario_id)
-            producto = get_object_or_404(Producto, id=producto_id)
             metodo_pago = get_object_or_404(MetodoPago, id=metodo_pago_id) if metodo_pago_id else None
-            cupon = get_object_or_404(CuponDescuento, codigo=cupon_codigo, activo=True) if cupon_codigo else None
+            cupon = cupones.validar_cupon(cupon_codigo) if cupon_codigo else None
 
-            if cantidad > producto.stock:
-                return render(request, 'pedidos/crear_pedido_directo.html', {
-                    'producto': producto,
-                    'usuarios': Usuario.objects.filter(activo=True, tipo_usuario='cliente'),
-                    'metodos_pago': MetodoPago.objects.filter(activo=True),
-                    'error': f'Stock insuficiente. Solo hay {producto.stock} unidades disponibles.'
-                })
-            
-            pedido = Pedido.objects.create(
-                id_usuario=usuario,
-                direccion=direccion,
-                metodo_pago=metodo_pago, 
-                cupon=cupon, 
-            )
-            
-            ItemPedido.objects.create(
-                pedido=pedido,
-                producto=producto,
-                cantidad=cantidad
-            )
-            
-            producto.stock -= cantidad
-            producto.save()
+            # Reserva el stock y crea el pedido en una sola transacción
+            crear_pedido(usuario, direccion, {producto_id: cantidad}, metodo_pago, cupon)
             
             return redirect('ver_pedidos')
             
         except Exception as e:
-            producto = get_object_or_404(Producto, id=producto_id)
-            usuarios = Usuario.objects.filter(activo=True, tipo_usuario='cliente')
+            producto = get_object_or_404(inventario.con_existencias(Producto.objects.all()), id=producto_id)
             metodos_pago = MetodoPago.objects.filter(activo=True)
             return render(request, 'pedidos/crear_pedido_directo.html', {
                 'producto': producto,
-                'usuarios': usuarios,
+                'cliente': _cliente_seleccionado(request),
                 'metodos_pago': metodos_pago,
                 'error': str(e)
             })
     
-    producto = get_object_or_404(Producto, id=producto_id)
-    usuarios = Usuario.objects.filter(activo=True, tipo_usuario='cliente')
+    producto = get_object_or_404(inventario.con_existencias(Producto.objects.all()), id=producto_id)
     metodos_pago = MetodoPago.objects.filter(activo=True) 
     return render(request, 'pedidos/crear_pedido_directo.html', {
         'producto': producto,
-        'usuarios': usuarios,
         'metodos_pago': metodos_pago 
     })
 
+def _pagina_carrito(request, clave, error=None, status=200):
+    return render(request, 'pedidos/crear_pedido_multiple.html', {
+        'carrito': carrito.resumen(carrito.obtener(clave)),
+        'cliente': _cliente_seleccionado(request),
+        'metodos_pago': MetodoPago.objects.filter(activo=True),
+        'error': error,
+    }, status=status)
+
 def crear_pedido_multiple(request):
+    """Carrito de la sesión y su confirmación; las líneas se agregan desde el catálogo, sin listarlo aquí."""
+    clave = carrito.clave(request)
     if request.method == 'POST':
         try:
             usuario_id = request.POST.get('usuario_id')
             direccion = request.POST.get('direccion')
-            productos_seleccionados = request.POST.getlist('productos')
             metodo_pago_id = request.POST.get('metodo_pago') 
             cupon_codigo = request.POST.get('cupon_codigo') 
             
             usuario = get_object_or_404(Usuario, id=usuario_id)
             metodo_pago = get_object_or_404(MetodoPago, id=metodo_pago_id) if metodo_pago_id else None
-            cupon = get_object_or_404(CuponDescuento, codigo=cupon_codigo, activo=True) if cupon_codigo else None
+            cupon = cupones.validar_cupon(cupon_codigo) if cupon_codigo else None
 
-            
-            pedido = Pedido.objects.create(
-                id_usuario=usuario,
-                direccion=direccion,
-                metodo_pago=metodo_pago, 
-                cupon=cupon, 
-            )
-            
-            for producto_id in productos_seleccionados:
-                producto = get_object_or_404(Producto, id=producto_id)
-                cantidad = int(request.POST.get(f'cantidad_{producto_id}', 1))
-                
-                if cantidad > producto.stock:
-                    pedido.delete()
-                    return render(request, 'pedidos/crear_pedido_multiple.html', {
-                        'usuarios': Usuario.objects.filter(activo=True, tipo_usuario='cliente'),
-                        'productos': Producto.objects.filter(disponible=True, stock__gt=0),
-                        'metodos_pago': MetodoPago.objects.filter(activo=True),
-                        'error': f'Stock insuficiente para {producto.nombre}. Solo hay {producto.stock} unidades.'
-                    })
-                
-                ItemPedido.objects.create(
-                    pedido=pedido,
-                    producto=producto,
-                    cantidad=cantidad
-                )
-                
-                producto.stock -= cantidad
-                producto.save()
-            
+            # Si algún producto no tiene stock se rechaza el pedido completo y el carrito se conserva
+            carrito.confirmar(clave, usuario, direccion, metodo_pago, cupon)
             return redirect('ver_pedidos')
             
         except Exception as e:
-            return render(request, 'pedidos/crear_pedido_multiple.html', {
-                'usuarios': Usuario.objects.filter(activo=True, tipo_usuario='cliente'),
-                'productos': Producto.objects.filter(disponible=True, stock__gt=0),
-                'metodos_pago': MetodoPago.objects.filter(activo=True),
-                'error': str(e)
-            })
+            return _pagina_carrito(request, clave, str(e))
     
-    usuarios = Usuario.objects.filter(activo=True, tipo_usuario='cliente')
-    productos = Producto.objects.filter(disponible=True, stock__gt=0)
-    metodos_pago = MetodoPago.objects.filter(activo=True) 
-    return render(request, 'pedidos/crear_pedido_multiple.html', {
-        'usuarios': usuarios,
-        'productos': productos,
-        'metodos_pago': metodos_pago 
-    })
+    return _pagina_carrito(request, clave)
+
+def _respuesta_carrito(request, clave, cambiar):
+    """
+    Aplica `cambiar()` al carrito. Responde JSON a los clientes que lo piden
+    (Accept: application/json) y, a los formularios, vuelve a la página del carrito.
+    """
+    quiere_json = 'application/json' in request.headers.get('Accept', '')
+    try:
+        contenido = cambiar()
+    except ValueError as e:
+        if quiere_json:
+            return JsonResponse({'error': str(e)}, status=400, json_dumps_params={'ensure_ascii': False})
+        return _pagina_carrito(request, clave, str(e), status=400)
+    if quiere_json:
+        return JsonResponse(carrito.resumen(contenido), json_dumps_params={'ensure_ascii': False})
+    return redirect('crear_pedido_multiple')
+
+@require_POST
+def agregar_al_carrito(request, producto_id):
+    clave = carrito.clave(request)
+    return _respuesta_carrito(request, clave, lambda: carrito.agregar(clave, producto_id, request.POST.get('cantidad', 1)))
+
+@require_POST
+def actualizar_carrito(request, producto_id):
+    clave = carrito.clave(request)
+    return _respuesta_carrito(request, clave, lambda: carrito.actualizar(clave, producto_id, request.POST.get('cantidad')))
+
+@require_POST
+def quitar_del_carrito(request, producto_id):
+    clave = carrito.clave(request)
+    return _respuesta_carrito(request, clave, lambda: carrito.quitar(clave, producto_id))
 
 def ver_pedidos(request):
-    pedidos = Pedido.objects.all().order_by('-fecha')
+    # Solo las columnas que muestra la tabla; el cliente viene en el mismo JOIN
+    pedidos = Pedido.objects.select_related('id_usuario').only('fecha', 'estado_pedido', 'total', 'id_usuario__nombre')
+    pedidos = paginar_por_cursor(request, pedidos, 'fecha')
     return render(request, 'pedidos/ver_pedidos.html', {'pedidos': pedidos})
 
 def detalle_pedido(request, pedido_id):
-    pedido = get_object_or_404(Pedido, id_pedido=pedido_id)
-    return render(request, 'pedidos/detalle_pedido.html', {'pedido': pedido})
+    items = ItemPedido.objects.select_related('producto').only(
+        'pedido_id', 'cantidad', 'precio_unitario', 'producto__nombre', 'producto__precio',
+    ).order_by('pk')
+    pedido = get_object_or_404(
+        Pedido.objects.select_related('id_usuario', 'metodo_pago', 'cupon').prefetch_related(Prefetch('items', queryset=items)),
+        id_pedido=pedido_id,
+    )
+    return render(request, 'pedidos/detalle_pedido.html', {'pedido': pedido, 'items': pedido.items.all()})
 
 def actualizar_estado_pedido(request, pedido_id):
-    pedido = get_object_or_404(Pedido, id_pedido=pedido_id)
+    pedido = get_object_or_404(Pedido.objects.select_related('id_usuario'), id_pedido=pedido_id)
     
     if request.method == 'POST':
-        nuevo_estado = request.POST.get('estado_pedido')
-        pedido.estado_pedido = nuevo_estado
-        pedido.save()
-        return redirect('ver_pedidos')
+        try:
+            # Misma validación de transiciones (y devolución de stock al cancelar) que el cambio masivo
+            _, rechazados = cambiar_estado([pedido.pk], request.POST.get('estado_pedido'))
+        except ValueError as e:
+            rechazados = {pedido.pk: str(e)}
+        if not rechazados:
+            return redirect('ver_pedidos')
+        return render(request, 'pedidos/actualizar_estado.html', {'pedido': pedido, 'error': rechazados[pedido.pk]})
     
     return render(request, 'pedidos/actualizar_estado.html', {'pedido': pedido})
 
+@require_POST
+def cambiar_estado_pedidos(request):
+    """
+    Cambio de estado masivo: `estado` y los pedidos como `ids` (repetido o separado
+    por comas) o como filtro (`desde`, `hasta`, `estado_actual`). Responde con los
+    ids actualizados y el motivo de cada rechazo.
+    """
+    try:
+        ids = [
+            int(pedido_id) for valor in request.POST.getlist('ids') for pedido_id in valor.split(',') if pedido_id.strip()
+        ]
+        desde = exportacion.leer_fecha(request.POST.get('desde'))
+        hasta = exportacion.leer_fecha(request.POST.get('hasta'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    estado_actual = request.POST.get('estado_actual')
+    if not (ids or desde or hasta or estado_actual):
+        return JsonResponse({'error': 'Indica los pedidos con ids o con un filtro (desde, hasta, estado_actual).'}, status=400)
+
+    estado = request.POST.get('estado', '')
+    pedidos = ids or exportacion.filtrar_pedidos(Pedido.objects.all(), desde, hasta, estado_actual)
+    try:
+        actualizados, rechazados = cambiar_estado(pedidos, estado)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'estado': estado,
+        'actualizados': actualizados,
+        'rechazados': {str(pedido_id): motivo for pedido_id, motivo in rechazados.items()},
+    }, json_dumps_params={'ensure_ascii': False})
+
+def exportar_pedidos(request):
+    """Descarga todos los pedidos con sus items (CSV o JSONL) sin cargarlos en memoria."""
+    formato = request.GET.get('formato', 'csv')
+    if formato not in exportacion.FORMATOS:
+        return HttpResponseBadRequest(f'Formato no soportado: {formato}')
+    try:
+        desde = exportacion.leer_fecha(request.GET.get('desde'))
+        hasta = exportacion.leer_fecha(request.GET.get('hasta'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    pedidos = exportacion.pedidos_para_exportar(desde, hasta, request.GET.get('estado'))
+    tipo = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(exportacion.lineas_exportacion(formato, pedidos), content_type=f'{tipo}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="pedidos.{formato}"'
+    return response
+
+def panel_ventas(request):
+    """Ventas por día, estado, método de pago, cupón y categoría; solo consulta los resúmenes diarios."""
+    desde, hasta = ventas.rango_por_defecto()
+    try:
+        desde = exportacion.leer_fecha(request.GET.get('desde')) or desde
+        hasta = exportacion.leer_fecha(request.GET.get('hasta')) or hasta
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if desde > hasta:
+        return HttpResponseBadRequest('La fecha inicial no puede ser posterior a la final.')
+    return render(request, 'pedidos/panel_ventas.html', ventas.panel(desde, hasta))
+
 # =================================================================================
 # ========== VISTAS PARA MetodoPago ==========
 
@@ -346,7 +656,7 @@ def agregar_metodo_pago(request):
     return render(request, 'metodo_pago/agregar_metodo_pago.html', {'tipos_pago': tipos_pago})
 
 def ver_metodos_pago(request):
-    metodos = MetodoPago.objects.all().order_by('nombre')
+    metodos = MetodoPago.objects.only('nombre', 'tipo', 'activo').order_by('nombre')
     return render(request, 'metodo_pago/ver_metodos_pago.html', {'metodos': metodos})
 
 def actualizar_metodo_pago(request, metodo_pago_id):
@@ -378,14 +688,16 @@ def agregar_cupon_descuento(request):
     if request.method == 'POST':
         try:
             codigo = request.POST.get('codigo')
-            descuento_porcentaje = float(request.POST.get('descuento_porcentaje'))
+            descuento_porcentaje = Decimal(request.POST.get('descuento_porcentaje'))
             fecha_expiracion = request.POST.get('fecha_expiracion')
+            usos_maximos = request.POST.get('usos_maximos')
             activo = request.POST.get('activo') == 'on'
             
             CuponDescuento.objects.create(
                 codigo=codigo,
                 descuento_porcentaje=descuento_porcentaje,
                 fecha_expiracion=fecha_expiracion if fecha_expiracion else None,
+                usos_maximos=int(usos_maximos) if usos_maximos else None,
                 activo=activo
             )
             return redirect('ver_cupones')
@@ -395,7 +707,8 @@ def agregar_cupon_descuento(request):
     return render(request, 'cupon/agregar_cupon.html')
 
 def ver_cupones(request):
-    cupones = CuponDescuento.objects.all().order_by('-fecha_expiracion')
+    cupones = CuponDescuento.objects.only('codigo', 'descuento_porcentaje', 'fecha_expiracion', 'usos', 'usos_maximos', 'activo')
+    cupones = paginar_por_cursor(request, cupones, 'fecha_expiracion')
     return render(request, 'cupon/ver_cupones.html', {'cupones': cupones})
 
 def actualizar_cupon_descuento(request, cupon_id):
@@ -404,11 +717,14 @@ def actualizar_cupon_descuento(request, cupon_id):
     if request.method == 'POST':
         try:
             cupon.codigo = request.POST.get('codigo')
-            cupon.descuento_porcentaje = float(request.POST.get('descuento_porcentaje'))
+            cupon.descuento_porcentaje = Decimal(request.POST.get('descuento_porcentaje'))
             fecha_expiracion = request.POST.get('fecha_expiracion')
             cupon.fecha_expiracion = fecha_expiracion if fecha_expiracion else None
+            usos_maximos = request.POST.get('usos_maximos')
+            cupon.usos_maximos = int(usos_maximos) if usos_maximos else None
             cupon.activo = request.POST.get('activo') == 'on'
-            cupon.save()
+            # `usos` lo cuentan los pedidos con UPDATE atómicos: no se sobrescribe desde el formulario
+            cupon.save(update_fields=['codigo', 'descuento_porcentaje', 'fecha_expiracion', 'usos_maximos', 'activo'])
             return redirect('ver_cupones')
         except Exception as e:
             return render(request, 'cupon/actualizar_cupon.html', {'cupon': cupon, 'error': str(e)})
@@ -429,7 +745,6 @@ def borrar_cupon_descuento(request, cupon_id):
 
 def agregar_resena(request, producto_id):
     producto = get_object_or_404(Producto, id=producto_id)
-    usuarios = Usuario.objects.filter(activo=True, tipo_usuario='cliente')
     
     if request.method == 'POST':
         try:
@@ -443,23 +758,25 @@ def agregar_resena(request, producto_id):
             if Resena.objects.filter(producto=producto, usuario=usuario).exists():
                 return render(request, 'resena/agregar_resena.html', {
                     'producto': producto,
-                    'usuarios': usuarios,
+                    'cliente': usuario,
                     'calificaciones': Resena.CALIFICACION_CHOICES,
                     'error': 'Ya existe una reseña de este usuario para este producto.'
                 })
             
-            Resena.objects.create(
-                producto=producto,
-                usuario=usuario,
-                calificacion=calificacion,
-                comentario=comentario
-            )
+            # La reseña y el ajuste de su resumen de calificación se guardan juntos
+            with transaction.atomic():
+                Resena.objects.create(
+                    producto=producto,
+                    usuario=usuario,
+                    calificacion=calificacion,
+                    comentario=comentario
+                )
             # Redirigir al detalle del producto después de guardar la reseña
             return redirect('detalle_producto', producto_id=producto.id) 
         except Exception as e:
             return render(request, 'resena/agregar_resena.html', {
                 'producto': producto,
-                'usuarios': usuarios,
+                'cliente': _cliente_seleccionado(request),
                 'calificaciones': Resena.CALIFICACION_CHOICES,
                 'error': str(e)
             })
@@ -468,20 +785,23 @@ def agregar_resena(request, producto_id):
     calificaciones = Resena.CALIFICACION_CHOICES 
     return render(request, 'resena/agregar_resena.html', {
         'producto': producto,
-        'usuarios': usuarios,
         'calificaciones': calificaciones
     })
 
 def ver_resenas(request):
-    resenas = Resena.objects.all().order_by('-fecha_resena')
+    resenas = Resena.objects.select_related('producto', 'usuario').only(
+        'calificacion', 'comentario', 'fecha_resena', 'producto__nombre', 'usuario__nombre',
+    )
+    resenas = paginar_por_cursor(request, resenas, 'fecha_resena')
     return render(request, 'resena/ver_resenas.html', {'resenas': resenas})
 
 def borrar_resena(request, resena_id):
     resena = get_object_or_404(Resena, id=resena_id)
     
     if request.method == 'POST':
-        producto_id = resena.producto.id
-        resena.delete()
+        producto_id = resena.producto_id
+        with transaction.atomic():
+            resena.delete()
         # Redirigir al detalle del producto después de borrar la reseña
         return redirect('detalle_producto', producto_id=producto_id)
         
@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para medir el tiempo de toda la cadena de middleware
+    'app_Shein.middleware.InstrumentacionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -95,9 +97,63 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Las transacciones toman el bloqueo de escritura al iniciar, así las compras
+        # simultáneas esperan su turno en lugar de fallar con "database is locked"
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shein',
     }
 }
 
+# Alias de CACHES usado por el catálogo y el detalle de producto, y duración en segundos
+SHEIN_CACHE_ALIAS = 'default'
+SHEIN_CACHE_TIMEOUT = 60 * 5
+
+# Segundos que dura un carrito (app_Shein.carrito) sin cambios
+SHEIN_CARRITO_TTL = 60 * 60 * 24 * 7
+
+# Segundos que cada proceso recuerda un cupón (app_Shein.cupones) antes de volver a leerlo
+SHEIN_CUPONES_TTL = 60
+
+
+# Instrumentación por petición (app_Shein.middleware)
+# Cada petición se registra en INFO; las lentas o con consultas repetidas (N+1) en WARNING.
+# SHEIN_LOG_RENDIMIENTO=INFO en el entorno para ver todas las peticiones.
+SHEIN_UMBRAL_LENTO_MS = 500
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'rendimiento': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'app_Shein.rendimiento': {
+            'handlers': ['rendimiento'],
+            'level': os.environ.get('SHEIN_LOG_RENDIMIENTO', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators